@@ -8,7 +8,7 @@ import subprocess
 from collections import defaultdict
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import AsyncIterable, Iterable, List, Optional, Union
 from uuid import uuid4
 
 import ujson as json
@@ -20,6 +20,7 @@ from iambic.core.context import ctx
 from iambic.core.iambic_plugin import ProviderPlugin
 from iambic.core.logger import log
 from iambic.core.models import BaseTemplate, ExecutionMessage, TemplateChangeDetails
+from iambic.core.template_index import update_template_indexes
 from iambic.core.utils import sort_dict, yaml
 from iambic.plugins.v0_1_0 import PLUGIN_VERSION, aws, azure_ad, google_workspace, okta
 
@@ -227,12 +228,10 @@ class Config(BaseTemplate):
 
             await asyncio.gather(*tasks)
 
-    async def run_apply(
-        self, exe_message: ExecutionMessage, templates: list[BaseTemplate]
+    async def _apply_templates(
+        self, exe_message: ExecutionMessage, templates: Iterable[BaseTemplate]
     ) -> list[TemplateChangeDetails]:
-        # It's the responsibility of the provider to handle throttling.
         # Build a map of a plugin's template types to the plugin
-        ctx.command = exe_message.parent_command
         template_provider_map = {}
         for plugin in self.plugin_instances:
             for template in plugin.templates:
@@ -271,7 +270,100 @@ class Config(BaseTemplate):
 
         # Retrieve template changes across plugins and flatten responses
         template_changes = await asyncio.gather(*tasks)
-        template_changes = list(itertools.chain.from_iterable(template_changes))
+        return list(itertools.chain.from_iterable(template_changes))
+
+    async def _apply_template_stream(
+        self,
+        exe_message: ExecutionMessage,
+        templates: AsyncIterable[BaseTemplate],
+        batch_size: int,
+        max_pending_batches: int,
+    ) -> list[TemplateChangeDetails]:
+        batch_tasks = []
+        pending_tasks = set()
+        batch = []
+
+        try:
+            async for template in templates:
+                batch.append(template)
+                if len(batch) < batch_size:
+                    continue
+
+                batch_task = asyncio.create_task(
+                    self._apply_templates(exe_message, batch)
+                )
+                batch_tasks.append(batch_task)
+                pending_tasks.add(batch_task)
+                batch = []
+                if len(pending_tasks) >= max_pending_batches:
+                    # Stop reading templates until a batch has been applied
+                    _, pending_tasks = await asyncio.wait(
+                        pending_tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+
+            if batch:
+                batch_tasks.append(
+                    asyncio.create_task(self._apply_templates(exe_message, batch))
+                )
+
+            template_changes = await asyncio.gather(*batch_tasks)
+        except BaseException:
+            for batch_task in batch_tasks:
+                batch_task.cancel()
+            await asyncio.gather(*batch_tasks, return_exceptions=True)
+            raise
+
+        return list(itertools.chain.from_iterable(template_changes))
+
+    async def _apply_complete(self, exe_message: ExecutionMessage):
+        """Let each plugin release the state shared by the batches of the run"""
+        await asyncio.gather(
+            *[
+                plugin.async_apply_complete_callable(
+                    exe_message, self.get_config_plugin(plugin)
+                )
+                for plugin in self.configured_plugins
+                if plugin.async_apply_complete_callable
+            ]
+        )
+
+    async def run_apply(
+        self,
+        exe_message: ExecutionMessage,
+        templates: Union[Iterable[BaseTemplate], AsyncIterable[BaseTemplate]],
+        batch_size: int = 250,
+        max_pending_batches: int = 2,
+    ) -> list[TemplateChangeDetails]:
+        """
+        Apply the templates using the plugin each template belongs to.
+
+        If templates is an async iterable (e.g. iambic.core.parser.aiter_templates)
+            and the changes are only evaluated, templates are applied in batches as they are parsed.
+        This lets a plan start before the last template is loaded.
+        Only max_pending_batches are applied at once, so memory doesn't grow with the size of the repo.
+        When the changes are executed the whole stream is applied at once instead,
+            the ordering a plugin enforces between templates (e.g. a role waiting on a managed policy
+            of the same apply) only holds between templates applied by the same call.
+
+        :param exe_message: Execution context
+        :param templates: The templates to apply.
+        :param batch_size: The number of templates in a batch when templates is an async iterable.
+        :param max_pending_batches: The max number of batches being applied at once.
+        """
+        # It's the responsibility of the provider to handle throttling.
+        ctx.command = exe_message.parent_command
+        try:
+            if isinstance(templates, AsyncIterable) and ctx.execute:
+                templates = [template async for template in templates]
+
+            if isinstance(templates, AsyncIterable):
+                template_changes = await self._apply_template_stream(
+                    exe_message, templates, batch_size, max_pending_batches
+                )
+            else:
+                template_changes = await self._apply_templates(exe_message, templates)
+        finally:
+            await self._apply_complete(exe_message)
 
         if ctx.execute and template_changes:
             log.info("Finished applying changes.")
@@ -419,6 +511,7 @@ class Config(BaseTemplate):
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "w") as f:
             f.write(yaml.dump(sorted_input_dict))
+        update_template_indexes(file_path)
 
         log.info("Config successfully written", config_location=file_path)
 
@@ -8,6 +8,8 @@ class DynamicTemplateRef:
 
     @classmethod
     def set_templates(cls, templates):
+        for template in templates:
+            template.precompute_iambic_fields()
         cls.templates = templates
 
     @property
@@ -12,7 +12,10 @@ if TYPE_CHECKING:
 
 
 async def resolve_config_template_path(repo_dir: str) -> pathlib.Path:
-    config_template_file_path = await gather_templates(repo_dir, "Core::Config")
+    # Runs start by resolving the config, the templates are indexed once here for the run
+    config_template_file_path = await gather_templates(
+        repo_dir, "Core::Config", refresh=True
+    )
     if len(config_template_file_path) == 0:
         raise RuntimeError(
             f"Unable to discover IAMbic Configuration in {repo_dir}. "
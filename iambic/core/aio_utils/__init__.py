@@ -1,18 +1,181 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Awaitable, TypeVar
+import itertools
+import time
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
 
 T = TypeVar("T")
 
 
+class SlidingWindowExecutor:
+    def __init__(
+        self,
+        limit: int = -1,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        key_limit: Optional[int] = None,
+    ):
+        """Runs awaitables with a bounded number in flight, starting the next one as soon as any finishes.
+
+        Unlike a fixed batch, a slow awaitable only holds its own slot.
+        The awaitables are pulled from the iterable as slots free up
+            so a generator of coroutines is never materialized upfront.
+
+        :param limit: The max number of awaitables running at once, -1 for no limit.
+        :param rate: The max number of awaitables started per second.
+        :param burst: The number of awaitables that can be started at once before rate applies.
+            Defaults to limit.
+        :param key_limit: The max number of awaitables running at once for the same key.
+        """
+        self.limit = limit
+        self.rate = rate
+        self.burst = burst or (limit if limit > 0 else 1)
+        self.key_limit = key_limit
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+
+    def _has_capacity(self, running: int) -> bool:
+        return self.limit == -1 or running < self.limit
+
+    def _get_start_delay(self) -> float:
+        """The seconds until the rate allows the next start, consuming a token if it is 0"""
+        if not self.rate:
+            return 0
+
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    async def stream(
+        self,
+        awaitables: Iterable[Awaitable[T]],
+        keys: Optional[Iterable[Hashable]] = None,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[tuple[int, Any]]:
+        """Yield the (position, result) of every awaitable in the order they finish.
+
+        If an awaitable raises and return_exceptions is False the exception is raised
+            and the awaitables still running are cancelled.
+        The same happens if the caller stops iterating or is cancelled.
+
+        :param keys: The key of each awaitable, used for key_limit.
+        """
+        items: Iterator[tuple[int, Hashable, Awaitable[T]]] = (
+            (elem, key, awaitable)
+            for elem, (key, awaitable) in enumerate(
+                zip(keys if keys is not None else itertools.repeat(None), awaitables)
+            )
+        )
+        # Awaitables pulled from the iterable that can't start until a task of their key finishes
+        blocked: dict[Hashable, deque] = defaultdict(deque)
+        blocked_count = 0
+        ready: deque = deque()
+        key_running: dict[Hashable, int] = defaultdict(int)
+        pending: dict[asyncio.Future, tuple[int, Hashable]] = {}
+        exhausted = False
+
+        def _next_item() -> Optional[tuple[int, Hashable, Awaitable[T]]]:
+            nonlocal blocked_count, exhausted
+            if ready:
+                return ready.popleft()
+
+            # Read ahead of blocked keys, up to the size of the window
+            while not exhausted and (self.limit == -1 or blocked_count < self.limit):
+                if (item := next(items, None)) is None:
+                    exhausted = True
+                    break
+
+                key = item[1]
+                if self.key_limit and key_running[key] >= self.key_limit:
+                    blocked[key].append(item)
+                    blocked_count += 1
+                    continue
+                return item
+
+            return None
+
+        try:
+            while True:
+                start_delay = None
+                while self._has_capacity(len(pending)):
+                    if (item := _next_item()) is None:
+                        break
+                    if start_delay := self._get_start_delay():
+                        ready.appendleft(item)
+                        break
+
+                    elem, key, awaitable = item
+                    key_running[key] += 1
+                    pending[asyncio.ensure_future(awaitable)] = (elem, key)
+
+                if not pending:
+                    if start_delay:
+                        await asyncio.sleep(start_delay)
+                        continue
+                    break
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=start_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    elem, key = pending.pop(task)
+                    key_running[key] -= 1
+                    if blocked[key]:
+                        ready.append(blocked[key].popleft())
+                        blocked_count -= 1
+
+                    if return_exceptions and task.exception():
+                        yield elem, task.exception()
+                    else:
+                        yield elem, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            # Close the coroutines that were never started
+            for _, _, awaitable in itertools.chain(
+                ready, *blocked.values(), () if exhausted else items
+            ):
+                if asyncio.iscoroutine(awaitable):
+                    awaitable.close()
+
+    async def run(
+        self,
+        awaitables: Iterable[Awaitable[T]],
+        keys: Optional[Iterable[Hashable]] = None,
+        return_exceptions: bool = False,
+    ) -> list[Any]:
+        """Like asyncio.gather, the results in the order of the awaitables"""
+        results: dict[int, Any] = {}
+        async for elem, result in self.stream(awaitables, keys, return_exceptions):
+            results[elem] = result
+        return [results[elem] for elem in range(len(results))]
+
+
 async def gather_limit(
     *args: Awaitable[T],
     return_exceptions: bool = False,
     limit: int = -1,
 ) -> list[Any]:
     """
-    (Taken from https://github.com/omnilib/aioitertools/blob/v0.7.1/aioitertools/asyncio.py)
     Like asyncio.gather but with a limit on concurrency.
 
     Note that all results are buffered.
@@ -26,61 +189,10 @@ async def gather_limit(
 
         results = await gather(*futures, limit=2)
     """
-
-    # For detecting input duplicates and reconciling them at the end
-    input_map: dict[Awaitable[T], list[int]] = {}
-    # This is keyed on what we'll get back from asyncio.wait
-    pos: dict[asyncio.Future[T], int] = {}
-    ret: list[Any] = [None] * len(args)
-
-    pending: set[asyncio.Future[T]] = set()
-    done: set[asyncio.Future[T]] = set()
-
-    next_arg = 0
-
-    while True:
-        while next_arg < len(args) and (limit == -1 or len(pending) < limit):
-            # We have to defer the creation of the Task as long as possible
-            # because once we do, it starts executing, regardless of what we
-            # have in the pending set.
-            if args[next_arg] in input_map:
-                input_map[args[next_arg]].append(next_arg)
-            else:
-                # We call ensure_future directly to ensure that we have a Task
-                # because the return value of asyncio.wait will be an implicit
-                # task otherwise, and we won't be able to know which input it
-                # corresponds to.
-                task: asyncio.Future[T] = asyncio.ensure_future(args[next_arg])
-                pending.add(task)
-                pos[task] = next_arg
-                input_map[args[next_arg]] = [next_arg]
-            next_arg += 1
-
-        # pending might be empty if the last items of args were dupes;
-        # asyncio.wait([]) will raise an exception.
-        if pending:
-            try:
-                done, pending = await asyncio.wait(
-                    pending, return_when=asyncio.FIRST_COMPLETED
-                )
-                for x in done:
-                    if return_exceptions and x.exception():
-                        ret[pos[x]] = x.exception()
-                    else:
-                        ret[pos[x]] = x.result()
-            except asyncio.CancelledError:
-                # Since we created these tasks we should cancel them
-                for x in pending:
-                    x.cancel()
-                # we insure that all tasks are cancelled before we raise
-                await asyncio.gather(*pending, return_exceptions=True)
-                raise
-
-        if not pending and next_arg == len(args):
-            break
-
-    for lst in input_map.values():
-        for i in range(1, len(lst)):
-            ret[lst[i]] = ret[lst[0]]
-
-    return ret
+    # The same awaitable may be provided more than once but can only be awaited once
+    unique_args = list(dict.fromkeys(args))
+    results = await SlidingWindowExecutor(limit).run(
+        unique_args, return_exceptions=return_exceptions
+    )
+    arg_results = dict(zip(unique_args, results))
+    return [arg_results[arg] for arg in args]
@@ -69,6 +69,14 @@ class ProviderPlugin(PydanticBaseModel):
         default=default_apply_callable,
         hidden_from_schema=True,
     )
+    async_apply_complete_callable: Optional[Any] = Field(
+        description="(OPTIONAL) The function that called once all templates of a run have been applied."
+        "Templates may be applied in several batches, this is called once after the last one."
+        "It is used to release state shared by the batches."
+        "This function must accept the "
+        "params: (exe_message: ExecutionMessage, config: ProviderConfig)",
+        hidden_from_schema=True,
+    )
     async_detect_changes_callable: Optional[Any] = Field(
         description="(OPTIONAL) The function that called to detect changes across all templates for this provider."
         "This is optional and if not provided will fallback to the async_import_callable."
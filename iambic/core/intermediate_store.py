@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import glob
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Union
+
+import aiofiles
+
+from iambic.core import noq_json as json
+from iambic.core.utils import aio_wrapper, get_writable_directory, resource_file_upsert
+
+INTERMEDIATE_STORE_TYPES = ["memory", "file", "sqlite"]
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern:
+    """Compile a glob pattern to match it the way glob.glob(pattern, recursive=True) would.
+
+    `**` as a path component matches any number of directories, including none.
+    `*` and `?` never match a path separator.
+    """
+    regex = ""
+    components = pattern.split(os.sep)
+    for elem, component in enumerate(components):
+        is_last = bool(elem == len(components) - 1)
+        if component == "**":
+            regex += ".*" if is_last else f"(?:[^{os.sep}]+{os.sep})*"
+            continue
+
+        regex += (
+            re.escape(component)
+            .replace(r"\*", f"[^{os.sep}]*")
+            .replace(r"\?", f"[^{os.sep}]")
+        )
+        if not is_last:
+            regex += os.sep
+
+    return re.compile(regex)
+
+
+class IntermediateStore(ABC):
+    """Where import collectors keep the provider responses until the generators template them.
+
+    Entries are json documents keyed by the path returned by ExecutionMessage.get_file_path.
+    Every store round trips the content through json like the file store always has,
+        so the generators get the same values regardless of the store.
+    """
+
+    def __deepcopy__(self, memo: dict) -> IntermediateStore:
+        # Deep copies of the ExecutionMessage still share the store of the run
+        return self
+
+    @abstractmethod
+    async def upsert(
+        self,
+        file_path: Union[str, pathlib.Path],
+        content_as_dict: Any,
+        replace_file: bool = False,
+    ):
+        """Create the entry or merge the content into the existing one, like resource_file_upsert"""
+
+    @abstractmethod
+    async def read(self, file_path: Union[str, pathlib.Path]) -> Any:
+        """Return the content of the entry. Raises FileNotFoundError if it doesn't exist."""
+
+    @abstractmethod
+    def glob(self, pattern: str) -> list[str]:
+        """Return the paths of the entries matching the recursive glob pattern"""
+
+
+class FileIntermediateStore(IntermediateStore):
+    """One json file per entry. Required if the collectors and generators don't share a filesystem view."""
+
+    async def upsert(
+        self,
+        file_path: Union[str, pathlib.Path],
+        content_as_dict: Any,
+        replace_file: bool = False,
+    ):
+        await resource_file_upsert(file_path, content_as_dict, replace_file)
+
+    async def read(self, file_path: Union[str, pathlib.Path]) -> Any:
+        async with aiofiles.open(file_path, mode="r") as f:
+            return json.loads(await f.read())
+
+    def glob(self, pattern: str) -> list[str]:
+        return [
+            file_path
+            for file_path in glob.glob(pattern, recursive=True)
+            if os.path.isfile(file_path)
+        ]
+
+
+class MemoryIntermediateStore(IntermediateStore):
+    """Keeps the entries in the memory of the process. The default for a single process run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, str] = {}
+
+    async def upsert(
+        self,
+        file_path: Union[str, pathlib.Path],
+        content_as_dict: Any,
+        replace_file: bool = False,
+    ):
+        file_path = str(file_path)
+        with self._lock:
+            if not replace_file and (entry := self._entries.get(file_path)):
+                content_as_dict = {**json.loads(entry), **content_as_dict}
+            self._entries[file_path] = json.dumps(content_as_dict)
+
+    async def read(self, file_path: Union[str, pathlib.Path]) -> Any:
+        try:
+            return json.loads(self._entries[str(file_path)])
+        except KeyError:
+            raise FileNotFoundError(file_path)
+
+    def glob(self, pattern: str) -> list[str]:
+        regex = _glob_to_regex(pattern)
+        with self._lock:
+            return [
+                file_path for file_path in self._entries if regex.fullmatch(file_path)
+            ]
+
+
+class SQLiteIntermediateStore(IntermediateStore):
+    def __init__(self, execution_id: str):
+        """Keeps the entries in SQLite databases in the execution directory.
+
+        Entries are sharded into one database per top level directory of the execution,
+            which is the account (provider id) for the import collectors.
+        Concurrent processes can share the store and collectors of different accounts never
+            contend for the same database.
+        The sqlite calls block so upsert and read run them on a worker thread.
+        """
+        self.execution_id = execution_id
+        self._lock = threading.Lock()
+        self._connections: dict[str, sqlite3.Connection] = {}
+
+    @property
+    def execution_dir(self) -> str:
+        # Resolved on every call because init_writable_directory may run after import
+        return os.path.join(get_writable_directory(), ".iambic", self.execution_id)
+
+    @property
+    def database_dir(self) -> str:
+        # Hidden so the databases are never matched by a glob of the execution directory
+        return os.path.join(self.execution_dir, ".intermediate_store")
+
+    def _get_database_path(self, file_path: str) -> str:
+        relative_path = os.path.relpath(file_path, self.execution_dir)
+        shard = relative_path.split(os.sep)[0] if os.sep in relative_path else ""
+        if shard.startswith(".."):
+            raise ValueError(f"{file_path} is not in {self.execution_dir}")
+        return os.path.join(self.database_dir, f"{shard or 'execution'}.sqlite3")
+
+    def _get_connection(self, database_path: str) -> sqlite3.Connection:
+        if not (connection := self._connections.get(database_path)):
+            os.makedirs(os.path.dirname(database_path), exist_ok=True)
+            connection = sqlite3.connect(
+                database_path, timeout=60, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY, content TEXT)"
+            )
+            self._connections[database_path] = connection
+        return connection
+
+    def _upsert(self, file_path: str, content_as_dict: Any, replace_file: bool):
+        with self._lock:
+            connection = self._get_connection(self._get_database_path(file_path))
+            with connection:
+                # Take the write lock before reading so concurrent processes don't lose a merge
+                connection.execute("BEGIN IMMEDIATE")
+                if not replace_file and (
+                    row := connection.execute(
+                        "SELECT content FROM entries WHERE path = ?", (file_path,)
+                    ).fetchone()
+                ):
+                    content_as_dict = {**json.loads(row[0]), **content_as_dict}
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (path, content) VALUES (?, ?)",
+                    (file_path, json.dumps(content_as_dict)),
+                )
+
+    async def upsert(
+        self,
+        file_path: Union[str, pathlib.Path],
+        content_as_dict: Any,
+        replace_file: bool = False,
+    ):
+        await aio_wrapper(self._upsert, str(file_path), content_as_dict, replace_file)
+
+    def _read(self, file_path: str) -> Optional[tuple[str]]:
+        with self._lock:
+            return (
+                self._get_connection(self._get_database_path(file_path))
+                .execute("SELECT content FROM entries WHERE path = ?", (file_path,))
+                .fetchone()
+            )
+
+    async def read(self, file_path: Union[str, pathlib.Path]) -> Any:
+        if not (row := await aio_wrapper(self._read, str(file_path))):
+            raise FileNotFoundError(file_path)
+        return json.loads(row[0])
+
+    def glob(self, pattern: str) -> list[str]:
+        regex = _glob_to_regex(pattern)
+        file_paths = []
+        with self._lock:
+            # Includes the databases written by other processes
+            for database_path in glob.glob(
+                os.path.join(self.database_dir, "*.sqlite3")
+            ):
+                file_paths.extend(
+                    row[0]
+                    for row in self._get_connection(database_path).execute(
+                        "SELECT path FROM entries"
+                    )
+                    if regex.fullmatch(row[0])
+                )
+        return file_paths
+
+
+def new_intermediate_store(
+    execution_id: str, store_type: Optional[str] = None
+) -> IntermediateStore:
+    """Create the intermediate store of an execution.
+
+    :param execution_id: The id of the execution the store is for.
+    :param store_type: One of memory, file or sqlite.
+        Defaults to IAMBIC_INTERMEDIATE_STORE or memory.
+    """
+    store_type = (
+        store_type or os.environ.get("IAMBIC_INTERMEDIATE_STORE", "memory")
+    ).lower()
+    if store_type == "memory":
+        return MemoryIntermediateStore()
+    elif store_type == "file":
+        return FileIntermediateStore()
+    elif store_type == "sqlite":
+        return SQLiteIntermediateStore(execution_id)
+
+    raise ValueError(
+        f"Unsupported intermediate store {store_type}. Must be one of {', '.join(INTERMEDIATE_STORE_TYPES)}."
+    )
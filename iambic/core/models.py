@@ -8,6 +8,7 @@ import itertools
 import json
 import os
 import typing
+import weakref
 from enum import Enum
 from hashlib import md5
 from types import GenericAlias
@@ -15,6 +16,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    Iterable,
     List,
     Optional,
     Set,
@@ -29,25 +31,38 @@ from deepdiff.model import PrettyOrderedSet
 from git import Repo
 from jinja2 import BaseLoader, Environment
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import Extra, Field, root_validator, schema,  validate_model, validator
+from pydantic import (
+    Extra,
+    Field,
+    PrivateAttr,
+    root_validator,
+    schema,
+    validate_model,
+    validator,
+)
 from pydantic.fields import ModelField
 
+from iambic.core.aio_utils import gather_limit
 from iambic.core.iambic_enum import Command, ExecutionStatus, IambicManaged
+from iambic.core.intermediate_store import IntermediateStore, new_intermediate_store
 from iambic.core.logger import log
+from iambic.core.template_index import update_template_indexes
 from iambic.core.utils import (
+    aio_wrapper,
     apply_to_provider,
-    create_commented_map,
+    create_sorted_commented_map,
     get_writable_directory,
     sanitize_string,
     simplify_dt,
     snake_to_camelcap,
-    sort_dict,
+    to_json_compatible,
     transform_comments,
     yaml,
 )
 
 if TYPE_CHECKING:
     from iambic.config.dynamic_config import Config
+    from iambic.core.template_repository import TemplateRepository
     from iambic.plugins.v0_1_0.aws.models import AWSAccount
 
     MappingIntStrAny = typing.Mapping[int | str, Any]
@@ -71,6 +86,12 @@ original_field_schema = schema.field_schema
 schema.field_schema = field_schema
 
 
+# Keyed by model class, see IambicPydanticBaseModel.get_iambic_fields
+IAMBIC_FIELDS_BY_CLASS: weakref.WeakKeyDictionary[
+    type, frozenset[str]
+] = weakref.WeakKeyDictionary()
+
+
 class IambicPydanticBaseModel(PydanticBaseModel):
     metadata_iambic_fields = Field(
         set(), description="metadata for iambic", exclude=True
@@ -79,13 +100,7 @@ class IambicPydanticBaseModel(PydanticBaseModel):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-
-        ancestors = inspect.getmro(type(self))
-        for ancestor in ancestors:
-            if getattr(ancestor, "iambic_specific_knowledge", None):
-                self.metadata_iambic_fields = self.metadata_iambic_fields.union(
-                    ancestor.iambic_specific_knowledge()
-                )
+        self._set_iambic_fields()
 
     class Config:
         json_encoders = {Set: list}
@@ -94,6 +109,68 @@ class IambicPydanticBaseModel(PydanticBaseModel):
     def iambic_specific_knowledge(cls) -> set[str]:
         return {"metadata_commented_dict"}
 
+    @classmethod
+    def get_iambic_fields(cls) -> frozenset[str]:
+        """The iambic_specific_knowledge of every class in the hierarchy.
+
+        Computed once per class instead of walking the mro for every instance.
+        """
+        iambic_fields = IAMBIC_FIELDS_BY_CLASS.get(cls)
+        if iambic_fields is None:
+            iambic_fields = frozenset().union(
+                *[
+                    ancestor.iambic_specific_knowledge()
+                    for ancestor in inspect.getmro(cls)
+                    if getattr(ancestor, "iambic_specific_knowledge", None)
+                ]
+            )
+            IAMBIC_FIELDS_BY_CLASS[cls] = iambic_fields
+        return iambic_fields
+
+    @classmethod
+    def precompute_iambic_fields(cls):
+        """Compute the iambic fields of the class and every model nested in its fields.
+
+        Called when the plugin templates are registered so loading templates never pays for it.
+        """
+        model_classes = [cls]
+        seen = set()
+        while model_classes:
+            model_cls = model_classes.pop()
+            if model_cls in seen:
+                continue
+
+            seen.add(model_cls)
+            model_cls.get_iambic_fields()
+            fields = list(model_cls.__fields__.values())
+            while fields:
+                field = fields.pop()
+                fields.extend(field.sub_fields or [])
+                if isinstance(field.type_, type) and issubclass(
+                    field.type_, IambicPydanticBaseModel
+                ):
+                    model_classes.append(field.type_)
+
+    @classmethod
+    def construct(cls, _fields_set: Optional[set[str]] = None, **values: Any):
+        """Create a model from trusted, already validated values without validating them again.
+
+        Nested models must already be model instances.
+        Unlike pydantic's construct, the iambic fields are set as if __init__ was called.
+        """
+        model = super().construct(_fields_set, **values)
+        model._set_iambic_fields()
+        return model
+
+    def _set_iambic_fields(self):
+        iambic_fields = self.get_iambic_fields()
+        if self.metadata_iambic_fields:
+            iambic_fields = iambic_fields.union(self.metadata_iambic_fields)
+        # The frozenset is shared by every instance of the class
+        #   so skip the overhead of pydantic's __setattr__.
+        self.__dict__["metadata_iambic_fields"] = iambic_fields
+        self.__fields_set__.add("metadata_iambic_fields")
+
     # https://github.com/pydantic/pydantic/issues/1864#issuecomment-1118485697
     # Use this to validate post creation
     def validate_model_afterward(self):
@@ -486,12 +563,37 @@ class BaseTemplate(
         exclude_defaults: bool = False,
         exclude_none: bool = True,
     ) -> "DictStrAny":  # noqa
+        return to_json_compatible(
+            self._get_template_dict(
+                include=include,
+                exclude=exclude,
+                by_alias=by_alias,
+                skip_defaults=skip_defaults,
+                exclude_unset=exclude_unset,
+                exclude_defaults=exclude_defaults,
+                exclude_none=exclude_none,
+            ),
+            self.__json_encoder__,
+        )
+
+    def _get_template_dict(
+        self,
+        *,
+        include: Optional[Union["AbstractSetIntStr", "MappingIntStrAny"]] = None,
+        exclude: Optional[Union["AbstractSetIntStr", "MappingIntStrAny"]] = None,
+        by_alias: bool = False,
+        skip_defaults: Optional[bool] = None,
+        exclude_unset: bool = True,
+        exclude_defaults: bool = False,
+        exclude_none: bool = True,
+    ) -> "DictStrAny":  # noqa
+        # The values are not json encoded yet, see dict
         if exclude:
             exclude.add("file_path")
         else:
             exclude = {"file_path"}
 
-        template_dict = self.json(
+        template_dict = super().dict(
             include=include,
             exclude=exclude,
             by_alias=by_alias,
@@ -500,35 +602,61 @@ class BaseTemplate(
             exclude_defaults=exclude_defaults,
             exclude_none=exclude_none,
         )
-        template_dict = json.loads(template_dict)
         template_dict["template_type"] = self.template_type
         return template_dict
 
     def get_body(self, exclude_none=True, exclude_unset=True, exclude_defaults=True):
-        input_dict = self.dict(
-            exclude_none=exclude_none,
-            exclude_unset=exclude_unset,
-            exclude_defaults=exclude_defaults,
-            exclude={"file_path"},
-        )
-        sorted_input_dict = sort_dict(input_dict)
-        sorted_input_dict = create_commented_map(sorted_input_dict)
-        as_yaml = yaml.dump(sorted_input_dict)
-        # Force template_type to be at the top of the yaml
-        template_type_str = f"template_type: {self.template_type}"
-        as_yaml = as_yaml.replace(f"{template_type_str}\n", "")
-        as_yaml = as_yaml.replace(f"\n{template_type_str}", "")
-        as_yaml = f"{template_type_str}\n{as_yaml}"
-        return as_yaml
-
-    def write(self, exclude_none=True, exclude_unset=True, exclude_defaults=True):
+        dict_kwargs = {
+            "exclude_none": exclude_none,
+            "exclude_unset": exclude_unset,
+            "exclude_defaults": exclude_defaults,
+            "exclude": {"file_path"},
+        }
+        if type(self).dict is BaseTemplate.dict:
+            # Skip encoding the values twice, create_sorted_commented_map encodes them as it goes
+            input_dict = self._get_template_dict(**dict_kwargs)
+        else:
+            input_dict = self.dict(**dict_kwargs)
+
+        # template_type is prioritized so it is always at the top of the yaml
+        return yaml.dump(create_sorted_commented_map(input_dict, self.__json_encoder__))
+
+    def render(self, exclude_none=True, exclude_unset=True, exclude_defaults=True):
         # pay the cost of validating the models once more.
         self.validate_model_afterward()
+        return self.get_body(exclude_none, exclude_unset, exclude_defaults)
+
+    def write_body(self, as_yaml: str) -> bool:
+        """Write the rendered template to file_path unless the file already contains it.
+
+        Skipping unchanged files avoids needless I/O and git churn.
+
+        :return: True if the file was written
+        """
+        body_bytes = as_yaml.encode("utf-8")
+        try:
+            with open(self.file_path, "rb") as f:
+                if f.read() == body_bytes:
+                    return False
+        except FileNotFoundError:
+            pass
 
-        as_yaml = self.get_body(exclude_none, exclude_unset, exclude_defaults)
         os.makedirs(os.path.dirname(os.path.expanduser(self.file_path)), exist_ok=True)
-        with open(self.file_path, "w") as f:
-            f.write(as_yaml)
+        with open(self.file_path, "wb") as f:
+            f.write(body_bytes)
+        update_template_indexes(self.file_path)
+        return True
+
+    def write(
+        self, exclude_none=True, exclude_unset=True, exclude_defaults=True
+    ) -> bool:
+        """Validate and write the template to file_path.
+
+        :return: True if the file changed
+        """
+        return self.write_body(
+            self.render(exclude_none, exclude_unset, exclude_defaults)
+        )
 
     def delete(self):
         log.info("Deleting template file", file_path=self.file_path)
@@ -544,6 +672,7 @@ class BaseTemplate(
                 file_path=self.file_path,
             )
             os.remove(self.file_path)
+        update_template_indexes(self.file_path)
 
     async def apply(self, config: Config) -> TemplateChangeDetails:
         raise NotImplementedError
@@ -559,6 +688,32 @@ class BaseTemplate(
         return {"iambic_managed", "file_path", "owner"}
 
 
+async def write_templates(
+    templates: Iterable[BaseTemplate],
+    exclude_none=True,
+    exclude_unset=True,
+    exclude_defaults=True,
+    max_concurrent_writes: int = 25,
+) -> int:
+    """Write many templates, flushing up to max_concurrent_writes files at a time.
+
+    Templates are rendered on the event loop because the shared yaml dumper is not thread safe.
+    Only the file comparison and write are run in threads.
+    Files whose content is unchanged are not rewritten.
+
+    :return: The number of files that were changed
+    """
+
+    async def _write(template: BaseTemplate) -> bool:
+        as_yaml = template.render(exclude_none, exclude_unset, exclude_defaults)
+        return await aio_wrapper(template.write_body, as_yaml)
+
+    changed = await gather_limit(
+        *[_write(template) for template in templates], limit=max_concurrent_writes
+    )
+    return sum(changed)
+
+
 class Variable(PydanticBaseModel):
     key: str
     value: str
@@ -611,6 +766,13 @@ class ExpiryModel(IambicPydanticBaseModel):
         return {"expires_at", "deleted"}
 
 
+def _new_template_repository() -> TemplateRepository:
+    # Imported here because the repository loads templates using this module
+    from iambic.core.template_repository import TemplateRepository
+
+    return TemplateRepository()
+
+
 class ExecutionMessage(PydanticBaseModel):
     execution_id: str = Field(..., description="A unique identifier for the execution")
     command: Command
@@ -621,6 +783,15 @@ class ExecutionMessage(PydanticBaseModel):
     template_id: Optional[str]
     metadata: Optional[Dict[str, Any]] = None
     templates: Optional[List[str]] = None
+    # Not serialized. Copies of the message share the repository and store of the run.
+    _template_repository: TemplateRepository = PrivateAttr(
+        default_factory=_new_template_repository
+    )
+    _intermediate_store: IntermediateStore = PrivateAttr()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._intermediate_store = new_intermediate_store(self.execution_id)
 
     @root_validator
     def check_parent_command(cls, values: dict):
@@ -629,6 +800,20 @@ class ExecutionMessage(PydanticBaseModel):
 
         return values
 
+    @property
+    def template_repository(self) -> TemplateRepository:
+        """The existing templates of the run, shared by the message and all of its copies"""
+        return self._template_repository
+
+    @property
+    def intermediate_store(self) -> IntermediateStore:
+        """Where the collectors of the run keep the provider responses for the generators.
+
+        Shared by the message and all of its copies.
+        Set IAMBIC_INTERMEDIATE_STORE to file or sqlite if they run in different processes.
+        """
+        return self._intermediate_store
+
     def get_execution_dir(self, as_regex: bool = False) -> str:
         if as_regex:
             as_regex = "**"
@@ -681,17 +866,25 @@ class ExecutionMessage(PydanticBaseModel):
                         "Unsupported file type. Must be one of yaml, yml, or json."
                     )
 
-        matching_files = glob.glob(
-            os.path.join(
-                self.get_execution_dir(True),
-                *path_dirs if path_dirs else "**",
-                file_name_and_extension or "**",
-            ),
-            recursive=True,
+        pattern = os.path.join(
+            self.get_execution_dir(True),
+            *path_dirs if path_dirs else "**",
+            file_name_and_extension or "**",
         )
+        stored_files = set(await aio_wrapper(self.intermediate_store.glob, pattern))
+        # Some providers write their responses as templates directly to the execution directory
+        matching_files = {
+            file_path
+            for file_path in glob.glob(pattern, recursive=True)
+            if os.path.isfile(file_path)
+        } - stored_files
         response = list(
             await asyncio.gather(
-                *[_get_file_contents(file_path) for file_path in set(matching_files)]
+                *[
+                    self.intermediate_store.read(file_path)
+                    for file_path in stored_files
+                ],
+                *[_get_file_contents(file_path) for file_path in matching_files],
             )
         )
         if flatten_results:
@@ -1,8 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
+import math
+import multiprocessing
+import os
+import pickle
 import traceback
-from typing import Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+from typing import AsyncIterator, Iterable, Iterator, Optional, Union
 
 from pydantic import ValidationError
 from ruamel.yaml.scanner import ScannerError
@@ -10,7 +20,11 @@ from ruamel.yaml.scanner import ScannerError
 from iambic.config.templates import TEMPLATES
 from iambic.core.logger import log
 from iambic.core.models import BaseTemplate
-from iambic.core.utils import transform_comments, yaml
+from iambic.core.template_cache import TEMPLATE_CACHE
+from iambic.core.utils import aio_wrapper, safe_yaml, transform_comments, yaml
+
+# Below this many templates per worker the cost of starting a process outweighs the gain
+MIN_TEMPLATES_PER_WORKER = 100
 
 
 # line number is zero-th based
@@ -65,38 +79,283 @@ def format_validation_error(err, ruamel_dict):
         return f"Unable to compute hints: {captured_traceback}"
 
 
-def load_templates(
-    template_paths: list[str], raise_validation_err: bool = True
+def _load_template(
+    template_path: str,
+    raise_validation_err: bool = True,
+    preserve_comments: bool = True,
+) -> Optional[BaseTemplate]:
+    try:
+        file_content, cache_key = TEMPLATE_CACHE.read(template_path)
+        if template := TEMPLATE_CACHE.get(template_path, cache_key, preserve_comments):
+            return template
+
+        template_stream = StringIO(file_content)
+        # Preserves the file name in ruamel error messages
+        template_stream.name = template_path
+        if preserve_comments:
+            template_dict = transform_comments(yaml.load(template_stream))
+        else:
+            template_dict = safe_yaml.load(template_stream)
+        if template_dict["template_type"] in ["NOQ::Core::Config"]:
+            return None
+        template_cls = TEMPLATES.template_map[template_dict["template_type"]]
+        template_cls.update_forward_refs()
+        template = template_cls(file_path=template_path, **template_dict)
+        TEMPLATE_CACHE.set(template_path, cache_key, template, preserve_comments)
+        return template
+    except KeyError:
+        log.critical(
+            "Invalid template type",
+            file_path=template_path,
+            template_type=template_dict["template_type"],
+        )
+        # We should allow to continue to allow unknown template type; otherwise,
+        # we cannot support forward or backward compatibility during version changes.
+    except (ValidationError, ScannerError) as err:
+        log.critical(
+            "Invalid template structure", file_path=template_path, error=repr(err)
+        )
+        if raise_validation_err:
+            if isinstance(err, ValidationError):
+                if not preserve_comments:
+                    # Line numbers are only tracked by the round trip loader
+                    template_dict = yaml.load(file_content)
+                hints = format_validation_error(err, template_dict)
+            else:
+                hints = ""
+            raise ValueError(
+                f"{template_path} template has validation error. \n{hints}"
+            ) from err
+
+
+def _load_template_shard(
+    template_paths: list[str],
+    raise_validation_err: bool = True,
+    preserve_comments: bool = True,
+) -> list[BaseTemplate]:
+    return list(iter_templates(template_paths, raise_validation_err, preserve_comments))
+
+
+def _init_template_worker(templates: list[type[BaseTemplate]]):
+    # Workers started with spawn/forkserver don't inherit the loaded plugin templates
+    TEMPLATES.set_templates(templates)
+
+
+def _load_template_shard_in_worker(
+    template_paths: list[str], raise_validation_err: bool, preserve_comments: bool
+) -> tuple[list[BaseTemplate], dict[str, int]]:
+    TEMPLATE_CACHE.reset_stats()
+    templates = _load_template_shard(
+        template_paths, raise_validation_err, preserve_comments
+    )
+    return templates, TEMPLATE_CACHE.stats
+
+
+def _get_max_workers(max_workers: Optional[int] = None) -> int:
+    if max_workers is None:
+        max_workers = int(
+            os.environ.get("IAMBIC_TEMPLATE_LOAD_WORKERS", os.cpu_count() or 1)
+        )
+    return max_workers
+
+
+def _create_template_load_pool(max_workers: int) -> ProcessPoolExecutor:
+    # load_templates is called from threads and running event loops,
+    #   forking a process with other threads running can deadlock the child.
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_template_worker,
+        initargs=(TEMPLATES.templates,),
+    )
+
+
+def _load_templates_in_pool(
+    template_paths: list[str],
+    raise_validation_err: bool,
+    preserve_comments: bool,
+    max_workers: int,
+    executor: ProcessPoolExecutor,
 ) -> list[BaseTemplate]:
+    # Use more shards than workers so a slow shard doesn't hold up the pool
+    shard_size = math.ceil(len(template_paths) / (max_workers * 4))
+    shards = [
+        template_paths[elem : elem + shard_size]
+        for elem in range(0, len(template_paths), shard_size)
+    ]
     templates = []
 
-    for template_path in template_paths:
+    futures = [
+        executor.submit(
+            _load_template_shard_in_worker,
+            shard,
+            raise_validation_err,
+            preserve_comments,
+        )
+        for shard in shards
+    ]
+    # Resolving the futures in order preserves the template order
+    #   and raises the error of the first invalid template like the sequential loader.
+    for future in futures:
+        shard_templates, cache_stats = future.result()
+        templates.extend(shard_templates)
+        TEMPLATE_CACHE.hits += cache_stats["hits"]
+        TEMPLATE_CACHE.misses += cache_stats["misses"]
+
+    return templates
+
+
+def load_templates(
+    template_paths: list[str],
+    raise_validation_err: bool = True,
+    max_workers: Optional[int] = None,
+    preserve_comments: bool = True,
+    executor: Optional[ProcessPoolExecutor] = None,
+) -> list[BaseTemplate]:
+    """
+    Parse and validate the templates at the provided paths.
+
+    Large lists are sharded across a process pool and returned in the original order.
+    Falls back to loading in-process if the list is small or a pool can't be created (e.g. AWS Lambda).
+
+    :param template_paths: The paths of the templates to load.
+    :param raise_validation_err: Raise a ValueError on the first invalid template.
+    :param max_workers: The max number of processes to use.
+        Defaults to IAMBIC_TEMPLATE_LOAD_WORKERS or the number of CPUs.
+    :param preserve_comments: Keep the yaml comments so the templates can be written back.
+        Set to False when the templates are only read (e.g. plan) to use the faster C loader.
+    :param executor: A process pool created by the caller to load the templates on,
+        so several calls can share it. A pool is created for the call if not provided.
+    :return: The loaded templates
+    """
+    max_workers = min(
+        _get_max_workers(max_workers),
+        math.ceil(len(template_paths) / MIN_TEMPLATES_PER_WORKER),
+    )
+
+    if max_workers > 1:
         try:
-            template_dict = transform_comments(yaml.load(open(template_path)))
-            if template_dict["template_type"] in ["NOQ::Core::Config"]:
-                continue
-            template_cls = TEMPLATES.template_map[template_dict["template_type"]]
-            template_cls.update_forward_refs()
-            templates.append(template_cls(file_path=template_path, **template_dict))
-        except KeyError:
-            log.critical(
-                "Invalid template type",
-                file_path=template_path,
-                template_type=template_dict["template_type"],
-            )
-            # We should allow to continue to allow unknown template type; otherwise,
-            # we cannot support forward or backward compatibility during version changes.
-        except (ValidationError, ScannerError) as err:
-            log.critical(
-                "Invalid template structure", file_path=template_path, error=repr(err)
+            if executor:
+                templates = _load_templates_in_pool(
+                    template_paths,
+                    raise_validation_err,
+                    preserve_comments,
+                    max_workers,
+                    executor,
+                )
+            else:
+                with _create_template_load_pool(max_workers) as executor:
+                    templates = _load_templates_in_pool(
+                        template_paths,
+                        raise_validation_err,
+                        preserve_comments,
+                        max_workers,
+                        executor,
+                    )
+            log.debug("Template cache stats", **TEMPLATE_CACHE.stats)
+            TEMPLATE_CACHE.prune()
+            return templates
+        except (
+            OSError,
+            NotImplementedError,
+            BrokenProcessPool,
+            pickle.PicklingError,
+        ) as err:
+            log.warning(
+                "Unable to load templates in parallel. Falling back to a single process.",
+                error=repr(err),
             )
-            if raise_validation_err:
-                if isinstance(err, ValidationError):
-                    hints = format_validation_error(err, template_dict)
-                else:
-                    hints = ""
-                raise ValueError(
-                    f"{template_path} template has validation error. \n{hints}"
-                ) from err
 
+    templates = _load_template_shard(
+        template_paths, raise_validation_err, preserve_comments
+    )
+    log.debug("Template cache stats", **TEMPLATE_CACHE.stats)
+    TEMPLATE_CACHE.prune()
     return templates
+
+
+def iter_templates(
+    template_paths: Iterable[str],
+    raise_validation_err: bool = True,
+    preserve_comments: bool = True,
+) -> Iterator[BaseTemplate]:
+    """Lazily parse and validate templates, yielding each one as soon as it is loaded.
+
+    :param template_paths: The paths of the templates to load.
+    :param raise_validation_err: Raise a ValueError on the first invalid template.
+    :param preserve_comments: Keep the yaml comments so the templates can be written back.
+    """
+    for template_path in template_paths:
+        if template := _load_template(
+            template_path, raise_validation_err, preserve_comments
+        ):
+            yield template
+
+
+async def aiter_templates(
+    template_paths: Iterable[str],
+    raise_validation_err: bool = True,
+    chunk_size: int = 500,
+    max_pending_chunks: int = 2,
+    preserve_comments: bool = True,
+    max_workers: Optional[int] = None,
+) -> AsyncIterator[BaseTemplate]:
+    """Async variant of iter_templates.
+
+    Templates are loaded in chunks with load_templates while the consumer works on the previous chunk.
+    The chunks share a single process pool so large repos are still loaded in parallel.
+    At most max_pending_chunks chunks are loaded ahead so memory stays flat regardless of repo size.
+
+    :param template_paths: The paths of the templates to load.
+    :param raise_validation_err: Raise a ValueError on the first invalid template.
+    :param chunk_size: The number of templates loaded by a load_templates call.
+    :param max_pending_chunks: The max number of chunks being loaded or waiting to be consumed.
+    :param preserve_comments: Keep the yaml comments so the templates can be written back.
+    :param max_workers: The max number of processes to use.
+        Defaults to IAMBIC_TEMPLATE_LOAD_WORKERS or the number of CPUs.
+    """
+    template_paths = iter(template_paths)
+    max_workers = min(
+        _get_max_workers(max_workers), math.ceil(chunk_size / MIN_TEMPLATES_PER_WORKER)
+    )
+    executor = None
+    if max_workers > 1:
+        try:
+            executor = _create_template_load_pool(max_workers)
+        except (OSError, NotImplementedError) as err:
+            log.warning(
+                "Unable to load templates in parallel. Falling back to a single process.",
+                error=repr(err),
+            )
+            max_workers = 1
+
+    pending_chunks: deque[asyncio.Future] = deque()
+    try:
+        while True:
+            while len(pending_chunks) < max_pending_chunks and (
+                chunk := list(itertools.islice(template_paths, chunk_size))
+            ):
+                pending_chunks.append(
+                    asyncio.ensure_future(
+                        aio_wrapper(
+                            load_templates,
+                            chunk,
+                            raise_validation_err,
+                            max_workers,
+                            preserve_comments,
+                            executor,
+                        )
+                    )
+                )
+
+            if not pending_chunks:
+                break
+
+            for template in await pending_chunks.popleft():
+                yield template
+    finally:
+        for pending_chunk in pending_chunks:
+            pending_chunk.cancel()
+        await asyncio.gather(*pending_chunks, return_exceptions=True)
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
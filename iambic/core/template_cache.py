@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from importlib import metadata
+from typing import Optional, Union
+
+import xxhash
+
+from iambic.config.templates import TEMPLATES
+from iambic.core.logger import log
+from iambic.core.models import BaseTemplate
+from iambic.core.utils import get_writable_directory
+from iambic.plugins.v0_1_0 import PLUGIN_VERSION
+
+# Bump this whenever the layout of a cache entry changes
+TEMPLATE_CACHE_VERSION = "3"
+# Entries that haven't been read for this long are pruned
+TEMPLATE_CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+# The max number of entries kept, the least recently read are pruned first
+TEMPLATE_CACHE_MAX_ENTRIES = 20000
+# Pruning lists the whole cache so a process does it at most once per interval
+TEMPLATE_CACHE_PRUNE_INTERVAL_SECONDS = 60 * 60
+# Entries are signed with this key so only the user that wrote them can have them unpickled
+SECRET_KEY_FILE_NAME = ".key"
+ENTRY_DIGEST_SIZE = hashlib.sha256().digest_size
+ENTRY_HEADER_SIZE = 4
+
+
+def get_iambic_version() -> str:
+    try:
+        return metadata.version("iambic-core")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _is_private(file_stat: os.stat_result) -> bool:
+    """True if the file is owned by the current user and not writable or readable by anyone else"""
+    if not hasattr(os, "getuid"):
+        # Windows has no uid or mode bits, the user profile directory is already private
+        return True
+    return file_stat.st_uid == os.getuid() and not file_stat.st_mode & 0o077
+
+
+class TemplateCache:
+    def __init__(self, cache_dir: Optional[str] = None):
+        """An on-disk cache of parsed and validated templates.
+
+        Each template file is stored as a single pickled entry named after its path.
+        The entry is only considered valid if the path, size, mtime and content hash of the file
+            as well as the iambic and plugin versions match the ones used to create it.
+        An entry created without comments is not returned to a caller that needs them.
+        Entries are written atomically so the cache can be shared between CLI runs,
+            concurrent processes and a warm Lambda container.
+
+        Entries are HMAC signed with a key only readable by the current user
+            and are never unpickled unless the signature matches and the entry is owned by the user.
+        Entries that haven't been read in TEMPLATE_CACHE_MAX_AGE_SECONDS are pruned
+            as are the least recently read ones past TEMPLATE_CACHE_MAX_ENTRIES.
+
+        The cache is opt-in, enable it by setting IAMBIC_TEMPLATE_CACHE_ENABLED=true
+
+        :param cache_dir: Defaults to IAMBIC_TEMPLATE_CACHE_DIR
+            or .iambic/cache/templates under the writable directory.
+        """
+        self._cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._version_key = "|".join(
+            [TEMPLATE_CACHE_VERSION, get_iambic_version(), PLUGIN_VERSION]
+        )
+        # cache_dir -> secret key or None if the directory can't be trusted
+        self._secret_keys: dict[str, Optional[bytes]] = {}
+        self._last_pruned: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return os.environ.get("IAMBIC_TEMPLATE_CACHE_ENABLED", "false").lower() in [
+            "1",
+            "true",
+            "yes",
+        ]
+
+    @property
+    def cache_dir(self) -> str:
+        # Resolved on every call because init_writable_directory may run after import
+        return (
+            self._cache_dir
+            or os.environ.get("IAMBIC_TEMPLATE_CACHE_DIR")
+            or os.path.join(get_writable_directory(), ".iambic", "cache", "templates")
+        )
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entry_path(self, template_path: str) -> str:
+        path_hash = xxhash.xxh3_64_hexdigest(os.path.abspath(template_path))
+        return os.path.join(self.cache_dir, f"{path_hash}.pickle")
+
+    def _create_secret_key(self, cache_dir: str) -> Optional[bytes]:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not _is_private(os.stat(cache_dir)):
+            log.warning(
+                "The template cache directory is accessible by other users. Not using it.",
+                cache_dir=cache_dir,
+            )
+            return None
+
+        key_path = os.path.join(cache_dir, SECRET_KEY_FILE_NAME)
+        if not os.path.exists(key_path):
+            # mkstemp creates the file as 0600, linking fails if another process created the key first
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(os.urandom(32))
+                os.link(tmp_path, key_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+
+        with open(key_path, "rb") as f:
+            if not _is_private(os.fstat(f.fileno())):
+                log.warning(
+                    "The template cache key is accessible by other users. Not using the cache.",
+                    cache_dir=cache_dir,
+                )
+                return None
+            return f.read()
+
+    def _get_secret_key(self) -> Optional[bytes]:
+        cache_dir = self.cache_dir
+        if cache_dir not in self._secret_keys:
+            try:
+                self._secret_keys[cache_dir] = self._create_secret_key(cache_dir)
+            except OSError as err:
+                log.debug(
+                    "Unable to create the template cache key",
+                    cache_dir=cache_dir,
+                    error=repr(err),
+                )
+                self._secret_keys[cache_dir] = None
+        return self._secret_keys[cache_dir]
+
+    def read(self, template_path: str) -> tuple[str, Optional[str]]:
+        """Read the template file and compute its cache key.
+
+        :param template_path: The path to the template file
+        :return: (file_content, cache_key) where cache_key is None if the cache is disabled
+        """
+        with open(template_path, "rb") as f:
+            file_bytes = f.read()
+
+        if not self.enabled or not self._get_secret_key():
+            return file_bytes.decode("utf-8"), None
+
+        file_stat = os.stat(template_path)
+        cache_key = xxhash.xxh3_64_hexdigest(
+            "|".join(
+                [
+                    os.path.abspath(template_path),
+                    str(file_stat.st_size),
+                    str(file_stat.st_mtime_ns),
+                    xxhash.xxh3_64_hexdigest(file_bytes),
+                    self._version_key,
+                ]
+            )
+        )
+        return file_bytes.decode("utf-8"), cache_key
+
+    def get(
+        self,
+        template_path: str,
+        cache_key: Optional[str],
+        preserve_comments: bool = True,
+    ) -> Union[BaseTemplate, None]:
+        if not cache_key:
+            return None
+
+        entry_path = self._get_entry_path(template_path)
+        try:
+            with open(entry_path, "rb") as f:
+                if not _is_private(os.fstat(f.fileno())):
+                    raise ValueError("The entry is accessible by other users")
+                entry_bytes = f.read()
+
+            digest = entry_bytes[:ENTRY_DIGEST_SIZE]
+            signed_bytes = entry_bytes[ENTRY_DIGEST_SIZE:]
+            if not hmac.compare_digest(
+                digest,
+                hmac.new(self._get_secret_key(), signed_bytes, hashlib.sha256).digest(),
+            ):
+                raise ValueError("The entry signature doesn't match")
+
+            # The key is stored in a header so a stale entry is rejected
+            #   without paying the cost of unpickling the template.
+            header_size = int.from_bytes(signed_bytes[:ENTRY_HEADER_SIZE], "big")
+            header = json.loads(
+                signed_bytes[ENTRY_HEADER_SIZE : ENTRY_HEADER_SIZE + header_size]
+            )
+            if header["key"] != cache_key or (
+                preserve_comments and not header["comments"]
+            ):
+                self.misses += 1
+                return None
+            template = pickle.loads(signed_bytes[ENTRY_HEADER_SIZE + header_size :])
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as err:
+            log.debug(
+                "Unable to read template cache entry",
+                file_path=template_path,
+                error=repr(err),
+            )
+            self.misses += 1
+            return None
+
+        # The plugin providing the template type may have been removed or replaced
+        template_cls = TEMPLATES.template_map.get(
+            getattr(template, "template_type", None)
+        )
+        if not template_cls or not isinstance(template, template_cls):
+            self.misses += 1
+            return None
+
+        try:
+            # The mtime of an entry is when it was last read, used to prune the least recently read
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        template.file_path = template_path
+        self.hits += 1
+        return template
+
+    def set(
+        self,
+        template_path: str,
+        cache_key: Optional[str],
+        template: BaseTemplate,
+        preserve_comments: bool = True,
+    ):
+        if not cache_key:
+            return
+
+        tmp_path = None
+        try:
+            header = json.dumps({"key": cache_key, "comments": preserve_comments})
+            signed_bytes = b"".join(
+                [
+                    len(header).to_bytes(ENTRY_HEADER_SIZE, "big"),
+                    header.encode("utf-8"),
+                    pickle.dumps(template, protocol=pickle.HIGHEST_PROTOCOL),
+                ]
+            )
+            digest = hmac.new(
+                self._get_secret_key(), signed_bytes, hashlib.sha256
+            ).digest()
+            # mkstemp creates the file as 0600
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(digest)
+                f.write(signed_bytes)
+            os.replace(tmp_path, self._get_entry_path(template_path))
+        except Exception as err:
+            # Templates from plugins that are not importable can't be pickled
+            log.debug(
+                "Unable to write template cache entry",
+                file_path=template_path,
+                error=repr(err),
+            )
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prune(self, force: bool = False):
+        """Remove the entries that haven't been read recently.
+
+        Entries older than TEMPLATE_CACHE_MAX_AGE_SECONDS are removed,
+            then the least recently read ones until at most TEMPLATE_CACHE_MAX_ENTRIES are left.
+
+        :param force: Prune even if the cache was pruned less than TEMPLATE_CACHE_PRUNE_INTERVAL_SECONDS ago.
+        """
+        cache_dir = self.cache_dir
+        now = time.time()
+        if not self.enabled or not os.path.isdir(cache_dir):
+            return
+        elif (
+            not force
+            and now - self._last_pruned.get(cache_dir, 0)
+            < TEMPLATE_CACHE_PRUNE_INTERVAL_SECONDS
+        ):
+            return
+
+        self._last_pruned[cache_dir] = now
+        entries = []
+        with os.scandir(cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if not dir_entry.name.endswith((".pickle", ".tmp")):
+                    continue
+                try:
+                    entries.append((dir_entry.stat().st_mtime, dir_entry.path))
+                except FileNotFoundError:
+                    continue
+
+        entries.sort(reverse=True)
+        expired_entries = [
+            entry_path
+            for elem, (mtime, entry_path) in enumerate(entries)
+            if elem >= TEMPLATE_CACHE_MAX_ENTRIES
+            or now - mtime > TEMPLATE_CACHE_MAX_AGE_SECONDS
+        ]
+        for entry_path in expired_entries:
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+
+        if expired_entries:
+            log.debug(
+                "Pruned the template cache",
+                cache_dir=cache_dir,
+                pruned_count=len(expired_entries),
+            )
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._secret_keys.pop(self.cache_dir, None)
+        self.reset_stats()
+
+
+TEMPLATE_CACHE = TemplateCache()
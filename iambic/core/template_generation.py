@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import functools
+import re
+from bisect import bisect_right
 from collections import defaultdict
 from typing import Union
 
@@ -11,14 +14,18 @@ from iambic.core.logger import log
 from iambic.core.models import AccessModelMixin, BaseModel, BaseTemplate, ProviderChild
 from iambic.core.parser import load_templates
 from iambic.core.utils import (
+    ProviderValueResolver,
     evaluate_on_provider,
     gather_templates,
-    get_provider_value,
+    get_access_rule_matcher,
     is_regex_match,
     sanitize_string,
 )
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
 
+# The max number of templatized strings each AccountTemplatizer keeps
+TEMPLATIZED_VALUE_CACHE_SIZE = 10000
+
 
 async def get_existing_template_map(repo_dir: str, template_type: str) -> dict:
     """Used to keep track of existing templates on import
@@ -33,30 +40,127 @@ async def get_existing_template_map(repo_dir: str, template_type: str) -> dict:
     return {template.resource_id: template for template in templates}
 
 
-def templatize_resource(aws_account: AWSAccount, resource):
-    # TODO: Move away from AWSAccount to a provider agnostic implementation
-    resource_type = type(resource)
+class AccountTemplatizer:
+    def __init__(self, account_id: str, account_name: str, variables: tuple):
+        """Replaces an account's values in a resource with their template variables.
+
+        The values are replaced one after the other in the order they are provided in,
+            so a value that contains another one (e.g. an arn with the account id) is replaced
+            the same way as with sequential str.replace calls.
+        Unlike str.replace, text that was already replaced isn't matched again
+            so a placeholder is never partially replaced.
+        A regex of all values is compiled to skip the strings that contain none of them.
+
+        :param account_id: The account id replaced with {{account_id}}
+        :param account_name: The sanitized account name replaced with {{account_name}}
+        :param variables: tuple[tuple(key, value)] each value is replaced with {{key}}
+        """
+        self.replacements: dict[str, str] = {}
+        for value, placeholder in [
+            (account_id, "{{account_id}}"),
+            (account_name, "{{account_name}}"),
+            *(
+                (var_value, "{{{}}}".format(var_key))
+                for var_key, var_value in variables
+            ),
+        ]:
+            # An empty value would match between every character
+            if value and value not in self.replacements:
+                self.replacements[value] = placeholder
+
+        self._pattern = (
+            re.compile("|".join(re.escape(value) for value in self.replacements))
+            if self.replacements
+            else None
+        )
+        # Substituting values json doesn't escape keeps serialized resources in the form json.dumps returns
+        self.is_json_safe = all(
+            json.dumps(value) == f'"{value}"' for value in self.replacements
+        )
+        self._cache: dict[str, str] = {}
+
+    def sub(self, text: str) -> str:
+        """Templatizes text without caching the result. Used for serialized resources."""
+        if not self._pattern or not self._pattern.search(text):
+            return text
+
+        # Alternates between text that can still be replaced and the placeholders inserted
+        segments = [text]
+        for value, placeholder in self.replacements.items():
+            replaced_segments = []
+            for elem, segment in enumerate(segments):
+                if elem % 2 or value not in segment:
+                    replaced_segments.append(segment)
+                    continue
+
+                for part_elem, part in enumerate(segment.split(value)):
+                    if part_elem:
+                        replaced_segments.append(placeholder)
+                    replaced_segments.append(part)
+            segments = replaced_segments
+
+        return "".join(segments)
+
+    def templatize_str(self, resource: str) -> str:
+        if not self._pattern:
+            return resource
+        elif (templatized_resource := self._cache.get(resource)) is not None:
+            return templatized_resource
+
+        if len(self._cache) >= TEMPLATIZED_VALUE_CACHE_SIZE:
+            self._cache.clear()
+        templatized_resource = self.sub(resource)
+        self._cache[resource] = templatized_resource
+        return templatized_resource
 
-    if isinstance(resource, dict) or isinstance(resource, list):
-        resource = json.dumps(resource)
-    elif resource_type != str:
-        resource = str(resource)
+    def templatize(self, resource):
+        """Templatizes the str keys and values of a resource.
+
+        dicts and lists are always returned as a new copy.
+        Any other type is templatized as a str then cast back to its original type.
+        """
+        if isinstance(resource, str):
+            return self.templatize_str(resource)
+        elif isinstance(resource, dict):
+            return {
+                (
+                    self.templatize_str(key) if isinstance(key, str) else key
+                ): self.templatize(value)
+                for key, value in resource.items()
+            }
+        elif isinstance(resource, list):
+            return [self.templatize(value) for value in resource]
+        elif resource is None or isinstance(resource, bool):
+            return resource
+
+        return type(resource)(self.templatize_str(str(resource)))
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_account_templatizer(
+    account_id: str, account_name: str, variables: tuple
+) -> AccountTemplatizer:
     valid_characters_re = r"[\w_+=,.@-]"
-    resource = resource.replace(aws_account.account_id, "{{account_id}}")
-    resource = resource.replace(
-        sanitize_string(aws_account.account_name, valid_characters_re),
-        "{{account_name}}",
+    return AccountTemplatizer(
+        account_id, sanitize_string(account_name, valid_characters_re), variables
     )
-    for var in aws_account.variables:
-        resource = resource.replace(var.value, "{{{}}}".format(var.key))
 
-    return (
-        json.loads(resource)
-        if resource_type == dict or resource_type == list
-        else resource_type(resource)
+
+def get_account_templatizer(aws_account: AWSAccount) -> AccountTemplatizer:
+    """Returns the AccountTemplatizer for the aws_account, compiled once per distinct account config"""
+    # TODO: Move away from AWSAccount to a provider agnostic implementation
+    return _get_account_templatizer(
+        aws_account.account_id,
+        aws_account.account_name,
+        tuple((var.key, var.value) for var in aws_account.variables),
     )
 
 
+def templatize_resource(aws_account: AWSAccount, resource):
+    # TODO: Move away from AWSAccount to a provider agnostic implementation
+    return get_account_templatizer(aws_account).templatize(resource)
+
+
 def base_group_int_attribute(account_vals: dict) -> dict[int, list[dict[str, str]]]:
     """Groups an int attribute by a shared name across of aws_accounts
 
@@ -73,6 +177,48 @@ def base_group_int_attribute(account_vals: dict) -> dict[int, list[dict[str, str
     return response
 
 
+def _get_resource_hashes(resource_json: str, templatizer: AccountTemplatizer) -> tuple:
+    """Returns (resource_hash, templatized_json, templatized_resource_hash) for a serialized dict or list"""
+    resource_hash = xxhash.xxh32(resource_json).hexdigest()
+    templatized_json = templatizer.sub(resource_json)
+    if templatized_json == resource_json:
+        return resource_hash, resource_json, resource_hash
+
+    if not templatizer.is_json_safe:
+        # Hash the re-serialized value to match how the templatized dict is represented elsewhere
+        templatized_json = json.dumps(json.loads(templatized_json))
+    return (
+        resource_hash,
+        templatized_json,
+        xxhash.xxh32(templatized_json).hexdigest(),
+    )
+
+
+def _templatize_and_hash_resource(
+    templatizer: AccountTemplatizer, resource_val, resource_hashes_cache: dict
+) -> tuple:
+    """Returns (resource_hash, templatized_val, templatized_resource_hash) for a resource value
+
+    resource_hashes_cache is owned by the caller so a dict or list value seen on many resources
+    is only templatized and hashed once for that call and released with it.
+    """
+    if isinstance(resource_val, dict) or isinstance(resource_val, list):
+        cache_key = (json.dumps(resource_val), templatizer)
+        if (resource_hashes := resource_hashes_cache.get(cache_key)) is None:
+            resource_hashes = _get_resource_hashes(*cache_key)
+            resource_hashes_cache[cache_key] = resource_hashes
+        resource_hash, templatized_json, templatized_resource_hash = resource_hashes
+        # Always load a new copy because the grouped value is mutated by the caller
+        return resource_hash, json.loads(templatized_json), templatized_resource_hash
+
+    templatized_val = templatizer.templatize(resource_val)
+    return (
+        xxhash.xxh32(json.dumps(resource_val)).hexdigest(),
+        templatized_val,
+        xxhash.xxh32(json.dumps(templatized_val)).hexdigest(),
+    )
+
+
 async def base_group_str_attribute(
     aws_account_map: dict[str, AWSAccount], account_resources: list[dict]
 ) -> dict[str, list]:
@@ -89,28 +235,25 @@ async def base_group_str_attribute(
     :return: dict(attribute_val: str = list[dict(resource_val: str, account_id: str, **)])
     """
 
+    # TODO: Move away from AWSAccount to a provider agnostic implementation
     """
-    Create map with different representations of a resource value for each account
-    (Note that we now only keep the post-templatized version)
+    Bucket every resource by its templatized value in a single pass.
+    (Note that we only keep the post-templatized version)
 
-    The purpose is to add the 2 ways look-ups are done and maintain o(1) performance.
-    The resource_val to the corresponding list element in account_resources[elem]["resources"]
-        Under resource_val_map
-    The reverse of resource_val_map which is an int representing the elem with a list of all resource_val reprs
-        Under elem_resource_val_map
+    resource_val_accounts maps resource_val -> {account_resource_elem: resource_elem}
+        Accounts are inserted in the order they are first seen.
+        If a value is repeated within an account only the last resource is grouped with other accounts.
+    account_resource_vals holds the templatized value of every resource in each account.
     """
-    # TODO: Move away from AWSAccount to a provider agnostic implementation
+    resource_val_accounts: dict[str, dict[int, int]] = dict()
+    account_resource_vals: list[list[str]] = []
     for account_resource_elem, account_resource in enumerate(account_resources):
-        account_resources[account_resource_elem]["resource_val_map"] = dict()
-        account_resources[account_resource_elem]["elem_resource_val_map"] = dict()
-        aws_account = aws_account_map[account_resource["account_id"]]
+        templatizer = get_account_templatizer(
+            aws_account_map[account_resource["account_id"]]
+        )
+        resource_vals = []
         for resource_elem, resource in enumerate(account_resource["resources"]):
-            account_resource["resources"][resource_elem][
-                "account_id"
-            ] = account_resource["account_id"]
-            resource_val = resource["resource_val"]
-            templatized_resource_val = templatize_resource(aws_account, resource_val)
-
+            resource["account_id"] = account_resource["account_id"]
             # note about the decision we only kept the post-templatized version
             # we aggressively templatized the incoming information.
             # a note for future reader: if you attempt to conditional decide
@@ -119,78 +262,48 @@ async def base_group_str_attribute(
             # Concretely, if a literal can both be repeated across accounts
             # or templatized across accounts, greedy algorithm may reach
             # different states.
-
-            account_resources[account_resource_elem]["resource_val_map"][
-                templatized_resource_val
+            resource_val = templatizer.templatize(resource["resource_val"])
+            resource_vals.append(resource_val)
+            resource_val_accounts.setdefault(resource_val, dict())[
+                account_resource_elem
             ] = resource_elem
-            account_resources[account_resource_elem]["elem_resource_val_map"][
-                resource_elem
-            ] = [templatized_resource_val]
+        account_resource_vals.append(resource_vals)
 
     grouped_resource_map = defaultdict(
         list
     )  # val:str = list(dict(name: str, path: str, account_id: str))
-    # Iterate everything looking for shared names across aws_accounts
-    for outer_elem in range(len(account_resources)):
-        for resource_val, outer_resource_elem in account_resources[outer_elem][
-            "resource_val_map"
-        ].items():
-            if outer_resource_elem is None:  # It hit on something already
-                continue
-            for inner_elem in range(outer_elem + 1, len(account_resources)):
-                if (
-                    inner_resource_elem := account_resources[inner_elem][
-                        "resource_val_map"
-                    ].get(resource_val)
-                ) is not None:
-                    if not grouped_resource_map.get(resource_val):
-                        # Null out the outer_resource_elem in all the places
-                        for rn in account_resources[outer_elem][
-                            "elem_resource_val_map"
-                        ][outer_resource_elem]:
-                            account_resources[outer_elem]["resource_val_map"][rn] = None
-                        account_resources[outer_elem]["elem_resource_val_map"][
-                            outer_resource_elem
-                        ] = []
-
-                        grouped_resource_map[resource_val] = [
-                            account_resources[inner_elem]["resources"][
-                                inner_resource_elem
-                            ],
-                            account_resources[outer_elem]["resources"][
-                                outer_resource_elem
-                            ],
-                        ]
-                    else:
-                        grouped_resource_map[resource_val].append(
-                            account_resources[inner_elem]["resources"][
-                                inner_resource_elem
-                            ]
-                        )
-
-                    for rn in account_resources[inner_elem]["elem_resource_val_map"][
-                        inner_resource_elem
-                    ]:
-                        account_resources[inner_elem]["resource_val_map"][rn] = None
-                    account_resources[inner_elem]["elem_resource_val_map"][
-                        inner_resource_elem
-                    ] = []
+    # Values shared across aws_accounts.
+    # The order matches the original pairwise comparison of accounts:
+    #   the 2nd account with the value, the 1st, then the rest in order.
+    for resource_val, account_elems in resource_val_accounts.items():
+        if len(account_elems) < 2:
+            continue
 
-    # Set the remaining attributes unique attributes
-    for account_resource in account_resources:
-        for elem, resource_vals in account_resource["elem_resource_val_map"].items():
-            if not resource_vals:
-                continue
-            elif len(resource_vals) == 1:
-                resource_val = resource_vals[0]
-            else:
-                # Take priority over raw output
-                resource_val = [rv for rv in resource_vals if "{{" not in rv][0]
+        shared_resources = [
+            account_resources[account_resource_elem]["resources"][resource_elem]
+            for account_resource_elem, resource_elem in account_elems.items()
+        ]
+        shared_resources[0], shared_resources[1] = (
+            shared_resources[1],
+            shared_resources[0],
+        )
+        grouped_resource_map[resource_val] = shared_resources
+
+    # Set the remaining unique attributes
+    for account_resource_elem, account_resource in enumerate(account_resources):
+        for resource_elem, resource_val in enumerate(
+            account_resource_vals[account_resource_elem]
+        ):
+            account_elems = resource_val_accounts[resource_val]
+            if (
+                len(account_elems) > 1
+                and account_elems[account_resource_elem] == resource_elem
+            ):
+                continue  # Already grouped across accounts
 
-            account_resource["resources"][elem]["account_id"] = account_resource[
-                "account_id"
+            grouped_resource_map[resource_val] = [
+                account_resource["resources"][resource_elem]
             ]
-            grouped_resource_map[resource_val] = [account_resource["resources"][elem]]
 
     return grouped_resource_map
 
@@ -213,101 +326,106 @@ async def base_group_dict_attribute(
     Create map with different representations of a resource value for each account
 
     Create a resource_hash to the corresponding list element in account_resources[elem]["resources"]
-        Under resource_hash_map
-    Create a reverse of resource_hash_map which is an int representing the elem with a list of all resource_hash reprs
-        Under elem_resource_hash_map
+        Under account_resource_hash_maps[elem]
+    Create a reverse of the resource_hash_map which is an int representing the elem with a list of all resource_hash reprs
+        Under account_elem_resource_hash_maps[elem]
+    Create a map of every resource_hash to the sorted list of account elems it was seen on
+        Under hash_accounts_map so shared hashes are found without comparing every pair of accounts
     """
     # TODO: Move away from AWSAccount to a provider agnostic implementation
     hash_map = dict()
+    account_resource_hash_maps: list[dict[str, int]] = []
+    account_elem_resource_hash_maps: list[dict[int, list[str]]] = []
+    hash_accounts_map: dict[str, list[int]] = defaultdict(list)
+    # Scoped to this call so the memoized hashes are released once the attribute is grouped
+    resource_hashes_cache: dict[tuple, tuple] = {}
 
     for account_resource_elem, account_resource in enumerate(account_resources):
-        account_resources[account_resource_elem]["resource_hash_map"] = dict()
-        account_resources[account_resource_elem]["elem_resource_hash_map"] = dict()
-        aws_account = aws_account_map[account_resource["account_id"]]
+        resource_hash_map = dict()
+        elem_resource_hash_map = dict()
+        templatizer = get_account_templatizer(
+            aws_account_map[account_resource["account_id"]]
+        )
         for resource_elem, resource in enumerate(account_resource["resources"]):
-            account_resource["resources"][resource_elem][
-                "account_id"
-            ] = account_resource["account_id"]
+            resource["account_id"] = account_resource["account_id"]
+            resource_val = resource["resource_val"]
+            (
+                resource_hash,
+                templatized_val,
+                templatized_resource_hash,
+            ) = _templatize_and_hash_resource(
+                templatizer, resource_val, resource_hashes_cache
+            )
+
             # Set raw dict
-            resource_hash = xxhash.xxh32(
-                json.dumps(resource["resource_val"])
-            ).hexdigest()
-            hash_map[resource_hash] = resource["resource_val"]
+            hash_map[resource_hash] = resource_val
             # Set dict with attempted interpolation
-            templatized_dict = templatize_resource(
-                aws_account, resource["resource_val"]
-            )
-            templatized_resource_hash = xxhash.xxh32(
-                json.dumps(templatized_dict)
-            ).hexdigest()
-            hash_map[templatized_resource_hash] = templatized_dict
+            hash_map[templatized_resource_hash] = templatized_val
             # Define resource hash mappings
-            account_resources[account_resource_elem]["resource_hash_map"][
-                resource_hash
-            ] = resource_elem
-            account_resources[account_resource_elem]["elem_resource_hash_map"][
-                resource_elem
-            ] = [resource_hash]
+            resource_hashes = [resource_hash]
             if templatized_resource_hash != resource_hash:
-                account_resources[account_resource_elem]["resource_hash_map"][
-                    templatized_resource_hash
-                ] = resource_elem
-                account_resources[account_resource_elem]["elem_resource_hash_map"][
-                    resource_elem
-                ].append(templatized_resource_hash)
+                resource_hashes.append(templatized_resource_hash)
+            for rh in resource_hashes:
+                if rh not in resource_hash_map:
+                    hash_accounts_map[rh].append(account_resource_elem)
+                resource_hash_map[rh] = resource_elem
+            elem_resource_hash_map[resource_elem] = resource_hashes
+
+        account_resource_hash_maps.append(resource_hash_map)
+        account_elem_resource_hash_maps.append(elem_resource_hash_map)
 
     grouped_resource_map = (
         dict()
     )  # val:str = list(dict(name: str, path: str, account_id: str))
     # Iterate everything looking for shared names across aws_accounts
-    for outer_elem in range(len(account_resources)):
-        for resource_hash, outer_resource_elem in account_resources[outer_elem][
-            "resource_hash_map"
-        ].items():
+    for outer_elem, resource_hash_map in enumerate(account_resource_hash_maps):
+        for resource_hash, outer_resource_elem in resource_hash_map.items():
             if outer_resource_elem is None:  # It hit on something already
                 continue
-            for inner_elem in range(outer_elem + 1, len(account_resources)):
+
+            hash_accounts = hash_accounts_map[resource_hash]
+            for inner_elem in hash_accounts[bisect_right(hash_accounts, outer_elem) :]:
                 if (
-                    inner_resource_elem := account_resources[inner_elem][
-                        "resource_hash_map"
-                    ].get(resource_hash)
-                ) is not None:
-                    if not grouped_resource_map.get(resource_hash):
-                        grouped_resource_map[resource_hash] = {
-                            "resource_val": hash_map[resource_hash],
-                            "included_accounts": [
-                                account_resources[inner_elem]["account_id"],
-                                account_resources[outer_elem]["account_id"],
-                            ],
-                        }
-
-                        # Null out the outer_resource_elem in all the places
-                        for rn in account_resources[outer_elem][
-                            "elem_resource_hash_map"
-                        ][outer_resource_elem]:
-                            account_resources[outer_elem]["resource_hash_map"][
-                                rn
-                            ] = None
-                        account_resources[outer_elem]["elem_resource_hash_map"][
-                            outer_resource_elem
-                        ] = []
-                    else:
-                        grouped_resource_map[resource_hash]["included_accounts"].append(
-                            account_resources[inner_elem]["account_id"]
-                        )
-
-                    # Null out the inner_resource_elem in all the places
-                    for rn in account_resources[inner_elem]["elem_resource_hash_map"][
-                        inner_resource_elem
+                    inner_resource_elem := account_resource_hash_maps[inner_elem].get(
+                        resource_hash
+                    )
+                ) is None:
+                    continue
+
+                if not grouped_resource_map.get(resource_hash):
+                    grouped_resource_map[resource_hash] = {
+                        "resource_val": hash_map[resource_hash],
+                        "included_accounts": [
+                            account_resources[inner_elem]["account_id"],
+                            account_resources[outer_elem]["account_id"],
+                        ],
+                    }
+
+                    # Null out the outer_resource_elem in all the places
+                    for rn in account_elem_resource_hash_maps[outer_elem][
+                        outer_resource_elem
                     ]:
-                        account_resources[inner_elem]["resource_hash_map"][rn] = None
-                    account_resources[inner_elem]["elem_resource_hash_map"][
-                        inner_resource_elem
+                        resource_hash_map[rn] = None
+                    account_elem_resource_hash_maps[outer_elem][
+                        outer_resource_elem
                     ] = []
+                else:
+                    grouped_resource_map[resource_hash]["included_accounts"].append(
+                        account_resources[inner_elem]["account_id"]
+                    )
+
+                # Null out the inner_resource_elem in all the places
+                for rn in account_elem_resource_hash_maps[inner_elem][
+                    inner_resource_elem
+                ]:
+                    account_resource_hash_maps[inner_elem][rn] = None
+                account_elem_resource_hash_maps[inner_elem][inner_resource_elem] = []
 
     # Set the remaining attributes unique attributes
-    for account_resource in account_resources:
-        for elem, resource_hashes in account_resource["elem_resource_hash_map"].items():
+    for account_resource_elem, account_resource in enumerate(account_resources):
+        for elem, resource_hashes in account_elem_resource_hash_maps[
+            account_resource_elem
+        ].items():
             if not resource_hashes:
                 continue
             elif len(resource_hashes) == 1:
@@ -628,6 +746,11 @@ def sort_access_models_by_included_children(
     )
 
 
+def _get_resource_id_key(resource_id):
+    # Some resource ids (e.g. a principal's aws) can be a list
+    return tuple(resource_id) if isinstance(resource_id, list) else resource_id
+
+
 def resolve_model_orphaned_children(
     new_model: AccessModelMixin,
     merged_model_list: list[AccessModelMixin],
@@ -641,20 +764,29 @@ def resolve_model_orphaned_children(
     These children are ones that didn't hit on an existing model's included_children
     """
     all_provider_children = list(provider_child_map.values())
+    lower_resolved_children = {child.lower() for child in resolved_children}
+    # Whether the new model has the same iambic_specific_knowledge as the merged model at each elem
+    #   Only recomputed when the merged model at the elem is replaced
+    can_merge_map: dict[int, bool] = {}
 
     for included_child in new_model.included_children:
         provider_child = provider_child_map.get(included_child)
         if not provider_child:
             continue
 
-        if any(is_regex_match(included_child, child) for child in resolved_children):
+        if "*" in included_child:
+            if any(
+                is_regex_match(included_child, child) for child in resolved_children
+            ):
+                continue
+        elif included_child.lower() in lower_resolved_children:
             continue
 
+        provider_identifier = {provider_child.preferred_identifier}
         for elem, matching_model in enumerate(merged_model_list):
-            if any(
-                is_regex_match(child, provider_child.preferred_identifier)
-                for child in matching_model.excluded_children
-            ):
+            if get_access_rule_matcher(
+                matching_model.included_children, matching_model.excluded_children
+            ).is_excluded(provider_identifier):
                 # Don't merge the child if the model excludes it explicitly
                 continue
 
@@ -664,16 +796,25 @@ def resolve_model_orphaned_children(
                     and the new model has the same values for the attributes
                 attempt to merge, if successful update the merged_model
             """
-            if not getattr(matching_model, "iambic_specific_knowledge", None) or all(
-                getattr(new_model, attr, None) == getattr(matching_model, attr, None)
-                for attr in matching_model.iambic_specific_knowledge()
-            ):
+            if (can_merge := can_merge_map.get(elem)) is None:
+                can_merge = not getattr(
+                    matching_model, "iambic_specific_knowledge", None
+                ) or all(
+                    getattr(new_model, attr, None)
+                    == getattr(matching_model, attr, None)
+                    for attr in matching_model.iambic_specific_knowledge()
+                )
+                can_merge_map[elem] = can_merge
+
+            if can_merge:
                 resolved_children.add(included_child)
+                lower_resolved_children.add(included_child.lower())
                 merged_model = merge_model(
                     new_model, matching_model, all_provider_children
                 )
                 if merged_model:
                     merged_model_list[elem] = merged_model
+                    can_merge_map.pop(elem)
                     break
 
     return merged_model_list, resolved_children
@@ -695,13 +836,19 @@ def merge_access_model_list(
     provider_child_map = {
         child.preferred_identifier: child for child in all_provider_children
     }
-    for new_model_index, new_model in enumerate(new_list):
-        matching_existing_models = [
+    existing_model_map = defaultdict(list)
+    for existing_model in existing_list:
+        existing_model_map[_get_resource_id_key(existing_model.resource_id)].append(
             existing_model
-            for existing_model in existing_list
-            if (existing_model.resource_id == new_model.resource_id)
-            and new_model.resource_id  # we cannot match on empty string like value
-        ]
+        )
+
+    for new_model_index, new_model in enumerate(new_list):
+        new_resource_id = new_model.resource_id
+        matching_existing_models = (
+            existing_model_map.get(_get_resource_id_key(new_resource_id), [])
+            if new_resource_id  # we cannot match on empty string like value
+            else []
+        )
         if not matching_existing_models:
             # #attempt to carry over previous list's iambic specific information for the merged_value
             if new_model_index < len(existing_list):
@@ -746,22 +893,26 @@ def merge_access_model_list(
             """
             sub_merged_model_list = []
             resolved_children = set()
+            existing_model_resolver = ProviderValueResolver(matching_existing_models)
 
             for included_child in new_model.included_children:
                 provider_child = provider_child_map.get(included_child)
                 if not provider_child:
                     continue
 
-                if sub_merged_model_list:
-                    if get_provider_value(
-                        sub_merged_model_list, provider_child.all_identifiers
-                    ):
-                        resolved_children.add(included_child)
-                        continue
+                provider_identifiers = provider_child.all_identifiers
+                if any(
+                    get_access_rule_matcher(
+                        merged_model.included_children,
+                        merged_model.excluded_children,
+                    ).is_included(provider_identifiers)
+                    for merged_model in sub_merged_model_list
+                ):
+                    # Already covered by a model merged for a previous child
+                    resolved_children.add(included_child)
+                    continue
 
-                existing_model = get_provider_value(
-                    matching_existing_models, provider_child.all_identifiers
-                )
+                existing_model = existing_model_resolver.resolve(provider_identifiers)
                 if existing_model:
                     resolved_children.add(included_child)
                     merged_model = merge_model(
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Optional
+
+import xxhash
+
+from iambic.core.logger import log
+
+# Bump this whenever the layout of the persisted index changes
+TEMPLATE_INDEX_VERSION = "1"
+TEMPLATE_FILE_EXTENSIONS = (".yaml", ".yml")
+TEMPLATE_TYPE_REGEX = re.compile(r"template_type:\s*[\"']?(NOQ::[^\s\"'#]+)")
+TEMPLATE_IDENTIFIER_REGEX = re.compile(
+    r"^identifier:[ \t]*[\"']?([^\"'#\n]*?)[\"']?[ \t]*(?:#.*)?$", re.MULTILINE
+)
+
+
+class TemplateIndex:
+    def __init__(self, repo_dir: str, index_path: Optional[str] = None):
+        """An index of every template in a repo keyed by its path relative to repo_dir.
+
+        Each entry is (mtime_ns, size, template_type, identifier).
+        template_type is None for yaml files that are not IAMbic templates.
+
+        A refresh walks the repo once with os.scandir and only reads files whose
+            mtime or size changed since the last refresh.
+        The index is persisted under the writable directory so later runs only pay for the walk.
+        Once refreshed, lookups are answered from memory.
+            Templates written or deleted by iambic are updated with update_path,
+            a run refreshes the index once to pick up changes made outside of iambic.
+
+        :param repo_dir: The repo directory containing the templates.
+        :param index_path: Defaults to .iambic/cache/template_index under the writable directory.
+        """
+        self.repo_dir = repo_dir
+        self._index_path = index_path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.is_fresh = False
+        self.entries: dict[str, tuple[int, int, Optional[str], Optional[str]]] = {}
+        self.type_map: dict[str, list[str]] = {}
+
+    @property
+    def index_path(self) -> str:
+        if self._index_path:
+            return self._index_path
+
+        from iambic.core.utils import get_writable_directory
+
+        repo_hash = xxhash.xxh3_64_hexdigest(os.path.abspath(self.repo_dir))
+        return os.path.join(
+            get_writable_directory(),
+            ".iambic",
+            "cache",
+            "template_index",
+            f"{repo_hash}.json",
+        )
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                persisted_index = json.load(f)
+            if persisted_index.get("version") == TEMPLATE_INDEX_VERSION:
+                self.entries = {
+                    rel_path: tuple(entry)
+                    for rel_path, entry in persisted_index["entries"].items()
+                }
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            log.debug(
+                "Unable to read template index",
+                index_path=self.index_path,
+                error=repr(err),
+            )
+
+    def _save(self):
+        tmp_path = None
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            os.makedirs(index_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=index_dir, suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
+                json.dump(
+                    {"version": TEMPLATE_INDEX_VERSION, "entries": self.entries}, f
+                )
+            os.replace(tmp_path, self.index_path)
+        except Exception as err:
+            log.debug(
+                "Unable to write template index",
+                index_path=self.index_path,
+                error=repr(err),
+            )
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _walk(self, dir_path: str, rel_dir: str = ""):
+        """Yields (rel_path, os.DirEntry) for every yaml file under dir_path.
+
+        Hidden files and directories are skipped to match glob's behaviour.
+        """
+        try:
+            dir_entries = list(os.scandir(dir_path))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return
+
+        for dir_entry in dir_entries:
+            if dir_entry.name.startswith("."):
+                continue
+
+            rel_path = os.path.join(rel_dir, dir_entry.name)
+            if dir_entry.is_dir():
+                yield from self._walk(dir_entry.path, rel_path)
+            elif dir_entry.name.endswith(TEMPLATE_FILE_EXTENSIONS):
+                yield rel_path, dir_entry
+
+    @staticmethod
+    def _read_entry(file_path: str) -> tuple[Optional[str], Optional[str]]:
+        try:
+            with open(file_path, "r") as f:
+                file_content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None, None
+
+        if not (template_type := TEMPLATE_TYPE_REGEX.search(file_content)):
+            return None, None
+
+        identifier = TEMPLATE_IDENTIFIER_REGEX.search(file_content)
+        return template_type.group(1), identifier.group(1) if identifier else None
+
+    def refresh(self) -> "TemplateIndex":
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+            is_dirty = False
+            entries = {}
+            for rel_path, dir_entry in self._walk(self.repo_dir):
+                file_stat = dir_entry.stat()
+                entry = self.entries.get(rel_path)
+                if (
+                    not entry
+                    or entry[0] != file_stat.st_mtime_ns
+                    or entry[1] != file_stat.st_size
+                ):
+                    is_dirty = True
+                    entry = (
+                        file_stat.st_mtime_ns,
+                        file_stat.st_size,
+                        *self._read_entry(dir_entry.path),
+                    )
+                entries[rel_path] = entry
+
+            if is_dirty or len(entries) != len(self.entries) or not self.type_map:
+                type_map = defaultdict(list)
+                for rel_path in sorted(entries.keys()):
+                    if template_type := entries[rel_path][2]:
+                        type_map[template_type].append(rel_path)
+                self.type_map = dict(type_map)
+
+            if is_dirty or len(entries) != len(self.entries):
+                self.entries = entries
+                self._save()
+
+            self.is_fresh = True
+
+        return self
+
+    def update_path(self, file_path: str):
+        """Update the entry of a file that was written or deleted since the last refresh.
+
+        The change isn't persisted, the next run re-reads the file because its mtime changed.
+        """
+        rel_path = os.path.relpath(
+            os.path.abspath(file_path), os.path.abspath(self.repo_dir)
+        )
+        if (
+            rel_path.startswith("..")
+            or any(part.startswith(".") for part in rel_path.split(os.sep))
+            or not rel_path.endswith(TEMPLATE_FILE_EXTENSIONS)
+        ):
+            return
+
+        with self._lock:
+            if not self.is_fresh:
+                # The next refresh reads it
+                return
+
+            if previous_entry := self.entries.pop(rel_path, None):
+                if previous_template_type := previous_entry[2]:
+                    self.type_map[previous_template_type].remove(rel_path)
+
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                return
+
+            entry = (
+                file_stat.st_mtime_ns,
+                file_stat.st_size,
+                *self._read_entry(file_path),
+            )
+            self.entries[rel_path] = entry
+            if template_type := entry[2]:
+                bisect.insort(self.type_map.setdefault(template_type, []), rel_path)
+
+    def get_template_paths(self, template_type: str = None) -> list[str]:
+        """Returns the paths of all templates matching template_type.
+
+        :param template_type: A regex matched against the portion of the template type after NOQ::.
+            Example: AWS::IAM::Role or AWS.*
+            If not provided, all templates are returned.
+        """
+        if template_type:
+            if template_type.startswith("NOQ::"):
+                template_type = template_type.replace("NOQ::", "", 1)
+            type_regex = re.compile(rf"NOQ::.*{template_type}")
+
+        with self._lock:
+            matching_types = [
+                indexed_type
+                for indexed_type in self.type_map.keys()
+                if not template_type or type_regex.search(indexed_type)
+            ]
+            return sorted(
+                os.path.join(self.repo_dir, rel_path)
+                for matching_type in matching_types
+                for rel_path in self.type_map[matching_type]
+            )
+
+    def get_template_type(self, template_path: str) -> Optional[str]:
+        rel_path = os.path.relpath(template_path, self.repo_dir)
+        if entry := self.entries.get(rel_path):
+            return entry[2]
+
+    def get_identifier(self, template_path: str) -> Optional[str]:
+        rel_path = os.path.relpath(template_path, self.repo_dir)
+        if entry := self.entries.get(rel_path):
+            return entry[3]
+
+
+TEMPLATE_INDEXES: dict[str, TemplateIndex] = {}
+
+
+def get_template_index(repo_dir: str) -> TemplateIndex:
+    if not (template_index := TEMPLATE_INDEXES.get(repo_dir)):
+        template_index = TemplateIndex(repo_dir)
+        TEMPLATE_INDEXES[repo_dir] = template_index
+    return template_index
+
+
+def update_template_indexes(file_path: str):
+    """Update the indexes of the repos containing a file that was written or deleted"""
+    abs_file_path = os.path.abspath(file_path)
+    for template_index in list(TEMPLATE_INDEXES.values()):
+        if abs_file_path.startswith(
+            os.path.join(os.path.abspath(template_index.repo_dir), "")
+        ):
+            template_index.update_path(abs_file_path)
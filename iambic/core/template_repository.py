@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from collections import defaultdict
+from typing import Iterator, Mapping
+
+from iambic.core.logger import log
+from iambic.core.models import BaseTemplate
+from iambic.core.parser import load_templates
+from iambic.core.template_generation import delete_orphaned_templates
+from iambic.core.utils import aio_wrapper, gather_templates
+
+
+class _TemplateMapView(Mapping):
+    def __init__(self, template_map: dict[str, BaseTemplate]):
+        """A read-only view of a shared template map that hands out deep copies.
+
+        Callers merge and write the templates they get,
+            so each read returns a copy the caller is free to mutate.
+        Only the templates that are read are copied.
+        """
+        self._template_map = template_map
+
+    def __getitem__(self, resource_id: str) -> BaseTemplate:
+        return self._template_map[resource_id].copy(deep=True)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._template_map)
+
+    def __len__(self) -> int:
+        return len(self._template_map)
+
+
+class TemplateRepository:
+    def __init__(self):
+        """The existing templates of a run, loaded once per repo and template type.
+
+        Import collectors and generators of the same run share the parsed templates
+            instead of each re-gathering and re-parsing the repo.
+        The resource ids written by the generators are tracked so
+            delete_orphaned_templates can run without another scan.
+
+        Attached to an ExecutionMessage and shared by all of its copies.
+        Safe to use from concurrent tasks and threads.
+        """
+        self._lock = threading.Lock()
+        # asyncio locks are bound to the loop they are first used on, so each loop gets its own
+        self._load_locks: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple[str, str], asyncio.Lock]
+        ] = weakref.WeakKeyDictionary()
+        self._template_maps: dict[tuple[str, str], dict[str, BaseTemplate]] = {}
+        self._touched_resource_ids: dict[tuple[str, str], set[str]] = defaultdict(set)
+
+    def __deepcopy__(self, memo: dict) -> TemplateRepository:
+        # Deep copies of the ExecutionMessage still share the templates of the run
+        return self
+
+    def _get_load_lock(self, key: tuple[str, str]) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            loop_locks = self._load_locks.setdefault(loop, {})
+            if not (load_lock := loop_locks.get(key)):
+                load_lock = asyncio.Lock()
+                loop_locks[key] = load_lock
+            return load_lock
+
+    async def get_template_map(
+        self, repo_dir: str, template_type: str
+    ) -> Mapping[str, BaseTemplate]:
+        """Returns {resource_id: template} for the existing templates of template_type in repo_dir
+
+        The templates are loaded on the first call for the repo_dir and template_type.
+        Later calls, including concurrent ones, share the loaded templates.
+        Every template read from the returned map is a deep copy.
+        """
+        key = (repo_dir, template_type)
+        if (template_map := self._template_maps.get(key)) is not None:
+            return _TemplateMapView(template_map)
+
+        async with self._get_load_lock(key):
+            if (template_map := self._template_maps.get(key)) is not None:
+                return _TemplateMapView(template_map)
+
+            templates = await aio_wrapper(
+                load_templates, await gather_templates(repo_dir, template_type)
+            )
+            template_map = {template.resource_id: template for template in templates}
+            with self._lock:
+                self._template_maps[key] = template_map
+
+        return _TemplateMapView(template_map)
+
+    def touch(self, repo_dir: str, template_type: str, resource_id: str):
+        """Marks the resource as found by the import so its template is not treated as orphaned"""
+        with self._lock:
+            self._touched_resource_ids[(repo_dir, template_type)].add(resource_id)
+
+    def get_touched_resource_ids(self, repo_dir: str, template_type: str) -> set[str]:
+        with self._lock:
+            return set(self._touched_resource_ids.get((repo_dir, template_type), []))
+
+    def delete_orphaned_templates(self, repo_dir: str, template_type: str):
+        """Delete the existing templates of template_type whose resource was not touched during the run"""
+        key = (repo_dir, template_type)
+        with self._lock:
+            template_map = self._template_maps.get(key)
+            resource_ids = set(self._touched_resource_ids.get(key, []))
+
+        if template_map is None:
+            log.debug(
+                "Existing templates were never loaded. Nothing to delete.",
+                template_type=template_type,
+            )
+            return
+
+        delete_orphaned_templates(list(template_map.values()), resource_ids)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
-import glob
+import functools
 import os
 import pathlib
 import re
@@ -11,7 +11,7 @@ import tempfile
 import typing
 from datetime import date, datetime
 from io import StringIO
-from typing import TYPE_CHECKING, Any, Coroutine, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Optional, Union
 from urllib.parse import unquote_plus
 
 import aiofiles
@@ -19,7 +19,7 @@ from asgiref.sync import sync_to_async
 from ruamel.yaml import YAML
 
 from iambic.core import noq_json as json
-from iambic.core.aio_utils import gather_limit
+from iambic.core.aio_utils import SlidingWindowExecutor
 from iambic.core.exceptions import RateLimitException
 from iambic.core.iambic_enum import IambicManaged
 from iambic.core.logger import log
@@ -30,6 +30,8 @@ if TYPE_CHECKING:
 
 NOQ_TEMPLATE_REGEX = r".*template_type:\n?.*NOQ::"
 RATE_LIMIT_STORAGE: dict[str, int] = {}
+# The max number of provider decisions each AccessRuleMatcher keeps
+ACCESS_RULE_DECISION_CACHE_SIZE = 10000
 
 __WRITABLE_DIRECTORY__ = pathlib.Path.home()
 
@@ -134,27 +136,25 @@ async def file_regex_search(file_path: str, re_pattern: str) -> Union[str, None]
             return file_path
 
 
-async def gather_templates(repo_dir: str, template_type: str = None) -> list[str]:
-    if template_type and template_type.startswith("NOQ::"):
-        # Strip the prefix, so it plays nice with NOQ_TEMPLATE_REGEX
-        template_type = template_type.replace("NOQ::", "")
+async def gather_templates(
+    repo_dir: str, template_type: str = None, refresh: bool = False
+) -> list[str]:
+    """Returns the paths of all templates in the repo matching template_type.
 
-    regex_pattern = (
-        rf"{NOQ_TEMPLATE_REGEX}.*{template_type}"
-        if template_type
-        else NOQ_TEMPLATE_REGEX
-    )
-    # Support both yaml and yml extensions for templates
-    file_paths = glob.glob(f"{repo_dir}/**/*.yaml", recursive=True)
-    file_paths += glob.glob(f"{repo_dir}*.yaml", recursive=True)
-    file_paths += glob.glob(f"{repo_dir}/**/*.yml", recursive=True)
-    file_paths += glob.glob(f"{repo_dir}*.yml", recursive=True)
-
-    file_paths = await gather_limit(
-        *[file_regex_search(fp, regex_pattern) for fp in file_paths],
-        limit=int(os.environ.get("IAMBIC_GATHER_TEMPLATES_LIMIT", 10)),
-    )
-    return [fp for fp in file_paths if fp]
+    Backed by a TemplateIndex that is refreshed once per run, by resolve_config_template_path.
+    Later calls are answered from memory.
+
+    :param repo_dir: The repo directory containing the templates.
+    :param template_type: A regex matched against the portion of the template type after NOQ::.
+        Example: AWS::IAM::Role or AWS.*
+    :param refresh: Walk the repo for changes made outside of iambic since the last refresh.
+    """
+    from iambic.core.template_index import get_template_index
+
+    template_index = get_template_index(repo_dir)
+    if refresh or not template_index.is_fresh:
+        await aio_wrapper(template_index.refresh)
+    return template_index.get_template_paths(template_type)
 
 
 async def aio_wrapper(fnc, *args, **kwargs):
@@ -190,6 +190,7 @@ class NoqSemaphore:
             hello_there_semaphore = NoqSemaphore(hello_there, 3)
             asyncio.run(hello_there_semaphore.process([{} for _ in range(10)]))
         """
+        self.batch_size = batch_size
         self.limit = asyncio.Semaphore(batch_size)
         self.callback_function = callback_function
         self.callback_is_async = callback_is_async
@@ -202,8 +203,9 @@ class NoqSemaphore:
             return await aio_wrapper(self.callback_function, **kwargs)
 
     async def process(self, messages: list[dict], return_exceptions=False):
-        return await asyncio.gather(
-            *[asyncio.create_task(self.handle_message(**msg)) for msg in messages],
+        # The coroutines are only created as the semaphore frees up
+        return await SlidingWindowExecutor(self.batch_size).run(
+            (self.handle_message(**msg) for msg in messages),
             return_exceptions=return_exceptions,
         )
 
@@ -215,26 +217,15 @@ async def async_batch_processor(
     return_exceptions: bool = False,
 ) -> list:
     """
-    Batches up tasks in an effort to prevent rate limiting
-    """
-    if len(tasks) <= batch_size:
-        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
-
-    response = []
-    for min_elem in range(0, len(tasks), batch_size):
-        response.extend(
-            await asyncio.gather(
-                *tasks[min_elem : min_elem + batch_size],
-                return_exceptions=return_exceptions,
-            )
-        )
-        if len(response) == len(tasks):
-            return response
-
-        if seconds_between_process:
-            await asyncio.sleep(seconds_between_process)
+    Runs up to batch_size tasks at a time in an effort to prevent rate limiting
 
-    return response
+    A task starts as soon as any running task is done instead of waiting on the whole batch.
+    seconds_between_process keeps the start rate at batch_size tasks every seconds_between_process.
+    """
+    rate = batch_size / seconds_between_process if seconds_between_process else None
+    return await SlidingWindowExecutor(batch_size, rate=rate).run(
+        tasks, return_exceptions=return_exceptions
+    )
 
 
 def un_wrap_json(json_obj: Any) -> Any:
@@ -284,19 +275,22 @@ def un_wrap_json_and_dump_values(json_obj: Any) -> Any:
     return json_obj
 
 
+SORT_DICT_PRIORITY = [
+    "template_type",
+    "name",
+    "description",
+    "included_accounts",
+    "excluded_accounts",
+]
+
+
 # lifted from cloudumi's repo common.lib.generic import sort_dict, and modified to support prioritization
 def sort_dict(original, prioritize=None):
     """Recursively sorts dictionary keys and dictionary values in alphabetical order,
     with optional prioritization of certain elements.
     """
     if prioritize is None:
-        prioritize = [
-            "template_type",
-            "name",
-            "description",
-            "included_accounts",
-            "excluded_accounts",
-        ]
+        prioritize = SORT_DICT_PRIORITY
     if isinstance(original, dict):
         # Make a new "ordered" dictionary. No need for Collections in Python 3.7+
         # Sort the keys in the dictionary
@@ -350,6 +344,109 @@ def create_commented_map(_dict: dict):
     return commented_map
 
 
+def _to_json_key(key: Any) -> str:
+    if isinstance(key, str):
+        return str.__str__(key)
+    elif key is None:
+        return "null"
+    elif isinstance(key, bool):
+        return "true" if key else "false"
+    elif isinstance(key, int):
+        return int.__repr__(key)
+    elif isinstance(key, float):
+        return float.__repr__(key)
+    raise TypeError(
+        f"keys must be str, int, float, bool or None, not {type(key).__name__}"
+    )
+
+
+def to_json_compatible(value: Any, encoder: Callable[[Any], Any]) -> Any:
+    """Returns what json.loads(json.dumps(value, default=encoder)) would, without the intermediate string.
+
+    Subclasses of the json types (e.g. ruamel scalar strings or str enums) are converted to the base type
+        and everything else is passed through the encoder.
+    """
+    if isinstance(value, str):
+        return str.__str__(value)
+    elif value is None or isinstance(value, bool):
+        return value
+    elif isinstance(value, int):
+        return int.__int__(value)
+    elif isinstance(value, float):
+        return float.__float__(value)
+    elif isinstance(value, (list, tuple)):
+        return [to_json_compatible(elem, encoder) for elem in value]
+    elif isinstance(value, dict):
+        return {
+            _to_json_key(key): to_json_compatible(elem, encoder)
+            for key, elem in value.items()
+        }
+    return to_json_compatible(encoder(value), encoder)
+
+
+def _to_json_container(value: Any, encoder: Callable[[Any], Any]) -> Any:
+    # Only converts the outermost value, containers are left for the caller to walk
+    while not isinstance(value, (str, int, float, list, tuple, dict)):
+        if value is None:
+            return value
+        value = encoder(value)
+    if isinstance(value, (list, tuple, dict)):
+        return value
+    return to_json_compatible(value, encoder)
+
+
+def create_sorted_commented_map(
+    original: dict, encoder: Callable[[Any], Any], prioritize: list[str] = None
+):
+    """Builds the CommentedMap used to dump a model to yaml in a single pass.
+
+    Produces the same result as
+        create_commented_map(sort_dict(json.loads(json.dumps(original, default=encoder)), prioritize))
+        without serializing the dict to a string and walking it 3 more times.
+
+    :param original: The dict of a model as returned by pydantic, values may not be json compatible.
+    :param encoder: The model's json encoder, e.g. model.__json_encoder__
+    :param prioritize: Keys moved to the front of each mapping. Defaults to SORT_DICT_PRIORITY.
+    """
+    from ruamel.yaml import CommentedMap
+
+    if prioritize is None:
+        prioritize = SORT_DICT_PRIORITY
+
+    original = {_to_json_key(key): value for key, value in original.items()}
+    comment_key_to_comment = to_json_compatible(
+        original.pop("metadata_commented_dict", {}), encoder
+    )
+    keys = [key for key in prioritize if key in original] + [
+        key for key in sorted(original.keys()) if key not in prioritize
+    ]
+
+    commented_map = CommentedMap()
+    for key in keys:
+        value = _to_json_container(original[key], encoder)
+        if isinstance(value, dict):
+            value = create_sorted_commented_map(value, encoder, prioritize)
+        elif isinstance(value, (list, tuple)):
+            value = [_to_json_container(elem, encoder) for elem in value]
+            if len(value) > 1 and isinstance(value[0], str):
+                value = sorted(value)
+            elif len(value) > 0 and isinstance(value[0], dict):
+                value = [
+                    create_sorted_commented_map(elem, encoder, prioritize)
+                    if isinstance(elem, dict)
+                    else to_json_compatible(elem, encoder)
+                    for elem in value
+                ]
+            else:
+                value = [to_json_compatible(elem, encoder) for elem in value]
+
+        # Assigning is much cheaper than CommentedMap.insert which copies the keys on every call
+        commented_map[key] = value
+        if (comment := comment_key_to_comment.get(key)) is not None:
+            commented_map.yaml_add_eol_comment(comment, key=key)
+    return commented_map
+
+
 typ = "rt"
 yaml = NoqYaml(typ=typ)
 yaml.preserve_quotes = True
@@ -357,6 +454,115 @@ yaml.indent(mapping=2, sequence=4, offset=2)
 yaml.representer.ignore_aliases = lambda *data: True
 yaml.width = 4096
 
+# Read-only loader for templates that are never written back.
+# Comments and quoting styles are dropped, which lets ruamel use its C parser.
+safe_yaml = YAML(typ="safe")
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_access_rule(rule: str) -> Optional[re.Pattern]:
+    """Returns the compiled regex for a lowercase access rule or None if it is a literal"""
+    if "*" not in rule:
+        return None
+
+    # Normalize user created regex to python regex
+    # Example, dev-* to dev-.* to prevent re.match return True for eval on dev
+    try:
+        return re.compile(rule.replace(".*", "*").replace("*", ".*"))
+    except re.error:
+        return None
+
+
+class AccessRuleMatcher:
+    def __init__(
+        self, included_rules: tuple[str, ...], excluded_rules: tuple[str, ...]
+    ):
+        """The included and excluded child rules of a resource compiled to be evaluated against providers.
+
+        A rule's weight is its length. The provider is included if the longest matching include rule
+            is longer than the longest matching exclude rule.
+        Decisions are cached by the provider's identifiers.
+
+        Call get_access_rule_matcher instead so matchers are shared by resources with the same rules.
+        """
+        self.included_rules = self._compile_rules(included_rules)
+        self.excluded_rules = self._compile_rules(excluded_rules)
+        self._decisions: dict[frozenset[str], bool] = {}
+
+    @staticmethod
+    def _compile_rules(rules: tuple[str, ...]) -> tuple[set[str], list, int]:
+        """Returns (literal rules, [(weight, regex)] sorted by weight desc, weight of the * rule)"""
+        literals = set()
+        regexes = []
+        wildcard_weight = 0
+        for rule in rules:
+            rule = rule.lower()
+            if rule == "*":
+                wildcard_weight = 1
+            elif regex := _compile_access_rule(rule):
+                regexes.append((len(rule), regex))
+            else:
+                literals.add(rule)
+
+        regexes.sort(key=lambda weighted_regex: weighted_regex[0], reverse=True)
+        return literals, regexes, wildcard_weight
+
+    @staticmethod
+    def _match_weight(compiled_rules: tuple, identifiers: frozenset[str]) -> int:
+        """Returns the weight of the longest rule matching any of the identifiers or 0 if none match"""
+        literals, regexes, wildcard_weight = compiled_rules
+        # A literal rule only matches an identifier equal to it so its weight is the identifier's length
+        weight = max(
+            (len(identifier) for identifier in identifiers if identifier in literals),
+            default=0,
+        )
+        for regex_weight, regex in regexes:
+            if regex_weight <= weight:
+                break
+            elif any(regex.match(identifier) for identifier in identifiers):
+                weight = regex_weight
+                break
+
+        return max(weight, wildcard_weight)
+
+    def is_excluded(self, identifiers: set[str]) -> bool:
+        """Returns True if any excluded rule matches the identifiers regardless of the included rules"""
+        return bool(
+            self._match_weight(
+                self.excluded_rules,
+                frozenset(identifier.lower() for identifier in identifiers),
+            )
+        )
+
+    def is_included(self, identifiers: set[str]) -> bool:
+        identifiers = frozenset(identifier.lower() for identifier in identifiers)
+        if (decision := self._decisions.get(identifiers)) is not None:
+            return decision
+
+        include_weight = self._match_weight(self.included_rules, identifiers)
+        decision = bool(
+            include_weight
+            and include_weight > self._match_weight(self.excluded_rules, identifiers)
+        )
+        if len(self._decisions) >= ACCESS_RULE_DECISION_CACHE_SIZE:
+            self._decisions.clear()
+        self._decisions[identifiers] = decision
+        return decision
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_access_rule_matcher(
+    included_rules: tuple[str, ...], excluded_rules: tuple[str, ...]
+) -> AccessRuleMatcher:
+    return AccessRuleMatcher(included_rules, excluded_rules)
+
+
+def get_access_rule_matcher(
+    included_rules: typing.Iterable[str], excluded_rules: typing.Iterable[str]
+) -> AccessRuleMatcher:
+    """Returns the AccessRuleMatcher for the rules, compiled once per distinct set of rules"""
+    return _get_access_rule_matcher(tuple(included_rules), tuple(excluded_rules))
+
 
 def evaluate_on_provider(
     resource,
@@ -407,29 +613,9 @@ def evaluate_on_provider(
     if not resource.included_children:
         return True
 
-    provider_ids = sorted(provider_details.all_identifiers, key=len, reverse=True)
-    included_children = sorted(
-        [rule.lower() for rule in resource.included_children], key=len, reverse=True
-    )
-    excluded_children = sorted(
-        [rule.lower() for rule in resource.excluded_children], key=len, reverse=True
-    )
-    exclude_weight = 0
-
-    for exclude_rule in excluded_children:
-        if exclude_rule == "*" or any(
-            is_regex_match(exclude_rule, provider_id) for provider_id in provider_ids
-        ):
-            exclude_weight = len(exclude_rule)
-            break
-
-    for include_rule in included_children:
-        if include_rule == "*" or any(
-            is_regex_match(include_rule, provider_id) for provider_id in provider_ids
-        ):
-            return bool(len(include_rule) > exclude_weight)
-
-    return False
+    return get_access_rule_matcher(
+        resource.included_children, resource.excluded_children
+    ).is_included(provider_details.all_identifiers)
 
 
 def apply_to_provider(resource, provider_details) -> bool:
@@ -443,19 +629,72 @@ def is_regex_match(regex, test_string):
     regex = regex.lower()
     test_string = test_string.lower()
 
-    if "*" in regex:
-        # Normalize user created regex to python regex
-        # Example, dev-* to dev-.* to prevent re.match return True for eval on dev
-        try:
-            sanitized_regex = regex.replace(".*", "*").replace("*", ".*")
-            return bool(re.match(sanitized_regex, test_string))
-        except re.error:
-            return regex == test_string
+    if compiled_regex := _compile_access_rule(regex):
+        return bool(compiled_regex.match(test_string))
     else:
         # it is not an actual regex string, just string comparison
         return regex == test_string
 
 
+class ProviderValueResolver:
+    def __init__(self, matching_values: list):
+        """Resolves which of the matching_values has the highest priority for a provider.
+
+        The values are put in priority order and their rules compiled once.
+        The winner for each set of provider identifiers is cached so resolving
+            every child of a provider against the same values is a dict lookup.
+
+        Create a new resolver if matching_values changes.
+
+        :param matching_values: A list of values with included_children and excluded_children attributes.
+        """
+        included_child_map = dict()
+        included_children = list()
+
+        for matching_val in matching_values:
+            for included_child in matching_val.included_children:
+                included_child_map[included_child] = matching_val
+                included_children.append(included_child)
+
+        # A value is checked at the position of its longest included child.
+        # Checking it again further down would return the same result.
+        self._prioritized_values: list[tuple[AccessRuleMatcher, Any]] = []
+        seen_values = set()
+        for included_child in sorted(included_children, key=len, reverse=True):
+            cur_val = included_child_map[included_child]
+            if id(cur_val) in seen_values:
+                continue
+
+            seen_values.add(id(cur_val))
+            self._prioritized_values.append(
+                (
+                    get_access_rule_matcher(
+                        cur_val.included_children, cur_val.excluded_children
+                    ),
+                    cur_val,
+                )
+            )
+
+        self._resolved_values: dict[frozenset[str], Any] = {}
+
+    def resolve(self, identifiers: set[str]):
+        """Returns the value with the highest priority for the identifiers or None if no value includes them"""
+        identifiers = frozenset(identifiers)
+        if identifiers in self._resolved_values:
+            return self._resolved_values[identifiers]
+
+        resolved_value = next(
+            (
+                cur_val
+                for matcher, cur_val in self._prioritized_values
+                if matcher.is_included(identifiers)
+            ),
+            None,
+        )
+        self._resolved_values[identifiers] = resolved_value
+        return resolved_value
+
+
 def get_provider_value(matching_values: list, identifiers: set[str]):
     """
     Get the provider value that matches the given identifiers.
@@ -464,6 +703,8 @@ def get_provider_value(matching_values: list, identifiers: set[str]):
     has the highest priority for the given identifiers. The priority of the matching values is determined based
     on the rules defined in the `included_children` and `excluded_children` attributes of each matching value.
 
+    Use a ProviderValueResolver instead when resolving many identifiers against the same matching values.
+
     Args:
     - matching_values (list): A list of matching values to search through.
     - identifiers (set[str]): A set of identifiers to match against the rules.
@@ -471,39 +712,7 @@ def get_provider_value(matching_values: list, identifiers: set[str]):
     Returns:
     - The matching value that has the highest priority for the given identifiers.
     """
-    included_account_map = dict()
-    included_account_lists = list()
-
-    for matching_val in matching_values:
-        for included_account in matching_val.included_children:
-            included_account_map[included_account] = matching_val
-            included_account_lists.append(included_account)
-
-    for included_account in sorted(included_account_lists, key=len, reverse=True):
-        cur_val = included_account_map[included_account]
-        included_children = sorted(
-            [rule.lower() for rule in cur_val.included_children], key=len, reverse=True
-        )
-        excluded_children = sorted(
-            [rule.lower() for rule in cur_val.excluded_children], key=len, reverse=True
-        )
-        exclude_weight = 0
-
-        for exclude_rule in excluded_children:
-            if exclude_rule == "*" or any(
-                is_regex_match(exclude_rule, provider_id) for provider_id in identifiers
-            ):
-                exclude_weight = len(exclude_rule)
-                break
-
-        for include_rule in included_children:
-            if include_rule == "*" or any(
-                is_regex_match(include_rule, provider_id) for provider_id in identifiers
-            ):
-                if len(include_rule) > exclude_weight:
-                    return cur_val
-                else:
-                    break
+    return ProviderValueResolver(matching_values).resolve(identifiers)
 
 
 class GlobalRetryController:
@@ -21,8 +21,8 @@ from iambic.core.context import ctx
 from iambic.core.git import clone_git_repos
 from iambic.core.iambic_enum import Command, IambicManaged
 from iambic.core.logger import log
-from iambic.core.models import ExecutionMessage, TemplateChangeDetails
-from iambic.core.parser import load_templates
+from iambic.core.models import ExecutionMessage, TemplateChangeDetails, write_templates
+from iambic.core.parser import aiter_templates, load_templates
 from iambic.core.utils import exceptions_in_proposed_changes, gather_templates, init_writable_directory
 from iambic.output.text import file_render_resource_changes, screen_render_resource_changes
 from iambic.request_handler.expire_resources import flag_expired_resources
@@ -244,6 +244,7 @@ def run_apply(
             log.error("Please pass in specific templates to apply.")
             return template_changes
         templates = asyncio.run(gather_templates(repo_dir))
+    # Keep the comments, the templates are written back if the changes are applied
     templates = load_templates(templates)
     if enforced_only:
         templates = [t for t in templates if t.iambic_managed == IambicManaged.ENFORCED]
@@ -353,7 +354,7 @@ def run_plan(templates: list[str], repo_dir: str = str(pathlib.Path.cwd())):
     )
     asyncio.run(flag_expired_resources(templates))
     ctx.eval_only = True
-    template_changes = asyncio.run(config.run_apply(exe_message, load_templates(templates)))
+    template_changes = asyncio.run(config.run_apply(exe_message, aiter_templates(templates, preserve_comments=False)))
     output_proposed_changes(template_changes)
     screen_render_resource_changes(template_changes)
 
@@ -424,8 +425,8 @@ def lint(templates: list[str], repo_dir: str):
 
     templates = load_templates(templates, False)
     log.info("Formatting templates.")
-    for template in templates:
-        template.write()
+    changed_templates = asyncio.run(write_templates(templates))
+    log.info("Templates formatted.", changed_templates=changed_templates)
 
 
 @cli.command(name="init")
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+from iambic.core.context import ctx
+from iambic.core.logger import log
+from iambic.core.models import AccountChangeDetails, TemplateChangeDetails
+
+if TYPE_CHECKING:
+    from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
+    from iambic.plugins.v0_1_0.aws.models import AWSAccount, AWSTemplate
+
+# The (template, account) units applied at the same time across all accounts
+GLOBAL_CONCURRENCY = 200
+# The (template, account) units applied at the same time on a single account
+ACCOUNT_CONCURRENCY = 20
+
+
+def estimate_apply_cost(template: AWSTemplate) -> int:
+    """A rough estimate of the calls needed to apply the template to an account.
+
+    Every list in the template properties (policies, tags, group memberships, ...)
+        is diffed and updated element by element.
+    """
+    properties = getattr(template, "properties", None)
+    if properties is None:
+        return 1
+
+    return 1 + sum(
+        len(value)
+        for field_name in properties.__fields__
+        if isinstance(value := getattr(properties, field_name, None), list)
+    )
+
+
+class ApplyUnit:
+    def __init__(
+        self, template_elem: int, aws_account: AWSAccount, cost: int, sequence: int
+    ):
+        self.template_elem = template_elem
+        self.aws_account = aws_account
+        self.cost = cost
+        self.sequence = sequence
+        # The units that must be applied before this one
+        self.pending_prerequisites = 0
+        # The units waiting on this one
+        self.dependents: list[ApplyUnit] = []
+
+    def __lt__(self, other: ApplyUnit) -> bool:
+        # Most expensive first, ties in the order the templates were provided
+        return (-self.cost, self.sequence) < (-other.cost, other.sequence)
+
+
+class _AccountQueues:
+    def __init__(self, account_concurrency: int):
+        """The queued units of every account and the units each account is running"""
+        self.account_concurrency = account_concurrency
+        self._queues: dict[str, list[ApplyUnit]] = defaultdict(list)
+        self._running: dict[str, int] = defaultdict(int)
+        # The next unit of the accounts that are below their budget.
+        # An account may have stale entries, those are skipped when popped.
+        self._ready: list[tuple[ApplyUnit, str]] = []
+
+    def _set_ready(self, account_id: str):
+        account_queue = self._queues[account_id]
+        if account_queue and self._running[account_id] < self.account_concurrency:
+            heapq.heappush(self._ready, (account_queue[0], account_id))
+
+    def push(self, unit: ApplyUnit):
+        account_id = unit.aws_account.account_id
+        heapq.heappush(self._queues[account_id], unit)
+        self._set_ready(account_id)
+
+    def pop(self) -> Optional[ApplyUnit]:
+        """The next unit to start or None if every account is idle or at its budget"""
+        while self._ready:
+            _, account_id = heapq.heappop(self._ready)
+            account_queue = self._queues[account_id]
+            if (
+                not account_queue
+                or self._running[account_id] >= self.account_concurrency
+            ):
+                continue
+
+            self._running[account_id] += 1
+            unit = heapq.heappop(account_queue)
+            self._set_ready(account_id)
+            return unit
+
+        return None
+
+    def release(self, unit: ApplyUnit):
+        account_id = unit.aws_account.account_id
+        self._running[account_id] -= 1
+        self._set_ready(account_id)
+
+
+class ApplyScheduler:
+    def __init__(
+        self,
+        global_concurrency: int = GLOBAL_CONCURRENCY,
+        account_concurrency: int = ACCOUNT_CONCURRENCY,
+    ):
+        """Applies templates as (template, account) units instead of template by template.
+
+        Each account has its own queue and concurrency budget so a template that spans
+            every account can't starve the others and no account gets more in flight calls than it allows.
+        Within the budgets the most expensive units are started first
+            so the long units don't end up running by themselves at the end.
+        A unit that requires a resource another unit provides, e.g. a role attaching a managed policy
+            of the same apply, only starts once that unit is applied and the resource is usable.
+        The changes of a template are returned as soon as all of its units are done.
+        """
+        self.global_concurrency = global_concurrency
+        self.account_concurrency = account_concurrency
+
+    async def apply(
+        self, config: AWSConfig, templates: list[AWSTemplate]
+    ) -> AsyncIterator[TemplateChangeDetails]:
+        sequence = itertools.count()
+        units: list[ApplyUnit] = []
+        account_changes: list[list[AccountChangeDetails]] = []
+        remaining_units: list[int] = []
+
+        for template_elem, template in enumerate(templates):
+            aws_accounts = template.get_apply_accounts(config)
+            account_changes.append([])
+            remaining_units.append(len(aws_accounts))
+            if not aws_accounts:
+                yield template.get_template_changes([])
+                continue
+
+            cost = estimate_apply_cost(template)
+            units.extend(
+                ApplyUnit(template_elem, aws_account, cost, next(sequence))
+                for aws_account in aws_accounts
+            )
+
+        blocked_unit_count = self._set_dependencies(templates, units)
+        account_queues = _AccountQueues(self.account_concurrency)
+        for unit in units:
+            if not unit.pending_prerequisites:
+                account_queues.push(unit)
+        running: dict[asyncio.Task, ApplyUnit] = {}
+
+        log.debug(
+            "Scheduling template changes.",
+            template_count=len(templates),
+            unit_count=len(units),
+            blocked_unit_count=blocked_unit_count,
+            account_count=len({unit.aws_account.account_id for unit in units}),
+        )
+        try:
+            while True:
+                while len(running) < self.global_concurrency and (
+                    unit := account_queues.pop()
+                ):
+                    running[
+                        asyncio.create_task(
+                            self._apply_unit(templates[unit.template_elem], unit)
+                        )
+                    ] = unit
+
+                if not running:
+                    if not (
+                        blocked_units := [
+                            unit for unit in units if unit.pending_prerequisites > 0
+                        ]
+                    ):
+                        break
+
+                    log.warning(
+                        "Circular dependency between templates. "
+                        "Applying the remaining templates without waiting on each other.",
+                        unit_count=len(blocked_units),
+                    )
+                    for unit in blocked_units:
+                        unit.pending_prerequisites = 0
+                        account_queues.push(unit)
+                    continue
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    unit = running.pop(task)
+                    account_queues.release(unit)
+                    account_changes[unit.template_elem].append(task.result())
+                    for dependent in unit.dependents:
+                        dependent.pending_prerequisites -= 1
+                        if dependent.pending_prerequisites == 0:
+                            account_queues.push(dependent)
+
+                    remaining_units[unit.template_elem] -= 1
+                    if not remaining_units[unit.template_elem]:
+                        template = templates[unit.template_elem]
+                        yield template.get_template_changes(
+                            account_changes[unit.template_elem]
+                        )
+        finally:
+            for task in running:
+                task.cancel()
+
+    @staticmethod
+    def _set_dependencies(templates: list[AWSTemplate], units: list[ApplyUnit]) -> int:
+        """Link every unit to the units that provide the resources it requires.
+
+        :return: The number of units that have to wait on another unit
+        """
+        providers: dict[str, list[ApplyUnit]] = defaultdict(list)
+        for unit in units:
+            template = templates[unit.template_elem]
+            for resource in template.get_provided_resources(unit.aws_account):
+                providers[resource].append(unit)
+
+        if not providers:
+            return 0
+
+        blocked_unit_count = 0
+        for unit in units:
+            template = templates[unit.template_elem]
+            prerequisites = {
+                id(provider): provider
+                for resource in template.get_required_resources(unit.aws_account)
+                for provider in providers.get(resource, [])
+                if provider.template_elem != unit.template_elem
+            }
+            for prerequisite in prerequisites.values():
+                prerequisite.dependents.append(unit)
+            if prerequisites:
+                unit.pending_prerequisites = len(prerequisites)
+                blocked_unit_count += 1
+
+        return blocked_unit_count
+
+    @staticmethod
+    async def _apply_unit(template: AWSTemplate, unit: ApplyUnit):
+        account_change_details = await template.apply_to_account(unit.aws_account)
+        # Nothing is created during a plan so there is nothing to wait on
+        if unit.dependents and ctx.execute:
+            await template.wait_until_applied(unit.aws_account, account_change_details)
+        return account_change_details
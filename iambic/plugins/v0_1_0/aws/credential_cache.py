@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import base64
+import functools
+import hashlib
+import os
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import boto3
+import botocore.session
+from botocore.credentials import (
+    CredentialProvider,
+    CredentialResolver,
+    RefreshableCredentials,
+)
+from cryptography.fernet import Fernet, InvalidToken
+
+from iambic.core import noq_json as json
+from iambic.core.logger import log
+from iambic.core.utils import aio_wrapper, get_writable_directory
+
+# Matches the advisory refresh timeout of botocore.
+# Credentials that expire sooner are refreshed instead of reused.
+REFRESH_MARGIN = timedelta(minutes=15)
+
+
+def _get_fernet() -> Optional[Fernet]:
+    if not (secret := os.environ.get("IAMBIC_CREDENTIAL_CACHE_KEY")):
+        return None
+
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+
+
+class CachedCredentialProvider(CredentialProvider):
+    METHOD = "iambic-credential-cache"
+    CANONICAL_NAME = "custom-iambic-credential-cache"
+
+    def __init__(self, credentials: RefreshableCredentials):
+        """Hands the cached credentials to a botocore session through its credential resolver"""
+        super().__init__()
+        self.credentials = credentials
+
+    def load(self) -> RefreshableCredentials:
+        return self.credentials
+
+
+class CredentialCache:
+    def __init__(self):
+        """Assumed role credentials shared by every session of the process.
+
+        Credentials are keyed by the identity of the source session, the role, the external id
+            and the session name so assuming into the same role for every region is a single call.
+        The identity is the caller ARN, so it is the same after the keys of the source session rotate.
+        Entries nobody refreshed before they expired are evicted along with their lock.
+        Each entry is a botocore RefreshableCredentials. boto3 refreshes them when they are about to
+            expire and, until the mandatory refresh window, only the caller that takes the refresh lock
+            waits for it while the others keep using the current credentials.
+        Concurrent requests for the same key wait for the first one instead of calling STS again.
+
+        Set IAMBIC_CREDENTIAL_CACHE_KEY to also keep the credentials in an encrypted file cache
+            in the writable directory so a warm Lambda container can reuse them across invocations.
+        """
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._credentials: dict[str, RefreshableCredentials] = {}
+        # The latest session to request each key, used to refresh its credentials
+        self._source_sessions: dict[str, boto3.Session] = {}
+        self._caller_identities = weakref.WeakKeyDictionary()
+        self._session_locks = weakref.WeakKeyDictionary()
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            if not (key_lock := self._key_locks.get(key)):
+                key_lock = threading.Lock()
+                self._key_locks[key] = key_lock
+            return key_lock
+
+    def _evict_expired(self):
+        with self._lock:
+            for key, credentials in list(self._credentials.items()):
+                key_lock = self._key_locks.get(key)
+                if not credentials.refresh_needed(0) or (
+                    key_lock and key_lock.locked()
+                ):
+                    continue
+
+                del self._credentials[key]
+                self._source_sessions.pop(key, None)
+                self._key_locks.pop(key, None)
+
+    @staticmethod
+    def _get_file_path(key: str) -> str:
+        return os.path.join(
+            get_writable_directory(),
+            ".iambic",
+            "credentials",
+            hashlib.sha256(key.encode()).hexdigest(),
+        )
+
+    def _read_file_cache(self, key: str) -> Optional[dict]:
+        if not (fernet := _get_fernet()):
+            return None
+
+        try:
+            with open(self._get_file_path(key), "rb") as f:
+                metadata = json.loads(fernet.decrypt(f.read()))
+        except (FileNotFoundError, InvalidToken, ValueError):
+            return None
+
+        expiry_time = datetime.fromisoformat(metadata["expiry_time"])
+        if expiry_time - REFRESH_MARGIN <= datetime.now(timezone.utc):
+            return None
+        return metadata
+
+    def _write_file_cache(self, key: str, metadata: dict):
+        if not (fernet := _get_fernet()):
+            return
+
+        file_path = self._get_file_path(key)
+        os.makedirs(os.path.dirname(file_path), mode=0o700, exist_ok=True)
+        tmp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(
+            os.open(tmp_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb"
+        ) as f:
+            f.write(fernet.encrypt(json.dumps(metadata).encode()))
+        os.replace(tmp_file_path, file_path)
+
+    def _assume_role(
+        self,
+        key: str,
+        boto3_session,
+        assume_role_arn: str,
+        region_name: str,
+        external_id: Optional[str],
+        session_name: str,
+    ) -> dict:
+        # Refresh with the latest source session, e.g. after its keys were rotated
+        with self._lock:
+            boto3_session = self._source_sessions.get(key, boto3_session)
+        sts = boto3_session.client(
+            "sts",
+            endpoint_url=f"https://sts.{region_name}.amazonaws.com",
+            region_name=region_name,
+        )
+        role_params = dict(RoleArn=assume_role_arn, RoleSessionName=session_name)
+        if external_id:
+            role_params["ExternalId"] = external_id
+        role_credentials = sts.assume_role(**role_params)["Credentials"]
+        expiry_time = role_credentials["Expiration"]
+        if isinstance(expiry_time, datetime):
+            expiry_time = expiry_time.isoformat()
+
+        metadata = dict(
+            access_key=role_credentials["AccessKeyId"],
+            secret_key=role_credentials["SecretAccessKey"],
+            token=role_credentials["SessionToken"],
+            expiry_time=expiry_time,
+        )
+        self._write_file_cache(key, metadata)
+        return metadata
+
+    def _get_credentials(
+        self,
+        boto3_session,
+        assume_role_arn: str,
+        region_name: str,
+        external_id: Optional[str],
+        session_name: str,
+    ) -> RefreshableCredentials:
+        self._evict_expired()
+        key = "|".join(
+            [
+                self._get_caller_identity(boto3_session)["Arn"],
+                assume_role_arn,
+                external_id or "",
+                session_name,
+            ]
+        )
+        with self._get_key_lock(key):
+            with self._lock:
+                self._source_sessions[key] = boto3_session
+            if credentials := self._credentials.get(key):
+                return credentials
+
+            assume_role = functools.partial(
+                self._assume_role,
+                key,
+                boto3_session,
+                assume_role_arn,
+                region_name,
+                external_id,
+                session_name,
+            )
+            if metadata := self._read_file_cache(key):
+                log.debug("Using cached credentials.", assume_role_arn=assume_role_arn)
+            else:
+                metadata = assume_role()
+
+            credentials = RefreshableCredentials.create_from_metadata(
+                metadata, refresh_using=assume_role, method="sts-assume-role"
+            )
+            with self._lock:
+                self._credentials[key] = credentials
+            return credentials
+
+    async def create_assume_role_session(
+        self,
+        boto3_session,
+        assume_role_arn: str,
+        region_name: str,
+        external_id: Optional[str] = None,
+        session_name: str = "iambic",
+    ) -> boto3.Session:
+        credentials = await aio_wrapper(
+            self._get_credentials,
+            boto3_session,
+            assume_role_arn,
+            region_name,
+            external_id,
+            session_name,
+        )
+        botocore_session = botocore.session.get_session()
+        botocore_session.register_component(
+            "credential_provider",
+            CredentialResolver(providers=[CachedCredentialProvider(credentials)]),
+        )
+        return boto3.Session(botocore_session=botocore_session, region_name=region_name)
+
+    def _get_caller_identity(self, boto3_session) -> dict:
+        with self._lock:
+            if caller_identity := self._caller_identities.get(boto3_session):
+                return caller_identity
+            session_lock = self._session_locks.setdefault(
+                boto3_session, threading.Lock()
+            )
+
+        with session_lock:
+            if not (caller_identity := self._caller_identities.get(boto3_session)):
+                caller_identity = boto3_session.client("sts").get_caller_identity()
+                with self._lock:
+                    self._caller_identities[boto3_session] = caller_identity
+            return caller_identity
+
+    async def get_caller_identity(self, boto3_session) -> dict:
+        """The get_caller_identity response of the session, cached for as long as the session exists"""
+        return await aio_wrapper(self._get_caller_identity, boto3_session)
+
+
+CREDENTIAL_CACHE = CredentialCache()
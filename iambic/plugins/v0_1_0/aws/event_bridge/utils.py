@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+from typing import Optional, Union
+
+from iambic.plugins.v0_1_0.aws.event_bridge.models import (
+    GroupMessageDetails,
+    ManagedPolicyMessageDetails,
+    PermissionSetMessageDetails,
+    RoleMessageDetails,
+    UserMessageDetails,
+)
+
+MessageDetails = Union[
+    GroupMessageDetails,
+    ManagedPolicyMessageDetails,
+    PermissionSetMessageDetails,
+    RoleMessageDetails,
+    UserMessageDetails,
+]
+
+
+def parse_cloudtrail_message(
+    message: dict, identity_arn: str
+) -> Optional[tuple[MessageDetails, str]]:
+    """The resource a CloudTrail event from the changes queue changed and a summary of the change.
+
+    Returns None for events made by iambic itself and for events on resources iambic doesn't manage.
+
+    :param message: The SQS message, either the EventBridge event or an SNS notification of it.
+    :param identity_arn: The role arn of the identity iambic is running as.
+    """
+    message_body = json.loads(message["Body"])
+    if "Message" in message_body:
+        decoded_message = json.loads(message_body["Message"])["detail"]
+    else:
+        decoded_message = message_body["detail"]
+
+    actor = (
+        decoded_message.get("userIdentity", {})
+        .get("sessionContext", {})
+        .get("sessionIssuer", {})
+        .get("arn", "")
+    )
+    if actor == identity_arn:
+        return None
+
+    session_name = (
+        decoded_message.get("userIdentity", {}).get("principalId").split(":")[-1]
+    )
+    account_id = decoded_message.get("recipientAccountId")
+    request_params = decoded_message["requestParameters"]
+    event = decoded_message["eventName"]
+
+    if role_name := request_params.get("roleName"):
+        resource_id = role_name
+        resource_type = "Role"
+        message_details = RoleMessageDetails(
+            account_id=account_id,
+            role_name=role_name,
+            delete=bool(event == "DeleteRole"),
+        )
+    elif user_name := request_params.get("userName"):
+        resource_id = user_name
+        resource_type = "User"
+        message_details = UserMessageDetails(
+            account_id=account_id,
+            user_name=user_name,
+            delete=bool(event == "DeleteUser"),
+        )
+    elif group_name := request_params.get("groupName"):
+        resource_id = group_name
+        resource_type = "Group"
+        message_details = GroupMessageDetails(
+            account_id=account_id,
+            group_name=group_name,
+            delete=bool(event == "DeleteGroup"),
+        )
+    elif policy_arn := request_params.get("policyArn"):
+        split_policy = policy_arn.split("/")
+        policy_name = split_policy[-1]
+        policy_path = (
+            "/" if len(split_policy) == 2 else f"/{'/'.join(split_policy[1:-1])}/"
+        )
+        resource_id = policy_name
+        resource_type = "ManagedPolicy"
+        message_details = ManagedPolicyMessageDetails(
+            account_id=account_id,
+            policy_name=policy_name,
+            policy_path=policy_path,
+            delete=bool(event == "DeletePolicy"),
+        )
+    elif permission_set_arn := request_params.get("permissionSetArn"):
+        resource_id = permission_set_arn
+        resource_type = "PermissionSet"
+        message_details = PermissionSetMessageDetails(
+            account_id=account_id,
+            instance_arn=request_params.get("instanceArn"),
+            permission_set_arn=permission_set_arn,
+        )
+    else:
+        return None
+
+    return (
+        message_details,
+        f"User {session_name} performed action {event} "
+        f"on {resource_type}({resource_id}) on account {account_id}.\n",
+    )
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import base64
-import json
+import functools
 import uuid
 from typing import TYPE_CHECKING, Union
 
@@ -14,7 +14,8 @@ from iambic.core.iambic_enum import Command, IambicManaged
 from iambic.core.logger import log
 from iambic.core.models import BaseTemplate, ExecutionMessage, TemplateChangeDetails
 from iambic.core.parser import load_templates
-from iambic.core.utils import async_batch_processor, gather_templates, yaml
+from iambic.core.utils import NoqSemaphore, evaluate_on_provider, gather_templates, yaml
+from iambic.plugins.v0_1_0.aws.apply_scheduler import ApplyScheduler
 from iambic.plugins.v0_1_0.aws.event_bridge.models import (
     GroupMessageDetails,
     ManagedPolicyMessageDetails,
@@ -22,6 +23,8 @@ from iambic.plugins.v0_1_0.aws.event_bridge.models import (
     RoleMessageDetails,
     UserMessageDetails,
 )
+from iambic.plugins.v0_1_0.aws.event_bridge.utils import parse_cloudtrail_message
+from iambic.plugins.v0_1_0.aws.iam.group.models import AWS_IAM_GROUP_TEMPLATE_TYPE
 from iambic.plugins.v0_1_0.aws.iam.group.template_generation import (
     collect_aws_groups,
     generate_aws_group_templates,
@@ -31,10 +34,12 @@ from iambic.plugins.v0_1_0.aws.iam.policy.template_generation import (
     collect_aws_managed_policies,
     generate_aws_managed_policy_templates,
 )
+from iambic.plugins.v0_1_0.aws.iam.role.models import AWS_IAM_ROLE_TEMPLATE_TYPE
 from iambic.plugins.v0_1_0.aws.iam.role.template_generation import (
     collect_aws_roles,
     generate_aws_role_templates,
 )
+from iambic.plugins.v0_1_0.aws.iam.user.models import AWS_IAM_USER_TEMPLATE_TYPE
 from iambic.plugins.v0_1_0.aws.iam.user.template_generation import (
     collect_aws_users,
     generate_aws_user_templates,
@@ -50,10 +55,20 @@ from iambic.plugins.v0_1_0.aws.identity_center.permission_set.utils import (
     generate_permission_set_map,
 )
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
+from iambic.plugins.v0_1_0.aws.rate_limiter import get_rate_limiter_stats
+from iambic.plugins.v0_1_0.aws.sqs_consumer import SQSConsumer, SQSQueue
+from iambic.plugins.v0_1_0.aws.utils import boto_crud_call
 
 if TYPE_CHECKING:
     from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
 
+IAM_TEMPLATE_TYPES = [
+    AWS_IAM_ROLE_TEMPLATE_TYPE,
+    AWS_IAM_USER_TEMPLATE_TYPE,
+    AWS_IAM_GROUP_TEMPLATE_TYPE,
+    AWS_MANAGED_POLICY_TEMPLATE_TYPE,
+]
+
 
 async def load(config: AWSConfig) -> AWSConfig:
     config_account_idx_map = {
@@ -111,6 +126,50 @@ async def load(config: AWSConfig) -> AWSConfig:
     return config
 
 
+async def capture_iam_plan_snapshots(
+    exe_message: ExecutionMessage, config: AWSConfig, templates: list[BaseTemplate]
+) -> list[AWSAccount]:
+    """Capture the IAM state of the accounts the IAM templates of a plan evaluate on.
+
+    The templates then diff against the snapshot instead of describing each resource.
+    An account is captured once per execution, later batches of templates reuse it.
+    Accounts that fail to capture are left to read the live state.
+
+    :return: The accounts with a snapshot, released by apply_complete once the plan is done.
+    """
+    iam_templates = [
+        template
+        for template in templates
+        if template.template_type in IAM_TEMPLATE_TYPES
+    ]
+    if ctx.execute or not iam_templates:
+        return []
+
+    aws_accounts = [
+        aws_account
+        for aws_account in config.accounts
+        if any(
+            evaluate_on_provider(template, aws_account) for template in iam_templates
+        )
+    ]
+
+    async def _capture_iam_plan_snapshot(aws_account: AWSAccount):
+        try:
+            await aws_account.capture_iam_plan_snapshot(exe_message.execution_id)
+        except Exception as err:
+            log.warning(
+                "Unable to capture the IAM state of the account. Reading it from AWS instead.",
+                account=str(aws_account),
+                error=str(err),
+            )
+
+    log.info("Capturing the IAM state of accounts.", account_count=len(aws_accounts))
+    await NoqSemaphore(_capture_iam_plan_snapshot, 25).process(
+        [{"aws_account": aws_account} for aws_account in aws_accounts]
+    )
+    return aws_accounts
+
+
 async def apply(
     exe_message: ExecutionMessage,
     config: AWSConfig,
@@ -135,31 +194,10 @@ async def apply(
         await generate_permission_set_map(config.accounts, templates)
 
     template_changes: list[TemplateChangeDetails] = []
-
-    if managed_policy_tasks := [
-        template.apply(config)
-        for template in templates
-        if template.template_type == AWS_MANAGED_POLICY_TEMPLATE_TYPE
-    ]:
-        template_changes.extend(
-            await async_batch_processor(managed_policy_tasks, 50, 0)
-        )
-        if len(template_changes) > len(managed_policy_tasks):
-            # There are other template changes that could rely on the managed policy
-            # Give a few seconds to allow the managed policies to be created in AWS
-            await asyncio.sleep(10)
-
-    template_changes.extend(
-        await async_batch_processor(
-            [
-                template.apply(config)
-                for template in templates
-                if template.template_type != AWS_MANAGED_POLICY_TEMPLATE_TYPE
-            ],
-            50,
-            0,
-        )
-    )
+    await capture_iam_plan_snapshots(exe_message, config, templates)
+    # Templates that reference a managed policy of the same apply wait for it to exist
+    async for template_change in ApplyScheduler().apply(config, templates):
+        template_changes.append(template_change)
 
     return [
         template_change
@@ -168,6 +206,19 @@ async def apply(
     ]
 
 
+async def apply_complete(exe_message: ExecutionMessage, config: AWSConfig):
+    """
+    The async_apply_complete_callable for the AWS IambicPlugin class.
+
+    Releases the IAM plan snapshots once every batch of templates has been applied.
+
+    :param exe_message: Execution context
+    :param config: The config object.
+    """
+    for aws_account in config.accounts:
+        aws_account.release_iam_plan_snapshot(exe_message.execution_id)
+
+
 async def import_service_resources(
     exe_message: ExecutionMessage,
     config: AWSConfig,
@@ -264,6 +315,40 @@ async def import_identity_center_resources(
     )
 
 
+async def import_iam_resources(
+    exe_message: ExecutionMessage,
+    config: AWSConfig,
+    base_output_dir: str,
+    messages: list = None,
+    remote_worker=None,
+):
+    try:
+        await import_service_resources(
+            exe_message,
+            config,
+            base_output_dir,
+            "iam",
+            [
+                collect_aws_roles,
+                collect_aws_groups,
+                collect_aws_users,
+                collect_aws_managed_policies,
+            ],
+            [
+                generate_aws_role_templates,
+                generate_aws_user_templates,
+                generate_aws_group_templates,
+                generate_aws_managed_policy_templates,
+            ],
+            messages,
+            remote_worker,
+        )
+    finally:
+        # The collectors share one authorization details snapshot per account for the execution
+        for account in config.accounts:
+            account.release_authorization_details(exe_message.execution_id)
+
+
 async def import_aws_resources(
     exe_message: ExecutionMessage,
     config: AWSConfig,
@@ -282,29 +367,35 @@ async def import_aws_resources(
 
     if not exe_message.metadata or exe_message.metadata["service"] == "iam":
         tasks.append(
-            import_service_resources(
-                exe_message,
-                config,
-                base_output_dir,
-                "iam",
-                [
-                    collect_aws_roles,
-                    collect_aws_groups,
-                    collect_aws_users,
-                    collect_aws_managed_policies,
-                ],
-                [
-                    generate_aws_role_templates,
-                    generate_aws_user_templates,
-                    generate_aws_group_templates,
-                    generate_aws_managed_policy_templates,
-                ],
-                messages,
-                remote_worker,
+            import_iam_resources(
+                exe_message, config, base_output_dir, messages, remote_worker
             )
         )
 
     await asyncio.gather(*tasks)
+    log.debug("AWS API rate limits.", rate_limits=get_rate_limiter_stats())
+
+
+async def get_cloudtrail_changes_queue(config: AWSConfig, queue_arn: str) -> SQSQueue:
+    queue_name = queue_arn.split(":")[-1]
+    region_name = queue_arn.split(":")[3]
+    session = await config.get_boto_session_from_arn(queue_arn, region_name)
+    identity = await boto_crud_call(session.client("sts").get_caller_identity)
+    identity_arn_with_session_name = (
+        identity["Arn"].replace(":sts:", ":iam:").replace("assumed-role", "role")
+    )
+    # TODO: This only works for same account identities. We need to do similar to NoqMeter,
+    # check all roles we have access to on all accounts, or store this in configuration.
+    # Then exclude these from the list of roles to check.
+
+    identity_arn = "/".join(identity_arn_with_session_name.split("/")[0:2])
+    sqs = session.client("sqs", region_name=region_name)
+    queue_url_res = await boto_crud_call(sqs.get_queue_url, QueueName=queue_name)
+    return SQSQueue(
+        sqs,
+        queue_url_res.get("QueueUrl"),
+        functools.partial(parse_cloudtrail_message, identity_arn=identity_arn),
+    )
 
 
 async def detect_changes(  # noqa: C901
@@ -321,150 +412,28 @@ async def detect_changes(  # noqa: C901
     permission_set_messages = []
     commit_message = "Out of band changes detected.\nSummary:\n"
 
-    for queue_arn in config.sqs_cloudtrail_changes_queues:
-        queue_name = queue_arn.split(":")[-1]
-        region_name = queue_arn.split(":")[3]
-        session = await config.get_boto_session_from_arn(queue_arn, region_name)
-        identity = session.client("sts").get_caller_identity()
-        identity_arn_with_session_name = (
-            identity["Arn"].replace(":sts:", ":iam:").replace("assumed-role", "role")
-        )
-        # TODO: This only works for same account identities. We need to do similar to NoqMeter,
-        # check all roles we have access to on all accounts, or store this in configuration.
-        # Then exclude these from the list of roles to check.
-
-        identity_arn = "/".join(identity_arn_with_session_name.split("/")[0:2])
-        sqs = session.client("sqs", region_name=region_name)
-        queue_url_res = sqs.get_queue_url(QueueName=queue_name)
-        queue_url = queue_url_res.get("QueueUrl")
-        messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get(
-            "Messages", []
-        )
-
-        while messages:
-            processed_messages = []
-            for message in messages:
-                try:
-                    processed_messages.append(
-                        {
-                            "Id": message["MessageId"],
-                            "ReceiptHandle": message["ReceiptHandle"],
-                        }
-                    )
-                    message_body = json.loads(message["Body"])
-                    try:
-                        if "Message" in message_body:
-                            decoded_message = json.loads(message_body["Message"])[
-                                "detail"
-                            ]
-                        else:
-                            decoded_message = message_body["detail"]
-                    except Exception as err:
-                        log.debug(
-                            "Unable to process message", error=str(err), message=message
-                        )
-                        processed_messages.append(
-                            {
-                                "Id": message["MessageId"],
-                                "ReceiptHandle": message["ReceiptHandle"],
-                            }
-                        )
-                        continue
-                    actor = (
-                        decoded_message.get("userIdentity", {})
-                        .get("sessionContext", {})
-                        .get("sessionIssuer", {})
-                        .get("arn", "")
-                    )
-                    session_name = (
-                        decoded_message.get("userIdentity", {})
-                        .get("principalId")
-                        .split(":")[-1]
-                    )
-                    if actor != identity_arn:
-                        account_id = decoded_message.get("recipientAccountId")
-                        request_params = decoded_message["requestParameters"]
-                        event = decoded_message["eventName"]
-                        resource_id = None
-                        resource_type = None
-                        if role_name := request_params.get("roleName"):
-                            resource_id = role_name
-                            resource_type = "Role"
-                            role_messages.append(
-                                RoleMessageDetails(
-                                    account_id=account_id,
-                                    role_name=role_name,
-                                    delete=bool(event == "DeleteRole"),
-                                )
-                            )
-                        elif user_name := request_params.get("userName"):
-                            resource_id = user_name
-                            resource_type = "User"
-                            user_messages.append(
-                                UserMessageDetails(
-                                    account_id=account_id,
-                                    role_name=user_name,
-                                    delete=bool(event == "DeleteUser"),
-                                )
-                            )
-                        elif group_name := request_params.get("groupName"):
-                            resource_id = group_name
-                            resource_type = "Group"
-                            group_messages.append(
-                                GroupMessageDetails(
-                                    account_id=account_id,
-                                    group_name=group_name,
-                                    delete=bool(event == "DeleteGroup"),
-                                )
-                            )
-                        elif policy_arn := request_params.get("policyArn"):
-                            split_policy = policy_arn.split("/")
-                            policy_name = split_policy[-1]
-                            policy_path = (
-                                "/"
-                                if len(split_policy) == 2
-                                else f"/{'/'.join(split_policy[1:-1])}/"
-                            )
-                            resource_id = policy_name
-                            resource_type = "ManagedPolicy"
-                            managed_policy_messages.append(
-                                ManagedPolicyMessageDetails(
-                                    account_id=account_id,
-                                    policy_name=policy_name,
-                                    policy_path=policy_path,
-                                    delete=bool(
-                                        decoded_message["eventName"] == "DeletePolicy"
-                                    ),
-                                )
-                            )
-                        elif permission_set_arn := request_params.get(
-                            "permissionSetArn"
-                        ):
-                            resource_id = permission_set_arn
-                            resource_type = "PermissionSet"
-                            permission_set_messages.append(
-                                PermissionSetMessageDetails(
-                                    account_id=account_id,
-                                    instance_arn=request_params.get("instanceArn"),
-                                    permission_set_arn=permission_set_arn,
-                                )
-                            )
-
-                        if resource_id:
-                            commit_message = (
-                                f"{commit_message}User {session_name} performed action {event} "
-                                f"on {resource_type}({resource_id}) on account {account_id}.\n"
-                            )
-                except Exception as err:
-                    log.debug(
-                        "Unable to process message", error=str(err), message=message
-                    )
-                    continue
-
-            sqs.delete_message_batch(QueueUrl=queue_url, Entries=processed_messages)
-            messages = sqs.receive_message(
-                QueueUrl=queue_url, MaxNumberOfMessages=10
-            ).get("Messages", [])
+    queues = await asyncio.gather(
+        *[
+            get_cloudtrail_changes_queue(config, queue_arn)
+            for queue_arn in config.sqs_cloudtrail_changes_queues
+        ]
+    )
+    sqs_consumer = SQSConsumer(
+        max_messages=config.detect_changes_max_messages,
+        max_seconds=config.detect_changes_max_seconds,
+    )
+    for message_details, change_summary in await sqs_consumer.consume(queues):
+        if isinstance(message_details, RoleMessageDetails):
+            role_messages.append(message_details)
+        elif isinstance(message_details, UserMessageDetails):
+            user_messages.append(message_details)
+        elif isinstance(message_details, GroupMessageDetails):
+            group_messages.append(message_details)
+        elif isinstance(message_details, ManagedPolicyMessageDetails):
+            managed_policy_messages.append(message_details)
+        elif isinstance(message_details, PermissionSetMessageDetails):
+            permission_set_messages.append(message_details)
+        commit_message = f"{commit_message}{change_summary}"
 
     exe_message = ExecutionMessage(
         execution_id=str(uuid.uuid4()), command=Command.IMPORT, provider_type="aws"
@@ -497,7 +466,11 @@ async def detect_changes(  # noqa: C901
         )
 
     if collect_tasks:
-        await asyncio.gather(*collect_tasks)
+        try:
+            await asyncio.gather(*collect_tasks)
+        finally:
+            for account in config.accounts:
+                account.release_authorization_details(exe_message.execution_id)
 
         tasks = []
         if role_messages:
@@ -626,7 +599,12 @@ async def discover_new_aws_accounts(
         sub_message.command = Command.APPLY
         sub_config = config.copy()
         sub_config.accounts = accounts_to_apply
-        await apply(exe_message, sub_config, load_templates(templates), remote_worker)
+        await apply(
+            exe_message,
+            sub_config,
+            load_templates(templates, preserve_comments=ctx.execute),
+            remote_worker,
+        )
 
     return run_import
 
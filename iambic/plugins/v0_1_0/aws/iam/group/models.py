@@ -23,6 +23,9 @@ from iambic.plugins.v0_1_0.aws.iam.group.utils import (
 )
 from iambic.plugins.v0_1_0.aws.iam.models import Path
 from iambic.plugins.v0_1_0.aws.iam.policy.models import ManagedPolicyRef, PolicyDocument
+from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
+    get_referenced_managed_policy_arns,
+)
 from iambic.plugins.v0_1_0.aws.models import AccessModel, AWSAccount, AWSTemplate
 from iambic.plugins.v0_1_0.aws.utils import boto_crud_call, remove_expired_resources
 
@@ -83,6 +86,9 @@ class AwsIamGroupTemplate(AWSTemplate, AccessModel):
         description="Properties of the group",
     )
 
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        return get_referenced_managed_policy_arns(self.apply_resource_dict(aws_account))
+
     def _is_iambic_import_only(self, aws_account: AWSAccount):
         return (
             "aws-service-group" in self.properties.path
@@ -118,7 +124,9 @@ class AwsIamGroupTemplate(AWSTemplate, AccessModel):
         )
         iambic_import_only = self._is_iambic_import_only(aws_account)
 
-        current_group = await get_group(group_name, client)
+        current_group = await get_group(
+            group_name, client, authorization_details=aws_account.iam_plan_snapshot
+        )
         if current_group:
             account_change_details.current_value = {
                 **current_group
@@ -5,20 +5,16 @@ import os
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
-import aiofiles
-
-from iambic.core import noq_json as json
+from iambic.core.intermediate_store import IntermediateStore
 from iambic.core.logger import log
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import (
     base_group_str_attribute,
     create_or_update_template,
-    delete_orphaned_templates,
-    get_existing_template_map,
     group_dict_attribute,
     group_int_or_str_attribute,
 )
-from iambic.core.utils import NoqSemaphore, normalize_dict_keys, resource_file_upsert
+from iambic.core.utils import NoqSemaphore, normalize_dict_keys
 from iambic.plugins.v0_1_0.aws.event_bridge.models import GroupMessageDetails
 from iambic.plugins.v0_1_0.aws.iam.group.models import (
     AWS_IAM_GROUP_TEMPLATE_TYPE,
@@ -29,9 +25,10 @@ from iambic.plugins.v0_1_0.aws.iam.group.utils import (
     get_group_across_accounts,
     get_group_inline_policies,
     get_group_managed_policies,
-    list_groups,
 )
+from iambic.plugins.v0_1_0.aws.iam.utils import get_inline_policy_list
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
+from iambic.plugins.v0_1_0.aws.rate_limiter import MAX_CONCURRENT_CALLS
 from iambic.plugins.v0_1_0.aws.utils import (
     calculate_import_preference,
     get_aws_account_map,
@@ -81,12 +78,16 @@ async def generate_account_group_resource_files(
     aws_account: AWSAccount,
 ) -> dict:
     account_group_response_dir = get_response_dir(exe_message, aws_account)
-    group_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    group_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
 
     response = dict(account_id=aws_account.account_id, groups=[])
-    iam_client = await aws_account.get_boto3_client("iam")
-    account_groups = await list_groups(iam_client)
+    authorization_details = await aws_account.get_authorization_details(
+        exe_message.execution_id
+    )
+    account_groups = authorization_details.list_groups()
 
     log.info(
         "Retrieved AWS IAM Groups.",
@@ -96,16 +97,22 @@ async def generate_account_group_resource_files(
     )
 
     for account_group in account_groups:
-        group_path = os.path.join(
-            account_group_response_dir, f'{account_group["GroupName"]}.json'
-        )
+        group_name = account_group["GroupName"]
+        group_path = os.path.join(account_group_response_dir, f"{group_name}.json")
         response["groups"].append(
             {
                 "path": group_path,
-                "name": account_group["GroupName"],
+                "name": group_name,
                 "account_id": aws_account.account_id,
             }
         )
+        # The snapshot has the group details so the group is stored once with all of them
+        account_group["InlinePolicies"] = get_inline_policy_list(
+            authorization_details.get_group_inline_policies(group_name)
+        )
+        account_group[
+            "ManagedPolicies"
+        ] = authorization_details.get_group_managed_policies(group_name)
         messages.append(
             dict(file_path=group_path, content_as_dict=account_group, replace_file=True)
         )
@@ -127,7 +134,9 @@ async def generate_group_resource_file_for_all_accounts(
         aws_account.account_id: get_response_dir(exe_message, aws_account)
         for aws_account in aws_accounts
     }
-    group_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    group_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
     response = []
 
@@ -169,38 +178,40 @@ async def generate_group_resource_file_for_all_accounts(
 
 
 async def set_group_resource_inline_policies(
-    group_name: str, group_resource_path: str, aws_account: AWSAccount
+    group_name: str,
+    group_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
-    group_inline_policies = await get_group_inline_policies(group_name, iam_client)
-    for k in group_inline_policies.keys():
-        group_inline_policies[k]["policy_name"] = k
-
-    group_inline_policies = list(group_inline_policies.values())
-    await resource_file_upsert(
+    group_inline_policies = get_inline_policy_list(
+        await get_group_inline_policies(group_name, iam_client)
+    )
+    await intermediate_store.upsert(
         group_resource_path, {"InlinePolicies": group_inline_policies}, False
     )
 
 
 async def set_group_resource_managed_policies(
-    group_name: str, group_resource_path: str, aws_account: AWSAccount
+    group_name: str,
+    group_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     group_managed_policies = await get_group_managed_policies(group_name, iam_client)
-    await resource_file_upsert(
+    await intermediate_store.upsert(
         group_resource_path, {"ManagedPolicies": group_managed_policies}, False
     )
 
 
-async def _account_id_to_group_map(group_refs):
+async def _account_id_to_group_map(group_refs, intermediate_store: IntermediateStore):
     account_id_to_group_map = {}
     for group_ref in group_refs:
-        async with aiofiles.open(group_ref["path"], mode="r") as f:
-            content_dict = json.loads(await f.read())
-
-            account_id_to_group_map[group_ref["account_id"]] = normalize_dict_keys(
-                content_dict
-            )
+        content_dict = await intermediate_store.read(group_ref["path"])
+        account_id_to_group_map[group_ref["account_id"]] = normalize_dict_keys(
+            content_dict
+        )
     return account_id_to_group_map
 
 
@@ -211,8 +222,11 @@ async def create_templated_group(  # noqa: C901
     group_dir: str,
     existing_template_map: dict,
     config: AWSConfig,
+    intermediate_store: IntermediateStore,
 ) -> AwsIamGroupTemplate:
-    account_id_to_group_map = await _account_id_to_group_map(group_refs)
+    account_id_to_group_map = await _account_id_to_group_map(
+        group_refs, intermediate_store
+    )
     num_of_accounts = len(group_refs)
 
     min_accounts_required_for_wildcard_included_accounts = (
@@ -331,14 +345,14 @@ async def collect_aws_groups(
         if not detect_messages:
             return
 
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_GROUP_TEMPLATE_TYPE
     )
     set_group_resource_inline_policies_semaphore = NoqSemaphore(
-        set_group_resource_inline_policies, 20
+        set_group_resource_inline_policies, MAX_CONCURRENT_CALLS
     )
     set_group_resource_managed_policies_semaphore = NoqSemaphore(
-        set_group_resource_managed_policies, 30
+        set_group_resource_managed_policies, MAX_CONCURRENT_CALLS
     )
 
     log.info(
@@ -349,7 +363,7 @@ async def collect_aws_groups(
     if detect_messages:
         aws_accounts = list(aws_account_map.values())
         generate_group_resource_file_for_all_accounts_semaphore = NoqSemaphore(
-            generate_group_resource_file_for_all_accounts, 45
+            generate_group_resource_file_for_all_accounts, MAX_CONCURRENT_CALLS
         )
         tasks = [
             {"aws_accounts": aws_accounts, "group_name": group.group_name}
@@ -415,36 +429,39 @@ async def collect_aws_groups(
         )
         return
 
-    messages = []
-    # Upsert groups
-    for account_group in account_groups:
-        for group in account_group["groups"]:
-            messages.append(
-                {
-                    "group_name": group["name"],
-                    "group_resource_path": group["path"],
-                    "aws_account": aws_account_map[account_group["account_id"]],
-                }
-            )
+    if detect_messages:
+        # Groups listed from the account snapshot are stored with their details
+        messages = []
+        # Upsert groups
+        for account_group in account_groups:
+            for group in account_group["groups"]:
+                messages.append(
+                    {
+                        "group_name": group["name"],
+                        "group_resource_path": group["path"],
+                        "aws_account": aws_account_map[account_group["account_id"]],
+                        "intermediate_store": exe_message.intermediate_store,
+                    }
+                )
+
+        log.info(
+            "Setting inline policies in group templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_group_resource_inline_policies_semaphore.process(messages)
+        log.info(
+            "Setting managed policies in group templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_group_resource_managed_policies_semaphore.process(messages)
 
-    log.info(
-        "Setting inline policies in group templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_group_resource_inline_policies_semaphore.process(messages)
-    log.info(
-        "Setting managed policies in group templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_group_resource_managed_policies_semaphore.process(messages)
     log.info("Finished retrieving group details", accounts=list(aws_account_map.keys()))
 
-    account_group_output = json.dumps(account_groups)
-    with open(
+    await exe_message.intermediate_store.upsert(
         exe_message.get_file_path(*RESOURCE_DIR, file_name_and_extension="output.json"),
-        "w",
-    ) as f:
-        f.write(account_group_output)
+        account_groups,
+        replace_file=True,
+    )
 
 
 async def generate_aws_group_templates(
@@ -454,7 +471,7 @@ async def generate_aws_group_templates(
     detect_messages: list[GroupMessageDetails] = None,
 ):
     aws_account_map = await get_aws_account_map(config)
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_GROUP_TEMPLATE_TYPE
     )
     group_dir = get_template_dir(base_output_dir)
@@ -480,7 +497,6 @@ async def generate_aws_group_templates(
     grouped_group_map = await base_group_str_attribute(aws_account_map, account_groups)
 
     log.info("Writing templated groups")
-    all_resource_ids = set()
     for group_name, group_refs in grouped_group_map.items():
         resource_template = await create_templated_group(
             aws_account_map,
@@ -489,16 +505,19 @@ async def generate_aws_group_templates(
             group_dir,
             existing_template_map,
             config,
+            exe_message.intermediate_store,
         )
         if not resource_template:
             # Template not updated. Most likely because it's an `enforced` template.
             continue
-        all_resource_ids.add(resource_template.resource_id)
+        exe_message.template_repository.touch(
+            base_output_dir, AWS_IAM_GROUP_TEMPLATE_TYPE, resource_template.resource_id
+        )
 
     if not detect_messages:
-        # NEVER call this if messages are passed in because all_resource_ids will only contain those resources
-        delete_orphaned_templates(
-            list(existing_template_map.values()), all_resource_ids
+        # NEVER call this if messages are passed in because only those resources were touched
+        exe_message.template_repository.delete_orphaned_templates(
+            base_output_dir, AWS_IAM_GROUP_TEMPLATE_TYPE
         )
 
     log.info("Finished templated group generation")
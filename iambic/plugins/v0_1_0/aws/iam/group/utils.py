@@ -11,6 +11,7 @@ from iambic.core.context import ctx
 from iambic.core.logger import log
 from iambic.core.models import ProposedChange, ProposedChangeType
 from iambic.core.utils import aio_wrapper, plugin_apply_wrapper
+from iambic.plugins.v0_1_0.aws.iam.utils import AccountAuthorizationDetails
 from iambic.plugins.v0_1_0.aws.utils import boto_crud_call, paginated_search
 
 if TYPE_CHECKING:
@@ -76,7 +77,24 @@ async def get_group_managed_policies(
     return policies
 
 
-async def get_group(group_name: str, iam_client, include_policies: bool = True) -> dict:
+async def get_group(
+    group_name: str,
+    iam_client,
+    include_policies: bool = True,
+    authorization_details: AccountAuthorizationDetails = None,
+) -> dict:
+    """Returns the group or an empty dict if it doesn't exist.
+
+    Read from authorization_details if the group is in it, otherwise from AWS.
+    """
+    if authorization_details and (
+        current_group := authorization_details.get_group(group_name)
+    ):
+        if not include_policies:
+            current_group.pop("ManagedPolicies")
+            current_group.pop("InlinePolicies")
+        return current_group
+
     try:
         current_group = (
             await boto_crud_call(iam_client.get_group, GroupName=group_name)
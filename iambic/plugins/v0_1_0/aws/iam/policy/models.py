@@ -24,6 +24,7 @@ from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
     apply_update_managed_policy,
     delete_managed_policy,
     get_managed_policy,
+    wait_for_managed_policy,
 )
 from iambic.plugins.v0_1_0.aws.models import (
     ARN_RE,
@@ -317,6 +318,42 @@ class AwsIamManagedPolicyTemplate(AWSTemplate, AccessModel):
         policy_name = self.properties.policy_name
         return f"arn:{aws_account.partition.value}:iam::{aws_account.account_id}:policy{path}{policy_name}"
 
+    def _is_deleted_on_account(self, aws_account: AWSAccount) -> bool:
+        deleted = self.get_attribute_val_for_account(aws_account, "deleted", False)
+        if isinstance(deleted, list):
+            deleted = deleted[0].deleted
+        return deleted
+
+    def get_provided_resources(self, aws_account: AWSAccount) -> set[str]:
+        if self._is_deleted_on_account(aws_account):
+            return set()
+
+        account_policy = self.apply_resource_dict(aws_account)
+        # The path and name are what permission sets reference the policy by
+        return {
+            account_policy["Arn"],
+            f"{account_policy.get('Path', '/')}{account_policy['PolicyName']}",
+        }
+
+    async def wait_until_applied(
+        self, aws_account: AWSAccount, account_change_details: AccountChangeDetails
+    ):
+        if self._is_iambic_import_only(aws_account) or not any(
+            proposed_change.change_type == ProposedChangeType.CREATE
+            for proposed_change in account_change_details.proposed_changes
+        ):
+            return
+
+        policy_arn = self.apply_resource_dict(aws_account)["Arn"]
+        if not await wait_for_managed_policy(
+            await aws_account.get_boto3_client("iam"), policy_arn
+        ):
+            log.warning(
+                "Timed out waiting for the managed policy to be created.",
+                policy_arn=policy_arn,
+                account=str(aws_account),
+            )
+
     def _apply_resource_dict(self, aws_account: AWSAccount = None) -> dict:
         resource_dict = super()._apply_resource_dict(aws_account)
         resource_dict["Arn"] = self.get_arn_for_account(aws_account)
@@ -341,7 +378,9 @@ class AwsIamManagedPolicyTemplate(AWSTemplate, AccessModel):
         )
         is_iambic_import_only = self._is_iambic_import_only(aws_account)
         policy_arn = account_policy.pop("Arn")
-        current_policy = await get_managed_policy(client, policy_arn)
+        current_policy = await get_managed_policy(
+            client, policy_arn, authorization_details=aws_account.iam_plan_snapshot
+        )
         if current_policy:
             account_change_details.current_value = {**current_policy}
 
@@ -350,11 +389,7 @@ class AwsIamManagedPolicyTemplate(AWSTemplate, AccessModel):
                 account_change_details.new_value = {}
                 return account_change_details
 
-        deleted = self.get_attribute_val_for_account(aws_account, "deleted", False)
-        if isinstance(deleted, list):
-            deleted = deleted[0].deleted
-
-        if deleted:
+        if self._is_deleted_on_account(aws_account):
             if current_policy:
                 account_change_details.new_value = None
                 account_change_details.proposed_changes.append(
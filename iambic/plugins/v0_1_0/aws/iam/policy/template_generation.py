@@ -5,20 +5,16 @@ import os
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
-import aiofiles
-
-from iambic.core import noq_json as json
+from iambic.core.intermediate_store import IntermediateStore
 from iambic.core.logger import log
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import (
     base_group_str_attribute,
     create_or_update_template,
-    delete_orphaned_templates,
-    get_existing_template_map,
     group_dict_attribute,
     group_int_or_str_attribute,
 )
-from iambic.core.utils import NoqSemaphore, normalize_dict_keys, resource_file_upsert
+from iambic.core.utils import NoqSemaphore, normalize_dict_keys
 from iambic.plugins.v0_1_0.aws.event_bridge.models import ManagedPolicyMessageDetails
 from iambic.plugins.v0_1_0.aws.iam.policy.models import (
     AWS_MANAGED_POLICY_TEMPLATE_TYPE,
@@ -27,9 +23,10 @@ from iambic.plugins.v0_1_0.aws.iam.policy.models import (
 )
 from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
     get_managed_policy_across_accounts,
-    list_managed_policies,
+    list_managed_policy_tags,
 )
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
+from iambic.plugins.v0_1_0.aws.rate_limiter import MAX_CONCURRENT_CALLS
 from iambic.plugins.v0_1_0.aws.utils import (
     calculate_import_preference,
     get_aws_account_map,
@@ -79,12 +76,30 @@ async def generate_account_managed_policy_resource_files(
     aws_account: AWSAccount,
 ) -> dict:
     account_resource_dir = get_response_dir(exe_message, aws_account)
-    resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
 
     response = dict(account_id=aws_account.account_id, managed_policies=[])
     iam_client = await aws_account.get_boto3_client("iam")
-    account_managed_policies = await list_managed_policies(iam_client)
+    authorization_details = await aws_account.get_authorization_details(
+        exe_message.execution_id
+    )
+    account_managed_policies = authorization_details.list_managed_policies()
+    # The snapshot has the policy documents but not the tags
+    list_managed_policy_tags_semaphore = NoqSemaphore(
+        list_managed_policy_tags, MAX_CONCURRENT_CALLS
+    )
+    managed_policy_tags = await list_managed_policy_tags_semaphore.process(
+        [
+            {"iam_client": iam_client, "policy_arn": managed_policy["Arn"]}
+            for managed_policy in account_managed_policies
+        ]
+    )
+    for managed_policy, tags in zip(account_managed_policies, managed_policy_tags):
+        if tags:
+            managed_policy["Tags"] = tags
 
     log.info(
         "Retrieved AWS IAM Managed Policies.",
@@ -131,7 +146,9 @@ async def generate_managed_policy_resource_file_for_all_accounts(
         aws_account.account_id: get_response_dir(exe_message, aws_account)
         for aws_account in aws_accounts
     }
-    mp_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    mp_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
     response = []
 
@@ -185,6 +202,7 @@ async def create_templated_managed_policy(  # noqa: C901
     managed_policy_dir: str,
     existing_template_map: dict,
     config: AWSConfig,
+    intermediate_store: IntermediateStore,
 ):
     min_accounts_required_for_wildcard_included_accounts = (
         config.min_accounts_required_for_wildcard_included_accounts
@@ -192,11 +210,10 @@ async def create_templated_managed_policy(  # noqa: C901
     account_id_to_mp_map = {}
     num_of_accounts = len(managed_policy_refs)
     for managed_policy_ref in managed_policy_refs:
-        async with aiofiles.open(managed_policy_ref["file_path"], mode="r") as f:
-            content_dict = json.loads(await f.read())
-            account_id_to_mp_map[
-                managed_policy_ref["account_id"]
-            ] = normalize_dict_keys(content_dict)
+        content_dict = await intermediate_store.read(managed_policy_ref["file_path"])
+        account_id_to_mp_map[managed_policy_ref["account_id"]] = normalize_dict_keys(
+            content_dict
+        )
 
     # calculate preference based on existing template
     prefer_templatized = calculate_import_preference(
@@ -320,7 +337,7 @@ async def collect_aws_managed_policies(
         if not detect_messages:
             return
 
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_MANAGED_POLICY_TEMPLATE_TYPE
     )
 
@@ -332,7 +349,7 @@ async def collect_aws_managed_policies(
     if detect_messages:
         aws_accounts = list(aws_account_map.values())
         generate_mp_resource_file_for_all_accounts_semaphore = NoqSemaphore(
-            generate_managed_policy_resource_file_for_all_accounts, 50
+            generate_managed_policy_resource_file_for_all_accounts, MAX_CONCURRENT_CALLS
         )
 
         tasks = [
@@ -428,12 +445,11 @@ async def collect_aws_managed_policies(
         accounts=list(aws_account_map.keys()),
     )
 
-    account_managed_policy_output = json.dumps(account_managed_policies)
-    with open(
+    await exe_message.intermediate_store.upsert(
         exe_message.get_file_path(*RESOURCE_DIR, file_name_and_extension="output.json"),
-        "w",
-    ) as f:
-        f.write(account_managed_policy_output)
+        account_managed_policies,
+        replace_file=True,
+    )
 
 
 async def generate_aws_managed_policy_templates(
@@ -443,7 +459,7 @@ async def generate_aws_managed_policy_templates(
     detect_messages: list[ManagedPolicyMessageDetails] = None,
 ):
     aws_account_map = await get_aws_account_map(config)
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_MANAGED_POLICY_TEMPLATE_TYPE
     )
     resource_dir = get_template_dir(base_output_dir)
@@ -473,7 +489,6 @@ async def generate_aws_managed_policy_templates(
     )
 
     log.info("Writing templated managed policies")
-    all_resource_ids = set()
     for policy_name, policy_refs in grouped_managed_policy_map.items():
         resource_template = await create_templated_managed_policy(
             aws_account_map,
@@ -482,16 +497,21 @@ async def generate_aws_managed_policy_templates(
             resource_dir,
             existing_template_map,
             config,
+            exe_message.intermediate_store,
         )
         if not resource_template:
             # Template not updated. Most likely because it's an `enforced` template.
             continue
-        all_resource_ids.add(resource_template.resource_id)
+        exe_message.template_repository.touch(
+            base_output_dir,
+            AWS_MANAGED_POLICY_TEMPLATE_TYPE,
+            resource_template.resource_id,
+        )
 
     if not detect_messages:
-        # NEVER call this if messages are passed in because all_resource_ids will only contain those resources
-        delete_orphaned_templates(
-            list(existing_template_map.values()), all_resource_ids
+        # NEVER call this if messages are passed in because only those resources were touched
+        exe_message.template_repository.delete_orphaned_templates(
+            base_output_dir, AWS_MANAGED_POLICY_TEMPLATE_TYPE
         )
 
     log.info("Finished templated managed policy generation")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from itertools import chain
 
 from botocore.exceptions import ClientError
@@ -11,6 +12,7 @@ from iambic.core.context import ctx
 from iambic.core.logger import log
 from iambic.core.models import ProposedChange, ProposedChangeType
 from iambic.core.utils import NoqSemaphore, aio_wrapper, plugin_apply_wrapper
+from iambic.plugins.v0_1_0.aws.iam.utils import AccountAuthorizationDetails
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
 from iambic.plugins.v0_1_0.aws.utils import boto_crud_call, paginated_search
 
@@ -61,7 +63,24 @@ async def get_managed_policy_attachments(iam_client, policy_arn: str):
     )
 
 
-async def get_managed_policy(iam_client, policy_arn: str, **kwargs) -> dict:
+async def get_managed_policy(
+    iam_client,
+    policy_arn: str,
+    authorization_details: AccountAuthorizationDetails = None,
+    **kwargs,
+) -> dict:
+    """Returns the managed policy or an empty dict if it doesn't exist.
+
+    Read from authorization_details if the policy is in it, otherwise from AWS.
+    The snapshot has no policy tags so those are always read from AWS.
+    """
+    if authorization_details and (
+        response := authorization_details.get_managed_policy(policy_arn)
+    ):
+        if tags := await list_managed_policy_tags(iam_client, policy_arn):
+            response["Tags"] = tags
+        return response
+
     try:
         response = (
             await boto_crud_call(iam_client.get_policy, PolicyArn=policy_arn)
@@ -79,6 +98,40 @@ async def get_managed_policy(iam_client, policy_arn: str, **kwargs) -> dict:
     return response
 
 
+def get_referenced_managed_policy_arns(resource_dict: dict) -> set[str]:
+    """The managed policies a role, user or group attaches or uses as its permissions boundary"""
+    policy_arns = {
+        policy["PolicyArn"] for policy in resource_dict.get("ManagedPolicies", [])
+    }
+    if permissions_boundary := resource_dict.get("PermissionsBoundary"):
+        policy_arns.add(permissions_boundary["PermissionsBoundaryArn"])
+    return policy_arns
+
+
+async def wait_for_managed_policy(
+    iam_client, policy_arn: str, timeout: float = 60
+) -> bool:
+    """Wait for a new managed policy to be returned by IAM.
+
+    IAM is eventually consistent so a policy can't always be attached right after it's created.
+    Polls with an exponential backoff and returns False if the policy is still missing after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.25
+    while True:
+        try:
+            await boto_crud_call(iam_client.get_policy, PolicyArn=policy_arn)
+            return True
+        except ClientError as err:
+            if err.response["Error"]["Code"] != "NoSuchEntity":
+                raise
+
+        if time.monotonic() + delay > deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5)
+
+
 def get_oldest_policy_version_id(policy_versions: list[dict]) -> str:
     policy_versions = sorted(policy_versions, key=lambda version: version["CreateDate"])
     if not policy_versions[0]["IsDefaultVersion"]:
@@ -26,6 +26,9 @@ from iambic.plugins.v0_1_0.aws.iam.policy.models import (
     ManagedPolicyRef,
     PolicyDocument,
 )
+from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
+    get_referenced_managed_policy_arns,
+)
 from iambic.plugins.v0_1_0.aws.iam.role.utils import (
     apply_role_inline_policies,
     apply_role_managed_policies,
@@ -208,6 +211,9 @@ class AwsIamRoleTemplate(AWSTemplate, AccessModel):
 
         return response
 
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        return get_referenced_managed_policy_arns(self.apply_resource_dict(aws_account))
+
     def _is_iambic_import_only(self, aws_account: AWSAccount):
         return (
             "aws-service-role" in self.properties.path
@@ -243,7 +249,9 @@ class AwsIamRoleTemplate(AWSTemplate, AccessModel):
         )
         iambic_import_only = self._is_iambic_import_only(aws_account)
 
-        current_role = await get_role(role_name, client)
+        current_role = await get_role(
+            role_name, client, authorization_details=aws_account.iam_plan_snapshot
+        )
         if current_role:
             account_change_details.current_value = {**current_role}  # Create a new dict
 
@@ -5,20 +5,17 @@ import os
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
-import aiofiles
-
 from iambic.core import noq_json as json
+from iambic.core.intermediate_store import IntermediateStore
 from iambic.core.logger import log
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import (
     base_group_str_attribute,
     create_or_update_template,
-    delete_orphaned_templates,
-    get_existing_template_map,
     group_dict_attribute,
     group_int_or_str_attribute,
 )
-from iambic.core.utils import NoqSemaphore, normalize_dict_keys, resource_file_upsert
+from iambic.core.utils import NoqSemaphore, normalize_dict_keys
 from iambic.plugins.v0_1_0.aws.event_bridge.models import RoleMessageDetails
 from iambic.plugins.v0_1_0.aws.iam.policy.models import AssumeRolePolicyDocument
 from iambic.plugins.v0_1_0.aws.iam.role.models import (
@@ -33,7 +30,9 @@ from iambic.plugins.v0_1_0.aws.iam.role.utils import (
     list_role_tags,
     list_roles,
 )
+from iambic.plugins.v0_1_0.aws.iam.utils import get_inline_policy_list
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
+from iambic.plugins.v0_1_0.aws.rate_limiter import MAX_CONCURRENT_CALLS
 from iambic.plugins.v0_1_0.aws.utils import (
     calculate_import_preference,
     get_aws_account_map,
@@ -83,12 +82,19 @@ async def generate_account_role_resource_files(
     aws_account: AWSAccount,
 ) -> dict:
     account_resource_dir = get_response_dir(exe_message, aws_account)
-    role_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    role_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
 
     response = dict(account_id=aws_account.account_id, roles=[])
     iam_client = await aws_account.get_boto3_client("iam")
-    account_roles = await list_roles(iam_client)
+    authorization_details = await aws_account.get_authorization_details(
+        exe_message.execution_id
+    )
+    account_roles = await list_roles(
+        iam_client, authorization_details.role_details_list
+    )
 
     log.info(
         "Retrieved AWS IAM Roles.",
@@ -98,16 +104,23 @@ async def generate_account_role_resource_files(
     )
 
     for account_role in account_roles:
-        role_path = os.path.join(
-            account_resource_dir, f'{account_role["RoleName"]}.json'
-        )
+        role_name = account_role["RoleName"]
+        role_path = os.path.join(account_resource_dir, f"{role_name}.json")
         response["roles"].append(
             {
                 "path": role_path,
-                "name": account_role["RoleName"],
+                "name": role_name,
                 "account_id": aws_account.account_id,
             }
         )
+        # The snapshot has the role details so the role is stored once with all of them
+        account_role["InlinePolicies"] = get_inline_policy_list(
+            authorization_details.get_role_inline_policies(role_name)
+        )
+        account_role[
+            "ManagedPolicies"
+        ] = authorization_details.get_role_managed_policies(role_name)
+        account_role["Tags"] = authorization_details.list_role_tags(role_name)
         messages.append(
             dict(file_path=role_path, content_as_dict=account_role, replace_file=True)
         )
@@ -131,7 +144,9 @@ async def generate_role_resource_file_for_all_accounts(
         aws_account.account_id: get_response_dir(exe_message, aws_account)
         for aws_account in aws_accounts
     }
-    role_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    role_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
     response = []
 
@@ -173,60 +188,64 @@ async def generate_role_resource_file_for_all_accounts(
 
 
 async def set_role_resource_tags(
-    role_name: str, role_resource_path: str, aws_account: AWSAccount
+    role_name: str,
+    role_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     role_tags = await list_role_tags(role_name, iam_client)
-    await resource_file_upsert(role_resource_path, {"Tags": role_tags}, False)
+    await intermediate_store.upsert(role_resource_path, {"Tags": role_tags}, False)
 
 
 async def set_role_resource_inline_policies(
-    role_name: str, role_resource_path: str, aws_account: AWSAccount
+    role_name: str,
+    role_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
-    role_inline_policies = await get_role_inline_policies(role_name, iam_client)
-    for k in role_inline_policies.keys():
-        role_inline_policies[k]["policy_name"] = k
-
-    role_inline_policies = list(role_inline_policies.values())
-    await resource_file_upsert(
+    role_inline_policies = get_inline_policy_list(
+        await get_role_inline_policies(role_name, iam_client)
+    )
+    await intermediate_store.upsert(
         role_resource_path, {"InlinePolicies": role_inline_policies}, False
     )
 
 
 async def set_role_resource_managed_policies(
-    role_name: str, role_resource_path: str, aws_account: AWSAccount
+    role_name: str,
+    role_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     role_managed_policies = await get_role_managed_policies(role_name, iam_client)
-    await resource_file_upsert(
+    await intermediate_store.upsert(
         role_resource_path, {"ManagedPolicies": role_managed_policies}, False
     )
 
 
-async def _account_id_to_role_map(role_refs):
+async def _account_id_to_role_map(role_refs, intermediate_store: IntermediateStore):
     account_id_to_role_map = {}
     for role_ref in role_refs:
-        async with aiofiles.open(role_ref["path"], mode="r") as f:
-            content_dict = json.loads(await f.read())
+        content_dict = await intermediate_store.read(role_ref["path"])
 
-            # handle strange unstable response with deleted principals
-            assume_role_policy_document = content_dict.get(
-                "AssumeRolePolicyDocument", None
+        # handle strange unstable response with deleted principals
+        assume_role_policy_document = content_dict.get("AssumeRolePolicyDocument", None)
+        if assume_role_policy_document:
+            policy_document = AssumeRolePolicyDocument.parse_obj(
+                normalize_dict_keys(assume_role_policy_document)
             )
-            if assume_role_policy_document:
-                policy_document = AssumeRolePolicyDocument.parse_obj(
-                    normalize_dict_keys(assume_role_policy_document)
-                )
-                content_dict["AssumeRolePolicyDocument"] = json.loads(
-                    policy_document.json(
-                        exclude_unset=True, exclude_defaults=True, exclude_none=True
-                    )
+            content_dict["AssumeRolePolicyDocument"] = json.loads(
+                policy_document.json(
+                    exclude_unset=True, exclude_defaults=True, exclude_none=True
                 )
-
-            account_id_to_role_map[role_ref["account_id"]] = normalize_dict_keys(
-                content_dict
             )
+
+        account_id_to_role_map[role_ref["account_id"]] = normalize_dict_keys(
+            content_dict
+        )
     return account_id_to_role_map
 
 
@@ -237,8 +256,11 @@ async def create_templated_role(  # noqa: C901
     role_dir: str,
     existing_template_map: dict,
     config: AWSConfig,
+    intermediate_store: IntermediateStore,
 ) -> AwsIamRoleTemplate:
-    account_id_to_role_map = await _account_id_to_role_map(role_refs)
+    account_id_to_role_map = await _account_id_to_role_map(
+        role_refs, intermediate_store
+    )
     num_of_accounts = len(role_refs)
 
     min_accounts_required_for_wildcard_included_accounts = (
@@ -430,16 +452,18 @@ async def collect_aws_roles(
             exe_message.provider_id: aws_account_map[exe_message.provider_id]
         }
 
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_ROLE_TEMPLATE_TYPE
     )
     set_role_resource_inline_policies_semaphore = NoqSemaphore(
-        set_role_resource_inline_policies, 20
+        set_role_resource_inline_policies, MAX_CONCURRENT_CALLS
     )
     set_role_resource_managed_policies_semaphore = NoqSemaphore(
-        set_role_resource_managed_policies, 30
+        set_role_resource_managed_policies, MAX_CONCURRENT_CALLS
+    )
+    set_role_resource_tags_semaphore = NoqSemaphore(
+        set_role_resource_tags, MAX_CONCURRENT_CALLS
     )
-    set_role_resource_tags_semaphore = NoqSemaphore(set_role_resource_tags, 45)
 
     log.info(
         "Generating AWS role templates. Beginning to retrieve AWS IAM Roles.",
@@ -449,7 +473,7 @@ async def collect_aws_roles(
     if detect_messages:
         aws_accounts = list(aws_account_map.values())
         generate_role_resource_file_for_all_accounts_semaphore = NoqSemaphore(
-            generate_role_resource_file_for_all_accounts, 45
+            generate_role_resource_file_for_all_accounts, MAX_CONCURRENT_CALLS
         )
         tasks = [
             {
@@ -513,38 +537,43 @@ async def collect_aws_roles(
             ]
         )
 
-    messages = []
-    # Upsert roles
-    for account_role in account_roles:
-        for role in account_role["roles"]:
-            messages.append(
-                {
-                    "role_name": role["name"],
-                    "role_resource_path": role["path"],
-                    "aws_account": aws_account_map[account_role["account_id"]],
-                }
-            )
+    if detect_messages:
+        # Roles listed from the account snapshot are stored with their details
+        messages = []
+        # Upsert roles
+        for account_role in account_roles:
+            for role in account_role["roles"]:
+                messages.append(
+                    {
+                        "role_name": role["name"],
+                        "role_resource_path": role["path"],
+                        "aws_account": aws_account_map[account_role["account_id"]],
+                        "intermediate_store": exe_message.intermediate_store,
+                    }
+                )
+
+        log.info(
+            "Setting inline policies in role templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_role_resource_inline_policies_semaphore.process(messages)
+        log.info(
+            "Setting managed policies in role templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_role_resource_managed_policies_semaphore.process(messages)
+        log.info(
+            "Setting tags in role templates", accounts=list(aws_account_map.keys())
+        )
+        await set_role_resource_tags_semaphore.process(messages)
 
-    log.info(
-        "Setting inline policies in role templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_role_resource_inline_policies_semaphore.process(messages)
-    log.info(
-        "Setting managed policies in role templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_role_resource_managed_policies_semaphore.process(messages)
-    log.info("Setting tags in role templates", accounts=list(aws_account_map.keys()))
-    await set_role_resource_tags_semaphore.process(messages)
     log.info("Finished retrieving role details", accounts=list(aws_account_map.keys()))
 
-    account_role_output = json.dumps(account_roles)
-    with open(
+    await exe_message.intermediate_store.upsert(
         exe_message.get_file_path(*RESOURCE_DIR, file_name_and_extension="output.json"),
-        "w",
-    ) as f:
-        f.write(account_role_output)
+        account_roles,
+        replace_file=True,
+    )
 
 
 async def generate_aws_role_templates(
@@ -555,7 +584,7 @@ async def generate_aws_role_templates(
 ):
     role_dir = get_template_dir(base_output_dir)
     aws_account_map = await get_aws_account_map(config)
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_ROLE_TEMPLATE_TYPE
     )
     account_roles = await exe_message.get_sub_exe_files(
@@ -585,7 +614,6 @@ async def generate_aws_role_templates(
     grouped_role_map = await base_group_str_attribute(aws_account_map, account_roles)
 
     log.info("Writing templated roles")
-    all_resource_ids = set()
     for role_name, role_refs in grouped_role_map.items():
         resource_template = await create_templated_role(
             aws_account_map,
@@ -594,16 +622,19 @@ async def generate_aws_role_templates(
             role_dir,
             existing_template_map,
             config,
+            exe_message.intermediate_store,
         )
         if not resource_template:
             # Template not updated. Most likely because it's an `enforced` template.
             continue
-        all_resource_ids.add(resource_template.resource_id)
+        exe_message.template_repository.touch(
+            base_output_dir, AWS_IAM_ROLE_TEMPLATE_TYPE, resource_template.resource_id
+        )
 
     if not detect_messages:
-        # NEVER call this if messages are passed in because all_resource_ids will only contain those resources
-        delete_orphaned_templates(
-            list(existing_template_map.values()), all_resource_ids
+        # NEVER call this if messages are passed in because only those resources were touched
+        exe_message.template_repository.delete_orphaned_templates(
+            base_output_dir, AWS_IAM_ROLE_TEMPLATE_TYPE
         )
 
     log.info("Finished templated role generation")
@@ -11,6 +11,7 @@ from iambic.core.context import ctx
 from iambic.core.logger import log
 from iambic.core.models import ProposedChange, ProposedChangeType
 from iambic.core.utils import aio_wrapper, plugin_apply_wrapper
+from iambic.plugins.v0_1_0.aws.iam.utils import AccountAuthorizationDetails
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
 from iambic.plugins.v0_1_0.aws.utils import boto_crud_call, paginated_search
 
@@ -29,11 +30,14 @@ async def get_role_instance_profiles(role_name: str, iam_client):
     )
 
 
-async def list_roles(iam_client):
+async def list_roles(iam_client, role_details_list: list[dict] = None):
     # role_details_list is missing MaxSessionDuration, see https://docs.aws.amazon.com/IAM/latest/APIReference/API_RoleDetail.html
-    role_details_list = await paginated_search(
-        iam_client.get_account_authorization_details, "RoleDetailList", Filter=["Role"]
-    )
+    if role_details_list is None:
+        role_details_list = await paginated_search(
+            iam_client.get_account_authorization_details,
+            "RoleDetailList",
+            Filter=["Role"],
+        )
     role_name_to_role_details = {
         role_details["RoleName"]: role_details for role_details in role_details_list
     }
@@ -102,7 +106,24 @@ async def get_role_managed_policies(role_name: str, iam_client) -> list[dict[str
     return policies
 
 
-async def get_role(role_name: str, iam_client, include_policies: bool = True) -> dict:
+async def get_role(
+    role_name: str,
+    iam_client,
+    include_policies: bool = True,
+    authorization_details: AccountAuthorizationDetails = None,
+) -> dict:
+    """Returns the role or an empty dict if it doesn't exist.
+
+    Read from authorization_details if the role is in it, otherwise from AWS.
+    """
+    if authorization_details and (
+        current_role := authorization_details.get_role(role_name)
+    ):
+        if not include_policies:
+            current_role.pop("ManagedPolicies")
+            current_role.pop("InlinePolicies")
+        return current_role
+
     try:
         current_role = (await boto_crud_call(iam_client.get_role, RoleName=role_name))[
             "Role"
@@ -17,6 +17,9 @@ from iambic.core.models import (
 )
 from iambic.plugins.v0_1_0.aws.iam.models import Path, PermissionBoundary
 from iambic.plugins.v0_1_0.aws.iam.policy.models import ManagedPolicyRef, PolicyDocument
+from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
+    get_referenced_managed_policy_arns,
+)
 from iambic.plugins.v0_1_0.aws.iam.user.utils import (
     apply_user_groups,
     apply_user_inline_policies,
@@ -34,7 +37,7 @@ AWS_IAM_USER_TEMPLATE_TYPE = "NOQ::AWS::IAM::User"
 
 class Group(ExpiryModel, AccessModel):
     group_name: str
-    
+
     # All excluded fields are populated by the API and not required in the template
     # We are not tracking those, but we do allow them to be imported in order to
     # pass validation.
@@ -149,6 +152,9 @@ class AwsIamUserTemplate(AWSTemplate, AccessModel):
 
         return response
 
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        return get_referenced_managed_policy_arns(self.apply_resource_dict(aws_account))
+
     def _is_iambic_import_only(self, aws_account: AWSAccount):
         return (
             aws_account.iambic_managed == IambicManaged.IMPORT_ONLY
@@ -179,7 +185,9 @@ class AwsIamUserTemplate(AWSTemplate, AccessModel):
             account=str(aws_account),
         )
         iambic_import_only = self._is_iambic_import_only(aws_account)
-        current_user = await get_user(user_name, client)
+        current_user = await get_user(
+            user_name, client, authorization_details=aws_account.iam_plan_snapshot
+        )
         if current_user:
             account_change_details.current_value = {**current_user}  # Create a new dict
 
@@ -5,20 +5,16 @@ import os
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
-import aiofiles
-
-from iambic.core import noq_json as json
+from iambic.core.intermediate_store import IntermediateStore
 from iambic.core.logger import log
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import (
     base_group_str_attribute,
     create_or_update_template,
-    delete_orphaned_templates,
-    get_existing_template_map,
     group_dict_attribute,
     group_int_or_str_attribute,
 )
-from iambic.core.utils import NoqSemaphore, normalize_dict_keys, resource_file_upsert
+from iambic.core.utils import NoqSemaphore, normalize_dict_keys
 from iambic.plugins.v0_1_0.aws.event_bridge.models import UserMessageDetails
 from iambic.plugins.v0_1_0.aws.iam.user.models import (
     AWS_IAM_USER_TEMPLATE_TYPE,
@@ -31,9 +27,10 @@ from iambic.plugins.v0_1_0.aws.iam.user.utils import (
     get_user_inline_policies,
     get_user_managed_policies,
     list_user_tags,
-    list_users,
 )
+from iambic.plugins.v0_1_0.aws.iam.utils import get_inline_policy_list
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
+from iambic.plugins.v0_1_0.aws.rate_limiter import MAX_CONCURRENT_CALLS
 from iambic.plugins.v0_1_0.aws.utils import (
     calculate_import_preference,
     get_aws_account_map,
@@ -83,12 +80,16 @@ async def generate_account_user_resource_files(
     aws_account: AWSAccount,
 ) -> dict:
     account_resource_dir = get_response_dir(exe_message, aws_account)
-    user_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    user_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
 
     response = dict(account_id=aws_account.account_id, users=[])
-    iam_client = await aws_account.get_boto3_client("iam")
-    account_users = await list_users(iam_client)
+    authorization_details = await aws_account.get_authorization_details(
+        exe_message.execution_id
+    )
+    account_users = authorization_details.list_users()
 
     log.info(
         "Retrieved AWS IAM Users.",
@@ -98,16 +99,24 @@ async def generate_account_user_resource_files(
     )
 
     for account_user in account_users:
-        user_path = os.path.join(
-            account_resource_dir, f'{account_user["UserName"]}.json'
-        )
+        user_name = account_user["UserName"]
+        user_path = os.path.join(account_resource_dir, f"{user_name}.json")
         response["users"].append(
             {
                 "path": user_path,
-                "name": account_user["UserName"],
+                "name": user_name,
                 "account_id": aws_account.account_id,
             }
         )
+        # The snapshot has the user details so the user is stored once with all of them
+        account_user["InlinePolicies"] = get_inline_policy_list(
+            authorization_details.get_user_inline_policies(user_name)
+        )
+        account_user[
+            "ManagedPolicies"
+        ] = authorization_details.get_user_managed_policies(user_name)
+        account_user["Groups"] = authorization_details.get_user_groups(user_name)
+        account_user["Tags"] = authorization_details.list_user_tags(user_name)
         messages.append(
             dict(file_path=user_path, content_as_dict=account_user, replace_file=True)
         )
@@ -129,7 +138,9 @@ async def generate_user_resource_file_for_all_accounts(
         aws_account.account_id: get_response_dir(exe_message, aws_account)
         for aws_account in aws_accounts
     }
-    user_resource_file_upsert_semaphore = NoqSemaphore(resource_file_upsert, 10)
+    user_resource_file_upsert_semaphore = NoqSemaphore(
+        exe_message.intermediate_store.upsert, 10
+    )
     messages = []
     response = []
 
@@ -171,53 +182,62 @@ async def generate_user_resource_file_for_all_accounts(
 
 
 async def set_user_resource_tags(
-    user_name: str, user_resource_path: str, aws_account: AWSAccount
+    user_name: str,
+    user_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     user_tags = await list_user_tags(user_name, iam_client)
-    await resource_file_upsert(user_resource_path, {"Tags": user_tags}, False)
+    await intermediate_store.upsert(user_resource_path, {"Tags": user_tags}, False)
 
 
 async def set_user_resource_inline_policies(
-    user_name: str, user_resource_path: str, aws_account: AWSAccount
+    user_name: str,
+    user_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
-    user_inline_policies = await get_user_inline_policies(user_name, iam_client)
-    for k in user_inline_policies.keys():
-        user_inline_policies[k]["policy_name"] = k
-
-    user_inline_policies = list(user_inline_policies.values())
-    await resource_file_upsert(
+    user_inline_policies = get_inline_policy_list(
+        await get_user_inline_policies(user_name, iam_client)
+    )
+    await intermediate_store.upsert(
         user_resource_path, {"InlinePolicies": user_inline_policies}, False
     )
 
 
 async def set_user_resource_managed_policies(
-    user_name: str, user_resource_path: str, aws_account: AWSAccount
+    user_name: str,
+    user_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     user_managed_policies = await get_user_managed_policies(user_name, iam_client)
-    await resource_file_upsert(
+    await intermediate_store.upsert(
         user_resource_path, {"ManagedPolicies": user_managed_policies}, False
     )
 
 
 async def set_user_resource_groups(
-    user_name: str, user_resource_path: str, aws_account: AWSAccount
+    user_name: str,
+    user_resource_path: str,
+    aws_account: AWSAccount,
+    intermediate_store: IntermediateStore,
 ):
     iam_client = await aws_account.get_boto3_client("iam")
     user_groups = await get_user_groups(user_name, iam_client)
-    await resource_file_upsert(user_resource_path, {"Groups": user_groups}, False)
+    await intermediate_store.upsert(user_resource_path, {"Groups": user_groups}, False)
 
 
-async def _account_id_to_user_map(user_refs):
+async def _account_id_to_user_map(user_refs, intermediate_store: IntermediateStore):
     account_id_to_user_map = {}
     for user_ref in user_refs:
-        async with aiofiles.open(user_ref["path"], mode="r") as f:
-            content_dict = json.loads(await f.read())
-            account_id_to_user_map[user_ref["account_id"]] = normalize_dict_keys(
-                content_dict
-            )
+        content_dict = await intermediate_store.read(user_ref["path"])
+        account_id_to_user_map[user_ref["account_id"]] = normalize_dict_keys(
+            content_dict
+        )
     return account_id_to_user_map
 
 
@@ -228,8 +248,11 @@ async def create_templated_user(  # noqa: C901
     user_dir: str,
     existing_template_map: dict,
     config: AWSConfig,
+    intermediate_store: IntermediateStore,
 ) -> AwsIamUserTemplate:
-    account_id_to_user_map = await _account_id_to_user_map(user_refs)
+    account_id_to_user_map = await _account_id_to_user_map(
+        user_refs, intermediate_store
+    )
     num_of_accounts = len(user_refs)
 
     min_accounts_required_for_wildcard_included_accounts = (
@@ -408,18 +431,22 @@ async def collect_aws_users(
             exe_message.provider_id: aws_account_map[exe_message.provider_id]
         }
 
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_USER_TEMPLATE_TYPE
     )
     set_user_resource_inline_policies_semaphore = NoqSemaphore(
-        set_user_resource_inline_policies, 20
+        set_user_resource_inline_policies, MAX_CONCURRENT_CALLS
     )
     set_user_resource_managed_policies_semaphore = NoqSemaphore(
-        set_user_resource_managed_policies, 30
+        set_user_resource_managed_policies, MAX_CONCURRENT_CALLS
     )
 
-    set_user_resource_groups_semaphore = NoqSemaphore(set_user_resource_groups, 30)
-    set_user_resource_tags_semaphore = NoqSemaphore(set_user_resource_tags, 50)
+    set_user_resource_groups_semaphore = NoqSemaphore(
+        set_user_resource_groups, MAX_CONCURRENT_CALLS
+    )
+    set_user_resource_tags_semaphore = NoqSemaphore(
+        set_user_resource_tags, MAX_CONCURRENT_CALLS
+    )
 
     log.info(
         "Generating AWS user templates. Beginning to retrieve AWS IAM Users.",
@@ -429,7 +456,7 @@ async def collect_aws_users(
     if detect_messages:
         aws_accounts = list(aws_account_map.values())
         generate_user_resource_file_for_all_accounts_semaphore = NoqSemaphore(
-            generate_user_resource_file_for_all_accounts, 50
+            generate_user_resource_file_for_all_accounts, MAX_CONCURRENT_CALLS
         )
         tasks = [
             {
@@ -492,40 +519,47 @@ async def collect_aws_users(
             ]
         )
 
-    messages = []
-    # Upsert users
-    for account_user in account_users:
-        for user in account_user["users"]:
-            messages.append(
-                {
-                    "user_name": user["name"],
-                    "user_resource_path": user["path"],
-                    "aws_account": aws_account_map[account_user["account_id"]],
-                }
-            )
+    if detect_messages:
+        # Users listed from the account snapshot are stored with their details
+        messages = []
+        # Upsert users
+        for account_user in account_users:
+            for user in account_user["users"]:
+                messages.append(
+                    {
+                        "user_name": user["name"],
+                        "user_resource_path": user["path"],
+                        "aws_account": aws_account_map[account_user["account_id"]],
+                        "intermediate_store": exe_message.intermediate_store,
+                    }
+                )
+
+        log.info(
+            "Setting inline policies in user templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_user_resource_inline_policies_semaphore.process(messages)
+        log.info(
+            "Setting managed policies in user templates",
+            accounts=list(aws_account_map.keys()),
+        )
+        await set_user_resource_managed_policies_semaphore.process(messages)
+        log.info(
+            "Setting groups in user templates", accounts=list(aws_account_map.keys())
+        )
+        await set_user_resource_groups_semaphore.process(messages)
+        log.info(
+            "Setting tags in user templates", accounts=list(aws_account_map.keys())
+        )
+        await set_user_resource_tags_semaphore.process(messages)
 
-    log.info(
-        "Setting inline policies in user templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_user_resource_inline_policies_semaphore.process(messages)
-    log.info(
-        "Setting managed policies in user templates",
-        accounts=list(aws_account_map.keys()),
-    )
-    await set_user_resource_managed_policies_semaphore.process(messages)
-    log.info("Setting groups in user templates", accounts=list(aws_account_map.keys()))
-    await set_user_resource_groups_semaphore.process(messages)
-    log.info("Setting tags in user templates", accounts=list(aws_account_map.keys()))
-    await set_user_resource_tags_semaphore.process(messages)
     log.info("Finished retrieving user details", accounts=list(aws_account_map.keys()))
 
-    account_user_output = json.dumps(account_users)
-    with open(
+    await exe_message.intermediate_store.upsert(
         exe_message.get_file_path(*RESOURCE_DIR, file_name_and_extension="output.json"),
-        "w",
-    ) as f:
-        f.write(account_user_output)
+        account_users,
+        replace_file=True,
+    )
 
 
 async def generate_aws_user_templates(
@@ -543,7 +577,7 @@ async def generate_aws_user_templates(
         if not detect_messages:
             return
 
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IAM_USER_TEMPLATE_TYPE
     )
     user_dir = get_template_dir(base_output_dir)
@@ -567,7 +601,6 @@ async def generate_aws_user_templates(
     grouped_user_map = await base_group_str_attribute(aws_account_map, account_users)
 
     log.info("Writing templated users")
-    all_resource_ids = set()
     for user_name, user_refs in grouped_user_map.items():
         resource_template = await create_templated_user(
             aws_account_map,
@@ -576,16 +609,19 @@ async def generate_aws_user_templates(
             user_dir,
             existing_template_map,
             config,
+            exe_message.intermediate_store,
         )
         if not resource_template:
             # Template not updated. Most likely because it's an `enforced` template.
             continue
-        all_resource_ids.add(resource_template.resource_id)
+        exe_message.template_repository.touch(
+            base_output_dir, AWS_IAM_USER_TEMPLATE_TYPE, resource_template.resource_id
+        )
 
     if not detect_messages:
-        # NEVER call this if messages are passed in because all_resource_ids will only contain those resources
-        delete_orphaned_templates(
-            list(existing_template_map.values()), all_resource_ids
+        # NEVER call this if messages are passed in because only those resources were touched
+        exe_message.template_repository.delete_orphaned_templates(
+            base_output_dir, AWS_IAM_USER_TEMPLATE_TYPE
         )
 
     log.info("Finished templated user generation")
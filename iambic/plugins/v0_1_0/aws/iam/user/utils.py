@@ -11,6 +11,7 @@ from iambic.core.context import ctx
 from iambic.core.logger import log
 from iambic.core.models import ProposedChange, ProposedChangeType
 from iambic.core.utils import aio_wrapper, plugin_apply_wrapper
+from iambic.plugins.v0_1_0.aws.iam.utils import AccountAuthorizationDetails
 from iambic.plugins.v0_1_0.aws.models import AWSAccount
 from iambic.plugins.v0_1_0.aws.utils import boto_crud_call, paginated_search
 
@@ -88,7 +89,25 @@ async def get_user_managed_policies(user_name: str, iam_client) -> list[dict[str
     return policies
 
 
-async def get_user(user_name: str, iam_client, include_policies: bool = True) -> dict:
+async def get_user(
+    user_name: str,
+    iam_client,
+    include_policies: bool = True,
+    authorization_details: AccountAuthorizationDetails = None,
+) -> dict:
+    """Returns the user or an empty dict if it doesn't exist.
+
+    Read from authorization_details if the user is in it, otherwise from AWS.
+    """
+    if authorization_details and (
+        current_user := authorization_details.get_user(user_name)
+    ):
+        if not include_policies:
+            current_user.pop("ManagedPolicies")
+            current_user.pop("InlinePolicies")
+            current_user.pop("Groups")
+        return current_user
+
     try:
         current_user = (await boto_crud_call(iam_client.get_user, UserName=user_name))[
             "User"
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional, Union
+
+from iambic.plugins.v0_1_0.aws.utils import paginated_search
+
+AUTHORIZATION_DETAILS_FILTER = ["Role", "User", "Group", "LocalManagedPolicy"]
+
+
+def get_inline_policy_list(inline_policies: dict[str, dict]) -> list[dict]:
+    """The inline policy documents keyed by name as the list stored for the import generators"""
+    for policy_name, policy_document in inline_policies.items():
+        policy_document["policy_name"] = policy_name
+
+    return list(inline_policies.values())
+
+
+class AccountAuthorizationDetails:
+    def __init__(
+        self,
+        role_details_list: list[dict],
+        user_details_list: list[dict],
+        group_details_list: list[dict],
+        policy_details_list: list[dict],
+    ):
+        """A snapshot of the IAM resources of an account from get_account_authorization_details.
+
+        A single paginated call returns the inline policies, attached managed policies and tags
+            of every role, user and group along with the local managed policy documents.
+        The getters return the same structures as the per-resource calls in the role, user, group and
+            policy utils so the import collectors can use either interchangeably.
+        The snapshot is shared, so every getter returns a copy that the caller is free to mutate.
+        """
+        self.role_details_list = role_details_list
+        self.user_details_list = user_details_list
+        self.group_details_list = group_details_list
+        self.policy_details_list = policy_details_list
+        self.role_map = {role["RoleName"]: role for role in role_details_list}
+        self.user_map = {user["UserName"]: user for user in user_details_list}
+        self.group_map = {group["GroupName"]: group for group in group_details_list}
+        self._policy_map: Optional[dict[str, dict]] = None
+
+    @staticmethod
+    def _get_inline_policies(
+        inline_policies: list[dict], as_dict: bool
+    ) -> Union[list, dict]:
+        if as_dict:
+            return {
+                policy["PolicyName"]: dict(policy["PolicyDocument"])
+                for policy in inline_policies
+            }
+        else:
+            return [
+                {"PolicyName": policy["PolicyName"], **policy["PolicyDocument"]}
+                for policy in inline_policies
+            ]
+
+    @staticmethod
+    def _get_resource(resource_details: dict, detail_keys: list[str]) -> dict:
+        return {k: v for k, v in resource_details.items() if k not in detail_keys}
+
+    @staticmethod
+    def _get_group(group_details: dict) -> dict:
+        return {
+            k: v
+            for k, v in group_details.items()
+            if k not in ["GroupPolicyList", "AttachedManagedPolicies"]
+        }
+
+    def get_role_inline_policies(
+        self, role_name: str, as_dict: bool = True
+    ) -> Union[list, dict]:
+        return self._get_inline_policies(
+            self.role_map.get(role_name, {}).get("RolePolicyList", []), as_dict
+        )
+
+    def get_role_managed_policies(self, role_name: str) -> list[dict[str, str]]:
+        return [
+            dict(policy)
+            for policy in self.role_map.get(role_name, {}).get(
+                "AttachedManagedPolicies", []
+            )
+        ]
+
+    def list_role_tags(self, role_name: str) -> list[dict]:
+        return [dict(tag) for tag in self.role_map.get(role_name, {}).get("Tags", [])]
+
+    def get_role(self, role_name: str) -> Optional[dict]:
+        """The role in the structure returned by role.utils.get_role or None if it isn't in the snapshot.
+
+        The role details of get_account_authorization_details have no Description or MaxSessionDuration.
+        They are only set if the snapshot was created by get_account_plan_snapshot.
+        """
+        if not (role_details := self.role_map.get(role_name)):
+            return None
+
+        role = self._get_resource(
+            role_details,
+            ["RolePolicyList", "AttachedManagedPolicies", "InstanceProfileList"],
+        )
+        role["ManagedPolicies"] = self.get_role_managed_policies(role_name)
+        role["InlinePolicies"] = self.get_role_inline_policies(role_name, False)
+        return role
+
+    def list_users(self) -> list[dict]:
+        return [dict(user) for user in self.user_details_list]
+
+    def get_user_inline_policies(
+        self, user_name: str, as_dict: bool = True
+    ) -> Union[list, dict]:
+        return self._get_inline_policies(
+            self.user_map.get(user_name, {}).get("UserPolicyList", []), as_dict
+        )
+
+    def get_user_managed_policies(self, user_name: str) -> list[dict[str, str]]:
+        return [
+            dict(policy)
+            for policy in self.user_map.get(user_name, {}).get(
+                "AttachedManagedPolicies", []
+            )
+        ]
+
+    def get_user_groups(
+        self, user_name: str, as_dict: bool = True
+    ) -> Union[list, dict]:
+        group_names = self.user_map.get(user_name, {}).get("GroupList", [])
+        if as_dict:
+            return {
+                group_name: self._get_group(
+                    self.group_map.get(group_name, {"GroupName": group_name})
+                )
+                for group_name in group_names
+            }
+        else:
+            return [{"GroupName": group_name} for group_name in group_names]
+
+    def list_user_tags(self, user_name: str) -> list[dict]:
+        return [dict(tag) for tag in self.user_map.get(user_name, {}).get("Tags", [])]
+
+    def get_user(self, user_name: str) -> Optional[dict]:
+        """The user in the structure returned by user.utils.get_user or None if it isn't in the snapshot"""
+        if not (user_details := self.user_map.get(user_name)):
+            return None
+
+        user = self._get_resource(
+            user_details, ["UserPolicyList", "AttachedManagedPolicies", "GroupList"]
+        )
+        user["ManagedPolicies"] = self.get_user_managed_policies(user_name)
+        user["InlinePolicies"] = self.get_user_inline_policies(user_name, False)
+        user["Groups"] = self.get_user_groups(user_name, False)
+        return user
+
+    def list_groups(self) -> list[dict]:
+        return [self._get_group(group) for group in self.group_details_list]
+
+    def get_group_inline_policies(
+        self, group_name: str, as_dict: bool = True
+    ) -> Union[list, dict]:
+        return self._get_inline_policies(
+            self.group_map.get(group_name, {}).get("GroupPolicyList", []), as_dict
+        )
+
+    def get_group_managed_policies(self, group_name: str) -> list[dict[str, str]]:
+        return [
+            dict(policy)
+            for policy in self.group_map.get(group_name, {}).get(
+                "AttachedManagedPolicies", []
+            )
+        ]
+
+    def get_group(self, group_name: str) -> Optional[dict]:
+        """The group in the structure returned by group.utils.get_group or None if it isn't in the snapshot"""
+        if not (group_details := self.group_map.get(group_name)):
+            return None
+
+        group = self._get_group(group_details)
+        group["ManagedPolicies"] = self.get_group_managed_policies(group_name)
+        group["InlinePolicies"] = self.get_group_inline_policies(group_name, False)
+        return group
+
+    def list_managed_policies(self) -> list[dict]:
+        """The local managed policies in the structure returned by get_managed_policy.
+
+        The snapshot does not contain the managed policy tags.
+        """
+        managed_policies = []
+        for policy_details in self.policy_details_list:
+            managed_policy = {
+                k: v for k, v in policy_details.items() if k != "PolicyVersionList"
+            }
+            default_version_id = managed_policy.pop("DefaultVersionId", None)
+            managed_policy["PolicyDocument"] = next(
+                (
+                    policy_version.get("Document", {})
+                    for policy_version in policy_details.get("PolicyVersionList", [])
+                    if policy_version.get("IsDefaultVersion")
+                    or policy_version.get("VersionId") == default_version_id
+                ),
+                {},
+            )
+            managed_policies.append(managed_policy)
+
+        return managed_policies
+
+    def get_managed_policy(self, policy_arn: str) -> Optional[dict]:
+        """The local managed policy without its Tags or None if it isn't in the snapshot"""
+        if self._policy_map is None:
+            self._policy_map = {
+                managed_policy["Arn"]: managed_policy
+                for managed_policy in self.list_managed_policies()
+            }
+
+        if not (managed_policy := self._policy_map.get(policy_arn)):
+            return None
+        return dict(managed_policy)
+
+
+async def get_account_authorization_details(iam_client) -> AccountAuthorizationDetails:
+    response = await paginated_search(
+        iam_client.get_account_authorization_details,
+        response_keys=[
+            "RoleDetailList",
+            "UserDetailList",
+            "GroupDetailList",
+            "Policies",
+        ],
+        retain_key=True,
+        Filter=AUTHORIZATION_DETAILS_FILTER,
+    )
+    return AccountAuthorizationDetails(
+        response["RoleDetailList"],
+        response["UserDetailList"],
+        response["GroupDetailList"],
+        response["Policies"],
+    )
+
+
+async def get_account_plan_snapshot(iam_client) -> AccountAuthorizationDetails:
+    """The IAM state of the account that plan reads instead of describing every resource.
+
+    Adds the Description and MaxSessionDuration of list_roles to the role details.
+    """
+    authorization_details, role_list = await asyncio.gather(
+        get_account_authorization_details(iam_client),
+        paginated_search(iam_client.list_roles, "Roles"),
+    )
+    for role in role_list:
+        if role_details := authorization_details.role_map.get(role["RoleName"]):
+            for key in ["Description", "MaxSessionDuration"]:
+                if key in role:
+                    role_details[key] = role[key]
+
+    return authorization_details
@@ -9,6 +9,7 @@ from iambic.core.iambic_plugin import ProviderPlugin
 from iambic.plugins.v0_1_0 import PLUGIN_VERSION
 from iambic.plugins.v0_1_0.aws.handlers import (
     apply,
+    apply_complete,
     aws_account_update_and_discovery,
     decode_aws_secret,
     detect_changes,
@@ -40,6 +41,20 @@ class AWSConfig(BaseModel):
         ),
     )
     sqs_cloudtrail_changes_queues: Optional[list[str]] = []
+    detect_changes_max_messages: Optional[int] = Field(
+        None,
+        description=(
+            "The max number of messages read from the cloudtrail changes queues on each detect run. "
+            "The remaining messages are left for the next run."
+        ),
+    )
+    detect_changes_max_seconds: Optional[int] = Field(
+        None,
+        description=(
+            "The max number of seconds spent reading the cloudtrail changes queues on each detect run. "
+            "The remaining messages are left for the next run."
+        ),
+    )
 
     @validator("organizations", allow_reuse=True)
     def validate_organizations(cls, organizations):
@@ -104,6 +119,7 @@ IAMBIC_PLUGIN = ProviderPlugin(
     version=PLUGIN_VERSION,
     provider_config=AWSConfig,
     async_apply_callable=apply,
+    async_apply_complete_callable=apply_complete,
     async_import_callable=import_aws_resources,
     async_load_callable=load,
     async_decode_secret_callable=decode_aws_secret,
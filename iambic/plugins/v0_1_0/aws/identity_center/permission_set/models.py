@@ -15,7 +15,6 @@ from iambic.core.models import (
     BaseModel,
     ProposedChange,
     ProposedChangeType,
-    TemplateChangeDetails,
 )
 from iambic.core.utils import aio_wrapper, evaluate_on_provider, plugin_apply_wrapper
 from iambic.plugins.v0_1_0.aws.iam.policy.models import PolicyStatement
@@ -731,59 +730,22 @@ class AwsIdentityCenterPermissionSetTemplate(
         # If changes are detected they are to be executed then call provision_permission_set
         return account_change_details
 
-    async def apply(self, config: AWSConfig) -> TemplateChangeDetails:
-        tasks = []
-        template_changes = TemplateChangeDetails(
-            resource_id=self.resource_id,
-            resource_type=self.resource_type,
-            template_path=self.file_path,
-            exceptions_seen=[],
-        )
-        log_params = dict(
-            resource_type=self.resource_type, resource_id=self.resource_id
-        )
-
-        for account in config.accounts:
-            if not account.identity_center_details:
-                continue
-
-            if evaluate_on_provider(self, account):
-                if ctx.execute:
-                    log_str = "Applying changes to resource."
-                else:
-                    log_str = "Detecting changes for resource."
-                log.info(log_str, account=str(account), **log_params)
-                tasks.append(self._apply_to_account(account))
-
-        account_changes = await asyncio.gather(*tasks)
-        template_changes.proposed_changes = [
-            account_change
-            for account_change in account_changes
-            if any(account_change.proposed_changes)
-        ]
-        # aggregate exceptions
-        template_changes.exceptions_seen = [
-            account_change
-            for account_change in account_changes
-            if any(account_change.exceptions_seen)
+    def get_apply_accounts(self, config: AWSConfig) -> list[AWSAccount]:
+        return [
+            account
+            for account in config.accounts
+            if account.identity_center_details and evaluate_on_provider(self, account)
         ]
 
-        proposed_changes = [x for x in account_changes if x.proposed_changes]
-
-        if proposed_changes and ctx.execute:
-            log.info(
-                "Successfully applied all or some resource changes to all AWS accounts. Any unapplied resources will have an accompanying error message.",
-                **log_params,
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        # The policies must exist in every account the permission set is provisioned to
+        return {
+            policy_reference.resource_id
+            for policy_reference in (
+                self.properties.customer_managed_policy_references or []
             )
-        elif proposed_changes and not ctx.execute:
-            log.info(
-                "Successfully detected all or some required resource changes on all AWS accounts. Any unapplied resources will have an accompanying error message.",
-                **log_params,
-            )
-        else:
-            log.debug("No changes detected for resource on any account.", **log_params)
-
-        return template_changes
+            if not policy_reference.deleted
+        }
 
     @property
     def included_children(self):
@@ -6,20 +6,17 @@ import os
 from collections import defaultdict
 from typing import TYPE_CHECKING, Union
 
-import aiofiles
-
 from iambic.core import noq_json as json
+from iambic.core.intermediate_store import IntermediateStore
 from iambic.core.logger import log
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import (
     base_group_str_attribute,
     create_or_update_template,
-    delete_orphaned_templates,
-    get_existing_template_map,
     group_dict_attribute,
     group_int_or_str_attribute,
 )
-from iambic.core.utils import NoqSemaphore, normalize_dict_keys, resource_file_upsert
+from iambic.core.utils import NoqSemaphore, normalize_dict_keys
 from iambic.plugins.v0_1_0.aws.event_bridge.models import PermissionSetMessageDetails
 from iambic.plugins.v0_1_0.aws.identity_center.permission_set.models import (
     AWS_IDENTITY_CENTER_PERMISSION_SET_TEMPLATE_TYPE,
@@ -110,6 +107,7 @@ async def generate_permission_set_resource_file(
     user_map: dict,
     group_map: dict,
     account_resource_dir: str,
+    intermediate_store: IntermediateStore,
 ) -> dict:
     permission_set = await enrich_permission_set_details(
         identity_center_client, instance_arn, permission_set
@@ -125,7 +123,7 @@ async def generate_permission_set_resource_file(
     response = dict(
         account_id=account_id, permission_set=permission_set, file_path=file_path
     )
-    await resource_file_upsert(file_path, permission_set)
+    await intermediate_store.upsert(file_path, permission_set)
 
     return response
 
@@ -147,15 +145,15 @@ async def create_templated_permission_set(  # noqa: C901
     permission_set_refs: list[dict],
     permission_set_dir: str,
     existing_template_map: dict,
+    intermediate_store: IntermediateStore,
 ) -> Union[AwsIdentityCenterPermissionSetTemplate, None]:
     account_id_to_permissionn_set_map = {}
     num_of_accounts = len(permission_set_refs)
     for permission_set_ref in permission_set_refs:
-        async with aiofiles.open(permission_set_ref["file_path"], mode="r") as f:
-            content_dict = json.loads(await f.read())
-            account_id_to_permissionn_set_map[
-                permission_set_ref["account_id"]
-            ] = normalize_dict_keys(content_dict)
+        content_dict = await intermediate_store.read(permission_set_ref["file_path"])
+        account_id_to_permissionn_set_map[
+            permission_set_ref["account_id"]
+        ] = normalize_dict_keys(content_dict)
 
     # calculate preference based on existing template
     prefer_templatized = calculate_import_preference(
@@ -458,6 +456,7 @@ async def collect_aws_permission_sets(
                             user_map=aws_account.identity_center_details.user_map,
                             group_map=aws_account.identity_center_details.group_map,
                             account_resource_dir=resource_dir,
+                            intermediate_store=exe_message.intermediate_store,
                         )
                     )
         else:
@@ -473,6 +472,7 @@ async def collect_aws_permission_sets(
                         user_map=aws_account.identity_center_details.user_map,
                         group_map=aws_account.identity_center_details.group_map,
                         account_resource_dir=resource_dir,
+                        intermediate_store=exe_message.intermediate_store,
                     )
                 )
 
@@ -494,12 +494,11 @@ async def collect_aws_permission_sets(
         permission_set_count=len(messages),
     )
 
-    all_permission_sets_output = json.dumps(all_permission_sets)
-    with open(
+    await exe_message.intermediate_store.upsert(
         exe_message.get_file_path(*RESOURCE_DIR, file_name_and_extension="output.json"),
-        "w",
-    ) as f:
-        f.write(all_permission_sets_output)
+        all_permission_sets,
+        replace_file=True,
+    )
 
 
 async def generate_aws_permission_set_templates(
@@ -510,7 +509,7 @@ async def generate_aws_permission_set_templates(
 ):
     resource_dir = get_template_dir(base_output_dir)
     aws_account_map = await get_aws_account_map(config)
-    existing_template_map = await get_existing_template_map(
+    existing_template_map = await exe_message.template_repository.get_template_map(
         base_output_dir, AWS_IDENTITY_CENTER_PERMISSION_SET_TEMPLATE_TYPE
     )
 
@@ -541,7 +540,6 @@ async def generate_aws_permission_set_templates(
         "Writing templated AWS Identity Center Permission Set.",
         unique_identities=len(grouped_permission_set_map),
     )
-    all_resource_ids = set()
     for name, refs in grouped_permission_set_map.items():
         resource_template = await create_templated_permission_set(
             aws_account_map,
@@ -549,16 +547,21 @@ async def generate_aws_permission_set_templates(
             refs,
             resource_dir,
             existing_template_map,
+            exe_message.intermediate_store,
         )
         if not resource_template:
             # Template not updated. Most likely because it's an `enforced` template.
             continue
-        all_resource_ids.add(resource_template.resource_id)
+        exe_message.template_repository.touch(
+            base_output_dir,
+            AWS_IDENTITY_CENTER_PERMISSION_SET_TEMPLATE_TYPE,
+            resource_template.resource_id,
+        )
 
     if not detect_messages:
-        # NEVER call this if messages are passed in because all_resource_ids will only contain those resources
-        delete_orphaned_templates(
-            list(existing_template_map.values()), all_resource_ids
+        # NEVER call this if messages are passed in because only those resources were touched
+        exe_message.template_repository.delete_orphaned_templates(
+            base_output_dir, AWS_IDENTITY_CENTER_PERMISSION_SET_TEMPLATE_TYPE
         )
 
     log.info("Finished templated AWS Identity Center Permission Set generation")
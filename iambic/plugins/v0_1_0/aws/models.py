@@ -9,7 +9,7 @@ import boto3
 import botocore
 from aws_error_utils.aws_error_utils import errors
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import Extra, Field, constr, validator
+from pydantic import Extra, Field, PrivateAttr, constr, validator
 from ruamel.yaml import YAML, yaml_object
 
 from iambic.core.context import ctx
@@ -31,11 +31,12 @@ from iambic.core.utils import (
     get_provider_value,
     sort_dict,
 )
+from iambic.plugins.v0_1_0.aws.rate_limiter import register_client
 from iambic.plugins.v0_1_0.aws.utils import (
     RegionName,
     boto_crud_call,
     create_assume_role_session,
-    get_current_role_arn,
+    get_session_role_arn,
     legacy_paginated_search,
     set_org_account_variables,
 )
@@ -43,6 +44,7 @@ from iambic.plugins.v0_1_0.aws.utils import (
 yaml = YAML()
 
 if TYPE_CHECKING:
+    from iambic.plugins.v0_1_0.aws.iam.utils import AccountAuthorizationDetails
     from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
 
 ARN_RE = r"(^arn:([^:]*):([^:]*):([^:]*):(|\*|[\d]{12}|cloudfront|aws|{{account_id}}):(.+)$)|^\*$"
@@ -200,8 +202,9 @@ class BaseAWSAccountAndOrgModel(PydanticBaseModel):
             except Exception as err:
                 log.warning(err)
 
-        sts_client = session.client("sts")
-        if self.hub_role_arn and self.hub_role_arn != get_current_role_arn(sts_client):
+        if self.hub_role_arn and self.hub_role_arn != await get_session_role_arn(
+            session
+        ):
             boto3_session = await create_assume_role_session(
                 session,
                 self.hub_role_arn,
@@ -232,6 +235,9 @@ class BaseAWSAccountAndOrgModel(PydanticBaseModel):
         client = (await self.get_boto3_session(region_name)).client(
             service, config=botocore.client.Config(max_pool_connections=50)
         )
+        register_client(
+            client, getattr(self, "account_id", getattr(self, "org_account_id", None))
+        )
         self.boto3_session_map.setdefault("client", {}).setdefault(service, {})[
             region_name
         ] = client
@@ -296,6 +302,11 @@ class AWSAccount(ProviderChild, BaseAWSAccountAndOrgModel):
         fields = {"hub_session_info": {"exclude": True}}
         extra = Extra.forbid
 
+    # (execution_id, task) of the authorization details snapshot of the current run
+    _authorization_details: Optional[tuple[str, asyncio.Future]] = PrivateAttr(None)
+    # (execution_id, task) of the IAM state the templates of a plan read instead of calling AWS
+    _iam_plan_snapshot: Optional[tuple[str, asyncio.Future]] = PrivateAttr(None)
+
     async def get_boto3_session(self, region_name: str = None):
         region_name = region_name or self.region_name
 
@@ -331,8 +342,8 @@ class AWSAccount(ProviderChild, BaseAWSAccountAndOrgModel):
                 log.warning(err)
 
         self.hub_session_info = dict(boto3_session=session)
-        if self.hub_role_arn and self.hub_role_arn != get_current_role_arn(
-            session.client("sts")
+        if self.hub_role_arn and self.hub_role_arn != await get_session_role_arn(
+            session
         ):
             session = await create_assume_role_session(
                 session,
@@ -347,6 +358,111 @@ class AWSAccount(ProviderChild, BaseAWSAccountAndOrgModel):
 
         return session
 
+    async def get_authorization_details(
+        self, execution_id: str
+    ) -> AccountAuthorizationDetails:
+        """Returns the IAM authorization details snapshot of the account.
+
+        The snapshot is fetched once per execution and shared by the IAM import collectors,
+            including concurrent ones.
+        A failed fetch is not kept so the next collector retries it.
+        """
+        from iambic.plugins.v0_1_0.aws.iam.utils import (
+            get_account_authorization_details,
+        )
+
+        async def _get_authorization_details():
+            return await get_account_authorization_details(
+                await self.get_boto3_client("iam")
+            )
+
+        if (
+            not self._authorization_details
+            or self._authorization_details[0] != execution_id
+        ):
+            self._authorization_details = (
+                execution_id,
+                asyncio.ensure_future(_get_authorization_details()),
+            )
+
+        authorization_details_task = self._authorization_details[1]
+        try:
+            # Shielded so a cancelled collector doesn't cancel the fetch for the others
+            return await asyncio.shield(authorization_details_task)
+        except Exception:
+            if (
+                self._authorization_details
+                and self._authorization_details[1] is authorization_details_task
+            ):
+                self._authorization_details = None
+            raise
+
+    def release_authorization_details(self, execution_id: str):
+        """Release the snapshot once the IAM import collectors of the execution have finished"""
+        if (
+            self._authorization_details
+            and self._authorization_details[0] == execution_id
+        ):
+            self._authorization_details[1].cancel()
+            self._authorization_details = None
+
+    @property
+    def iam_plan_snapshot(self) -> Optional[AccountAuthorizationDetails]:
+        """The IAM state captured for the current plan.
+
+        Always None when changes are applied, those must read the live state.
+        Also None until the capture has finished.
+        """
+        if ctx.execute or not self._iam_plan_snapshot:
+            return None
+
+        iam_plan_snapshot_task = self._iam_plan_snapshot[1]
+        if (
+            not iam_plan_snapshot_task.done()
+            or iam_plan_snapshot_task.cancelled()
+            or iam_plan_snapshot_task.exception()
+        ):
+            return None
+        return iam_plan_snapshot_task.result()
+
+    async def capture_iam_plan_snapshot(
+        self, execution_id: str
+    ) -> AccountAuthorizationDetails:
+        """Capture the IAM state of the account in bulk for the templates of a plan to diff against.
+
+        The snapshot is captured once per execution and shared by every batch of templates,
+            including concurrent ones.
+        A failed capture is not kept so the next batch retries it.
+        """
+        from iambic.plugins.v0_1_0.aws.iam.utils import get_account_plan_snapshot
+
+        async def _capture_iam_plan_snapshot():
+            return await get_account_plan_snapshot(await self.get_boto3_client("iam"))
+
+        if not self._iam_plan_snapshot or self._iam_plan_snapshot[0] != execution_id:
+            self._iam_plan_snapshot = (
+                execution_id,
+                asyncio.ensure_future(_capture_iam_plan_snapshot()),
+            )
+
+        iam_plan_snapshot_task = self._iam_plan_snapshot[1]
+        try:
+            # Shielded so a cancelled batch doesn't cancel the capture for the others
+            return await asyncio.shield(iam_plan_snapshot_task)
+        except Exception:
+            if (
+                self._iam_plan_snapshot
+                and self._iam_plan_snapshot[1] is iam_plan_snapshot_task
+            ):
+                self._iam_plan_snapshot = None
+            raise
+
+    def release_iam_plan_snapshot(self, execution_id: str):
+        """Release the snapshot once every template of the execution has been evaluated"""
+        if self._iam_plan_snapshot and self._iam_plan_snapshot[0] == execution_id:
+            self._iam_plan_snapshot[1].cancel()
+            self._iam_plan_snapshot = None
+
     async def set_identity_center_details(
         self, set_identity_center_map: bool = True, batch_size: int = 35
     ) -> None:
@@ -712,8 +828,48 @@ class AWSTemplate(BaseTemplate, ExpiryModel):
     async def _apply_to_account(self, aws_account: AWSAccount) -> AccountChangeDetails:
         raise NotImplementedError
 
-    async def apply(self, config: AWSConfig) -> TemplateChangeDetails:
-        tasks = []
+    def get_apply_accounts(self, config: AWSConfig) -> list[AWSAccount]:
+        """The accounts the template is applied to"""
+        return [
+            account
+            for account in config.accounts
+            if evaluate_on_provider(self, account)
+        ]
+
+    async def apply_to_account(self, aws_account: AWSAccount) -> AccountChangeDetails:
+        if ctx.execute:
+            log_str = "Applying changes to resource."
+        else:
+            log_str = "Detecting changes for resource."
+        log.info(
+            log_str,
+            account=str(aws_account),
+            resource_type=self.resource_type,
+            resource_id=self.resource_id,
+        )
+        return await self._apply_to_account(aws_account)
+
+    def get_provided_resources(self, aws_account: AWSAccount) -> set[str]:
+        """The resources applying the template creates in the account that other templates may reference"""
+        return set()
+
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        """The resources the template references in the account that must exist before it is applied.
+
+        Either ARNs or, for references that are resolved in other accounts, the path and name of the resource.
+        """
+        return set()
+
+    async def wait_until_applied(
+        self, aws_account: AWSAccount, account_change_details: AccountChangeDetails
+    ):
+        """Wait for the resources created on the account to be usable by the templates that reference them"""
+        return
+
+    def get_template_changes(
+        self, account_changes: list[AccountChangeDetails]
+    ) -> TemplateChangeDetails:
+        """Aggregate the changes of every account the template was applied to"""
         template_changes = TemplateChangeDetails(
             resource_id=self.resource_id,
             resource_type=self.resource_type,
@@ -722,16 +878,6 @@ class AWSTemplate(BaseTemplate, ExpiryModel):
         log_params = dict(
             resource_type=self.resource_type, resource_id=self.resource_id
         )
-        for account in config.accounts:
-            if evaluate_on_provider(self, account):
-                if ctx.execute:
-                    log_str = "Applying changes to resource."
-                else:
-                    log_str = "Detecting changes for resource."
-                log.info(log_str, account=str(account), **log_params)
-                tasks.append(self._apply_to_account(account))
-
-        account_changes: list[AccountChangeDetails] = await asyncio.gather(*tasks)
         template_changes.proposed_changes = [
             account_change
             for account_change in account_changes
@@ -761,6 +907,15 @@ class AWSTemplate(BaseTemplate, ExpiryModel):
 
         return template_changes
 
+    async def apply(self, config: AWSConfig) -> TemplateChangeDetails:
+        account_changes: list[AccountChangeDetails] = await asyncio.gather(
+            *[
+                self.apply_to_account(account)
+                for account in self.get_apply_accounts(config)
+            ]
+        )
+        return self.get_template_changes(account_changes)
+
     @property
     def resource_id(self):
         return self.properties.resource_id
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Optional
+
+# Requests per second
+INITIAL_RATE = 20
+MIN_RATE = 1
+MAX_RATE = 200
+# Requests per second added for every second of calls that were not throttled
+ADDITIVE_INCREASE = 2
+MULTIPLICATIVE_DECREASE = 0.5
+# Throttles of requests that were already in flight when the rate was decreased
+#   are the same congestion event and don't decrease it again
+THROTTLE_COOLDOWN = 1
+# Seconds a throttled call waits before its first retry, doubled on every retry up to the max
+THROTTLE_BACKOFF_BASE = 0.5
+THROTTLE_BACKOFF_MAX = 10
+# Services that throttle every operation against a single quota of the account
+ACCOUNT_THROTTLED_SERVICES = {"iam"}
+# The limiters pace the calls, so callers only bound how many calls they keep in flight.
+# As long as a call takes at most a second this is enough to reach MAX_RATE.
+MAX_CONCURRENT_CALLS = MAX_RATE
+
+
+def get_throttle_backoff(retry_count: int) -> float:
+    """The seconds to wait before retrying a call that was throttled retry_count times.
+
+    Exponential with jitter so the callers throttled together don't retry together.
+    The limiter alone only spaces calls out, the backoff gives a throttled API time to recover.
+    """
+    backoff = min(THROTTLE_BACKOFF_MAX, THROTTLE_BACKOFF_BASE * 2 ** (retry_count - 1))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        initial_rate: float = INITIAL_RATE,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+    ):
+        """A token bucket whose refill rate is adjusted with AIMD.
+
+        Every successful call adds to the rate and every throttled call halves it,
+            so the callers converge on the rate the API allows.
+        Callers that exceed the bucket are queued by reserving a future token
+            instead of polling, so calls are released in order.
+
+        Safe to share across tasks, threads and event loops.
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.request_count = 0
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+        self._tokens = self.rate
+        self._updated_at = time.monotonic()
+        self._decreased_at = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token and return how many seconds to wait before it is available"""
+        with self._lock:
+            now = time.monotonic()
+            # The bucket holds at most one second of calls
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            self.request_count += 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    async def acquire(self):
+        if delay := self._reserve():
+            await asyncio.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE / self.rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttle_count += 1
+            # Drop the burst so the retries and the calls waiting on the bucket are spread out
+            self._tokens = min(self._tokens, 0)
+            now = time.monotonic()
+            if now - self._decreased_at < THROTTLE_COOLDOWN:
+                return
+
+            self._decreased_at = now
+            self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(
+                rate=round(self.rate, 2),
+                request_count=self.request_count,
+                throttle_count=self.throttle_count,
+            )
+
+
+_lock = threading.Lock()
+_rate_limiters: dict[tuple[Optional[str], str, Optional[str]], AdaptiveRateLimiter] = {}
+_client_account_ids = weakref.WeakKeyDictionary()
+
+
+def register_client(client, account_id: str):
+    """Attribute the calls made with the boto3 client to the account"""
+    with _lock:
+        _client_account_ids[client] = account_id
+
+
+def get_rate_limiter(boto_fnc) -> AdaptiveRateLimiter:
+    """Return the limiter shared by every call to the operation of boto_fnc.
+
+    Limiters are keyed by (account, service, operation).
+    Services in ACCOUNT_THROTTLED_SERVICES, e.g. IAM, have a single limiter per account
+        with the operation None because all of their operations count against the same quota.
+    Calls with a client that was never registered share the limiter of the account None.
+
+    :param boto_fnc: A method of a boto3 client, e.g. iam_client.list_roles
+    """
+    client = getattr(boto_fnc, "__self__", None)
+    try:
+        service = client.meta.service_model.service_name
+    except AttributeError:
+        service = "unknown"
+
+    with _lock:
+        try:
+            account_id = _client_account_ids.get(client)
+        except TypeError:
+            # Not a weak referenceable object
+            account_id = None
+
+        operation = (
+            None
+            if service in ACCOUNT_THROTTLED_SERVICES
+            else getattr(boto_fnc, "__name__", str(boto_fnc))
+        )
+        key = (account_id, service, operation)
+        if not (rate_limiter := _rate_limiters.get(key)):
+            rate_limiter = AdaptiveRateLimiter()
+            _rate_limiters[key] = rate_limiter
+        return rate_limiter
+
+
+def get_rate_limiter_stats() -> list[dict]:
+    """The current rate and the request and throttle counts of every limiter"""
+    with _lock:
+        rate_limiters = list(_rate_limiters.items())
+
+    return [
+        dict(
+            account_id=account_id,
+            service=service,
+            operation=operation,
+            **rate_limiter.get_stats(),
+        )
+        for (account_id, service, operation), rate_limiter in rate_limiters
+    ]
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable, Optional
+
+from iambic.core.logger import log
+from iambic.core.utils import aio_wrapper
+from iambic.plugins.v0_1_0.aws.utils import boto_crud_call
+
+# The max number of messages a receive or a delete batch can contain
+SQS_BATCH_SIZE = 10
+# Receives in flight at the same time on each queue
+RECEIVERS_PER_QUEUE = 4
+# How long a receive waits for messages before returning empty
+WAIT_TIME_SECONDS = 5
+
+
+class SQSQueue:
+    def __init__(
+        self, sqs_client, queue_url: str, parse_message: Callable[[dict], Any]
+    ):
+        """A queue to consume and how to parse its messages.
+
+        parse_message is called on a worker thread and returns None for messages to skip.
+        """
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.parse_message = parse_message
+        self._delete_entries: list[str] = []
+        self._delete_tasks: list[asyncio.Task] = []
+
+    async def _delete_messages(self, receipt_handles: list[str]):
+        # A message received twice is deleted with both receipt handles,
+        #   so the ids only have to be unique within the batch
+        response = await boto_crud_call(
+            self.sqs_client.delete_message_batch,
+            QueueUrl=self.queue_url,
+            Entries=[
+                {"Id": str(elem), "ReceiptHandle": receipt_handle}
+                for elem, receipt_handle in enumerate(receipt_handles)
+            ],
+        )
+        if failed := response.get("Failed"):
+            log.warning(
+                "Unable to delete messages from the queue.",
+                queue_url=self.queue_url,
+                failed=failed,
+            )
+
+    def delete(self, messages: list[dict]):
+        """Queue the messages for deletion, deleting them in batches as they fill up"""
+        self._delete_entries.extend(message["ReceiptHandle"] for message in messages)
+        while len(self._delete_entries) >= SQS_BATCH_SIZE:
+            self._delete_tasks.append(
+                asyncio.create_task(
+                    self._delete_messages(self._delete_entries[:SQS_BATCH_SIZE])
+                )
+            )
+            self._delete_entries = self._delete_entries[SQS_BATCH_SIZE:]
+
+    async def flush(self):
+        """Delete the queued messages and wait for every delete"""
+        if self._delete_entries:
+            self._delete_tasks.append(
+                asyncio.create_task(self._delete_messages(self._delete_entries))
+            )
+            self._delete_entries = []
+
+        delete_tasks, self._delete_tasks = self._delete_tasks, []
+        await asyncio.gather(*delete_tasks)
+
+
+class SQSConsumer:
+    def __init__(
+        self,
+        max_messages: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        receivers_per_queue: int = RECEIVERS_PER_QUEUE,
+        wait_time_seconds: int = WAIT_TIME_SECONDS,
+    ):
+        """Drains SQS queues with several long polling receives in flight on every queue.
+
+        Each batch of messages is parsed on a worker thread while the next receives are in flight
+            and the messages are deleted in batches once they are parsed.
+        A queue stops being consumed once a receive returns no messages.
+        SQS delivers messages at least once, so a message received again is deleted but not parsed twice.
+
+        :param max_messages: Stop receiving once this many messages were received across all queues.
+        :param max_seconds: Stop receiving once this many seconds have passed.
+            Messages that were already received are still parsed and deleted.
+        """
+        self.max_messages = max_messages
+        self.max_seconds = max_seconds
+        self.receivers_per_queue = receivers_per_queue
+        self.wait_time_seconds = wait_time_seconds
+        self.received_count = 0
+        self._received_message_ids: set[str] = set()
+        self._reserved_count = 0
+        self._deadline: Optional[float] = None
+
+    def _reserve(self) -> int:
+        """The number of messages the next receive may return, 0 once the budget is spent"""
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return 0
+        if self.max_messages is None:
+            return SQS_BATCH_SIZE
+
+        reserved = min(SQS_BATCH_SIZE, self.max_messages - self._reserved_count)
+        self._reserved_count += max(reserved, 0)
+        return max(reserved, 0)
+
+    def _get_wait_time_seconds(self) -> int:
+        if self._deadline is None:
+            return self.wait_time_seconds
+        return max(
+            min(self.wait_time_seconds, int(self._deadline - time.monotonic())), 0
+        )
+
+    @staticmethod
+    def _parse_messages(queue: SQSQueue, messages: list[dict]) -> list:
+        parsed_messages = []
+        for message in messages:
+            try:
+                if (parsed_message := queue.parse_message(message)) is not None:
+                    parsed_messages.append(parsed_message)
+            except Exception as err:
+                log.debug("Unable to process message", error=str(err), message=message)
+        return parsed_messages
+
+    async def _receive(self, queue: SQSQueue, results: list):
+        while reserved := self._reserve():
+            messages = (
+                await boto_crud_call(
+                    queue.sqs_client.receive_message,
+                    QueueUrl=queue.queue_url,
+                    MaxNumberOfMessages=reserved,
+                    WaitTimeSeconds=self._get_wait_time_seconds(),
+                )
+            ).get("Messages", [])
+            if not messages:
+                self._reserved_count -= reserved
+                return
+
+            new_messages = []
+            for message in messages:
+                if message["MessageId"] not in self._received_message_ids:
+                    self._received_message_ids.add(message["MessageId"])
+                    new_messages.append(message)
+            self.received_count += len(new_messages)
+            # Return what wasn't used to the budget
+            self._reserved_count -= reserved - len(new_messages)
+
+            results.extend(await aio_wrapper(self._parse_messages, queue, new_messages))
+            # Messages that can't be parsed are deleted as well, they would never succeed
+            queue.delete(messages)
+
+    async def _consume_queue(self, queue: SQSQueue, results: list):
+        try:
+            await asyncio.gather(
+                *[
+                    self._receive(queue, results)
+                    for _ in range(self.receivers_per_queue)
+                ]
+            )
+        finally:
+            await queue.flush()
+
+    async def consume(self, queues: list[SQSQueue]) -> list:
+        """The parsed messages of every queue"""
+        if self.max_seconds is not None:
+            self._deadline = time.monotonic() + self.max_seconds
+
+        results = []
+        await asyncio.gather(*[self._consume_queue(queue, results) for queue in queues])
+        log.debug(
+            "Consumed SQS queues.",
+            queue_count=len(queues),
+            received_count=self.received_count,
+            parsed_count=len(results),
+        )
+        return results
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
 from unittest import IsolatedAsyncioTestCase, mock
 from unittest.mock import MagicMock
 
@@ -102,6 +103,13 @@ class TestAWSUtils(IsolatedAsyncioTestCase):
                         await mock_boto3_function("test-bucket")
 
 
+SOURCE_CALLER_IDENTITY = {
+    "UserId": "AIDATESTID",
+    "Account": "123456789012",
+    "Arn": "arn:aws:iam::123456789012:user/source",
+}
+
+
 class TestCreateAssumeRoleSession(IsolatedAsyncioTestCase):
     async def test_create_assume_role_session(self):
         # Set up parameters
@@ -122,7 +130,8 @@ class TestCreateAssumeRoleSession(IsolatedAsyncioTestCase):
             "AccessKeyId": "ACCESS_KEY_ID_123456",
             "SecretAccessKey": "SECRET_KEY",
             "SessionToken": "SESSION_TOKEN",
-            "Expiration": "2022-01-01T00:00:00Z",
+            # Credentials about to expire would be refreshed on use
+            "Expiration": datetime.now(timezone.utc) + timedelta(hours=1),
         }
         sts_response = {
             "AssumedRoleUser": {
@@ -137,6 +146,8 @@ class TestCreateAssumeRoleSession(IsolatedAsyncioTestCase):
 
         # Use botocore stubber to mock the sts.assume_role function
         with Stubber(sts_client) as stubber:
+            # The assumed credentials are cached by the identity of the source session
+            stubber.add_response("get_caller_identity", SOURCE_CALLER_IDENTITY)
             stubber.add_response(
                 "assume_role",
                 service_response=sts_response,
@@ -186,6 +197,14 @@ class TestCreateAssumeRoleSession(IsolatedAsyncioTestCase):
 
         # Use botocore stubber to mock the sts.assume_role function and raise an exception
         with Stubber(sts_client) as stubber:
+            # Another identity so the credentials of the last test aren't reused
+            stubber.add_response(
+                "get_caller_identity",
+                {
+                    **SOURCE_CALLER_IDENTITY,
+                    "Arn": "arn:aws:iam::123456789012:user/denied",
+                },
+            )
             stubber.add_client_error(
                 "assume_role",
                 service_error_code="AccessDenied",
@@ -12,6 +12,11 @@ from botocore.exceptions import ClientError, NoCredentialsError
 from iambic.core.iambic_enum import IambicManaged
 from iambic.core.logger import log
 from iambic.core.utils import aio_wrapper
+from iambic.plugins.v0_1_0.aws.credential_cache import CREDENTIAL_CACHE
+from iambic.plugins.v0_1_0.aws.rate_limiter import (
+    get_rate_limiter,
+    get_throttle_backoff,
+)
 
 if TYPE_CHECKING:
     from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
@@ -34,22 +39,32 @@ def calculate_import_preference(existing_template):
 
 
 async def boto_crud_call(boto_fnc, **kwargs) -> Union[list, dict]:
-    """Responsible for calls to boto. Adds async support and error handling
+    """Responsible for calls to boto. Adds async support, rate limiting and error handling
+
+    Calls are paced by the adaptive rate limiter of the account, service and operation.
+    A throttled call lowers the rate of every caller of the operation
+        and is retried after an exponential backoff.
+
     :param boto_fnc:
     :param kwargs: The params to pass to the boto fnc
     :return:
     """
     retry_count = 0
+    rate_limiter = get_rate_limiter(boto_fnc)
 
     while True:
+        await rate_limiter.acquire()
         try:
-            return await aio_wrapper(boto_fnc, **kwargs)
+            response = await aio_wrapper(boto_fnc, **kwargs)
+            rate_limiter.on_success()
+            return response
         except ClientError as err:
             if "Throttling" in err.response["Error"]["Code"]:
+                rate_limiter.on_throttle()
                 if retry_count >= 10:
                     raise
                 retry_count += 1
-                await asyncio.sleep(retry_count / 2)
+                await asyncio.sleep(get_throttle_backoff(retry_count))
                 continue
             elif "AccessDenied" in err.response["Error"]["Code"]:
                 raise
@@ -147,6 +162,11 @@ def get_current_role_arn(sts_client) -> str:
     return get_identity_arn(sts_client.get_caller_identity())
 
 
+async def get_session_role_arn(boto3_session) -> str:
+    """Like get_current_role_arn but the caller identity is cached by the credentials of the session"""
+    return get_identity_arn(await CREDENTIAL_CACHE.get_caller_identity(boto3_session))
+
+
 async def legacy_paginated_search(
     search_fnc,
     response_key: str,
@@ -305,23 +325,19 @@ async def create_assume_role_session(
     external_id: Optional[str] = None,
     session_name: str = "iambic",
 ) -> boto3.Session:
+    """Returns a session for the assumed role.
+
+    The credentials come from the process wide CREDENTIAL_CACHE and refresh before they expire.
+    """
     if session_name is None:
         session_name = "iambic"
     try:
-        sts = boto3_session.client(
-            "sts",
-            endpoint_url=f"https://sts.{region_name}.amazonaws.com",
-            region_name=region_name,
-        )
-        role_params = dict(RoleArn=assume_role_arn, RoleSessionName=session_name)
-        if external_id:
-            role_params["ExternalId"] = external_id
-        role = await aio_wrapper(sts.assume_role, **role_params)
-        return boto3.Session(
-            region_name=region_name,
-            aws_access_key_id=role["Credentials"]["AccessKeyId"],
-            aws_secret_access_key=role["Credentials"]["SecretAccessKey"],
-            aws_session_token=role["Credentials"]["SessionToken"],
+        return await CREDENTIAL_CACHE.create_assume_role_session(
+            boto3_session,
+            assume_role_arn,
+            region_name,
+            external_id=external_id,
+            session_name=session_name,
         )
     except Exception as err:
         log.error("Failed to assume role", assume_role_arn=assume_role_arn, error=err)
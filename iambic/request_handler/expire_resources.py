@@ -1,26 +1,29 @@
 from __future__ import annotations
 
-import asyncio
-
 from iambic.core.logger import log
-from iambic.core.parser import load_templates
+from iambic.core.models import write_templates
+from iambic.core.parser import aiter_templates
 from iambic.plugins.v0_1_0.aws.utils import remove_expired_resources
 
 
-async def flag_expired_resources(template_paths: list[str]):
+async def flag_expired_resources(template_paths: list[str], write_batch_size: int = 50):
     # Warning: The dynamic config must be loaded before this is called.
     #   This is done using iambic.config.dynamic_config.load_config(config_path)
     log.info("Scanning for expired resources")
-    templates = await asyncio.gather(
-        *[
-            remove_expired_resources(
+    changed_templates = 0
+    pending_writes = []
+    # Templates are streamed so only a bounded number are held in memory at once
+    async for template in aiter_templates(template_paths):
+        pending_writes.append(
+            await remove_expired_resources(
                 template, template.resource_type, template.resource_id
             )
-            for template in load_templates(template_paths)
-        ]
-    )
+        )
+        if len(pending_writes) >= write_batch_size:
+            changed_templates += await write_templates(pending_writes)
+            pending_writes = []
 
-    for template in templates:
-        template.write(exclude_none=True, exclude_unset=True, exclude_defaults=True)
+    if pending_writes:
+        changed_templates += await write_templates(pending_writes)
 
-    log.info("Expired resource scan complete.")
+    log.info("Expired resource scan complete.", changed_templates=changed_templates)
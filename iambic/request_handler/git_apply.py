@@ -7,6 +7,7 @@ import uuid
 from git import Repo
 
 from iambic.config.dynamic_config import load_config
+from iambic.core.context import ctx
 from iambic.core.git import (
     create_templates_for_deleted_files,
     create_templates_for_modified_files,
@@ -59,7 +60,8 @@ async def apply_git_changes(
         execution_id=str(uuid.uuid4()), command=Command.APPLY
     )
     new_templates = load_templates(
-        [git_diff.path for git_diff in file_changes["new_files"]]
+        [git_diff.path for git_diff in file_changes["new_files"]],
+        preserve_comments=ctx.execute,
     )
 
     deleted_templates = create_templates_for_deleted_files(
@@ -87,7 +89,8 @@ async def apply_git_changes(
     # note modified_templates_exist_in_repo has different entries from create_templates_for_modified_files because
     # create_templates_for_modified_files actually has two template instance per a single modified file
     modified_templates_exist_in_repo = load_templates(
-        [git_diff.path for git_diff in file_changes["modified_files"]]
+        [git_diff.path for git_diff in file_changes["modified_files"]],
+        preserve_comments=ctx.execute,
     )
     commit_deleted_templates(
         repo_dir, modified_templates_exist_in_repo, template_changes
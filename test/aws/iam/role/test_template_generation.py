@@ -5,6 +5,7 @@ from unittest.mock import AsyncMock, patch
 import pytest
 
 from iambic.core.iambic_enum import IambicManaged
+from iambic.core.intermediate_store import MemoryIntermediateStore
 from iambic.core.template_generation import merge_model
 from iambic.plugins.v0_1_0.aws.iam.role.models import AwsIamRoleTemplate
 from iambic.plugins.v0_1_0.aws.iam.role.template_generation import create_templated_role
@@ -81,6 +82,7 @@ async def test_create_template_role(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     assert output_role.iambic_managed is IambicManaged.UNDEFINED
 
@@ -93,6 +95,7 @@ async def test_create_template_role(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     assert output_role.iambic_managed is IambicManaged.READ_AND_WRITE
 
@@ -119,6 +122,7 @@ async def test_merge_template_role_with_explicit_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = [
@@ -132,6 +136,7 @@ async def test_merge_template_role_with_explicit_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [test_account.account_name]
@@ -169,6 +174,7 @@ async def test_merge_template_role_with_wildcard_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["dev*"]
@@ -179,6 +185,7 @@ async def test_merge_template_role_with_wildcard_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [test_account.account_name]
@@ -215,6 +222,7 @@ async def test_merge_template_role_with_wildcard_catch_include(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["dev*"]
@@ -225,6 +233,7 @@ async def test_merge_template_role_with_wildcard_catch_include(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [
@@ -273,6 +282,7 @@ async def test_noop_merge_template_role_with_non_standard_account_name(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["*"]
@@ -289,6 +299,7 @@ async def test_noop_merge_template_role_with_non_standard_account_name(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     imported_role.iambic_managed = IambicManaged.READ_AND_WRITE
     imported_role.included_accounts = ["*"]
@@ -348,6 +359,7 @@ async def test_merge_template_role_with_excluded_accounts_rule_preservation(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["prod*"]
@@ -359,6 +371,7 @@ async def test_merge_template_role_with_excluded_accounts_rule_preservation(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     imported_role.iambic_managed = IambicManaged.READ_AND_WRITE
     imported_role.included_accounts = [
@@ -402,6 +415,7 @@ async def test_merge_template_role_with_wildcard_include_and_excluded_accounts_r
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["*"]
@@ -413,6 +427,7 @@ async def test_merge_template_role_with_wildcard_include_and_excluded_accounts_r
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     imported_role.iambic_managed = IambicManaged.READ_AND_WRITE
     imported_role.included_accounts = [
@@ -458,6 +473,7 @@ async def test_merge_template_role_with_new_include_account(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["dev_*"]
@@ -468,6 +484,7 @@ async def test_merge_template_role_with_new_include_account(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [
@@ -508,6 +525,7 @@ async def test_merge_template_role_with_wildcard_move_from_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = ["dev*"]
@@ -519,6 +537,7 @@ async def test_merge_template_role_with_wildcard_move_from_exclude(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [
@@ -575,6 +594,7 @@ async def test_merge_template_role_with_explicit_exclude_on_policy(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = [
@@ -589,6 +609,7 @@ async def test_merge_template_role_with_explicit_exclude_on_policy(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [
@@ -652,6 +673,7 @@ async def test_merge_template_role_with_removed_policy(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     initial_role.iambic_managed = IambicManaged.READ_AND_WRITE
     initial_role.included_accounts = [
@@ -666,6 +688,7 @@ async def test_merge_template_role_with_removed_policy(
         "",
         test_existing_template_map,
         test_config.aws,
+        MemoryIntermediateStore(),
     )
     updated_role.iambic_managed = IambicManaged.READ_AND_WRITE
     updated_role.included_accounts = [
@@ -69,6 +69,21 @@ def prevent_aws_real_mutants(request):
     os.environ.pop("AWS_PROFILE", None)
 
 
+@pytest.fixture(autouse=True, scope="session")
+def isolate_template_cache(tmp_path_factory):
+    """Keep the tests from reading or writing the template cache of the user.
+
+    Environment variables so the template load workers use the same settings.
+    Tests of the cache enable it with their own cache directory.
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("IAMBIC_TEMPLATE_CACHE_ENABLED", "false")
+        monkeypatch.setenv(
+            "IAMBIC_TEMPLATE_CACHE_DIR", str(tmp_path_factory.mktemp("template_cache"))
+        )
+        yield
+
+
 @pytest.fixture(scope="function")
 def test_config_path_two_accounts_plus_org(tmp_path):
     config_file_path = tmp_path / "iambic/configuration.yaml"
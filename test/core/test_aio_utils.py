@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from iambic.core.aio_utils import SlidingWindowExecutor, gather_limit
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.key_running: dict[str, int] = {}
+        self.max_key_running: dict[str, int] = {}
+        self.created = 0
+
+    async def run(self, value, delay: float = 0.01, key: str = None):
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        if key:
+            self.key_running[key] = self.key_running.get(key, 0) + 1
+            self.max_key_running[key] = max(
+                self.key_running[key], self.max_key_running.get(key, 0)
+            )
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.running -= 1
+            if key:
+                self.key_running[key] -= 1
+        return value
+
+    def generate(self, count: int, delay: float = 0.01):
+        for elem in range(count):
+            self.created += 1
+            yield self.run(elem, delay)
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_run():
+    tracker = ConcurrencyTracker()
+    results = await SlidingWindowExecutor(5).run(tracker.generate(20))
+    assert results == list(range(20))
+    assert tracker.max_running == 5
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_does_not_wait_on_the_slowest():
+    tracker = ConcurrencyTracker()
+    awaitables = [tracker.run("slow", delay=0.5)] + [
+        tracker.run(elem, delay=0.05) for elem in range(8)
+    ]
+
+    start = time.monotonic()
+    results = []
+    async for elem, result in SlidingWindowExecutor(2).stream(awaitables):
+        results.append(result)
+    # A fixed batch of 2 would wait on the slow awaitable before starting the rest
+    assert time.monotonic() - start < 0.8
+    assert results[-1] == "slow"
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_pulls_lazily():
+    tracker = ConcurrencyTracker()
+    async for elem, _ in SlidingWindowExecutor(3).stream(tracker.generate(100)):
+        if elem == 0:
+            assert tracker.created <= 4
+        if elem == 10:
+            break
+
+    assert tracker.created < 20
+    # The remaining awaitables are cancelled when the caller stops iterating
+    assert tracker.running == 0
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_key_limit():
+    tracker = ConcurrencyTracker()
+    keys = ["a", "a", "a", "a", "b", "c", "a", "b"]
+
+    results = await SlidingWindowExecutor(4, key_limit=2).run(
+        [tracker.run(elem, key=key) for elem, key in enumerate(keys)], keys=keys
+    )
+    assert results == list(range(len(keys)))
+    assert tracker.max_key_running == {"a": 2, "b": 1, "c": 1}
+    # The blocked awaitables of a don't keep b and c from starting
+    assert tracker.max_running == 4
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_rate():
+    tracker = ConcurrencyTracker()
+    start = time.monotonic()
+    await SlidingWindowExecutor(10, rate=20, burst=5).run(tracker.generate(15, delay=0))
+    # 5 start right away and the remaining 10 at 20 per second
+    assert 0.4 <= time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_executor_exceptions():
+    tracker = ConcurrencyTracker()
+
+    async def _raise():
+        raise ValueError("error")
+
+    awaitables = [_raise(), tracker.run(1, delay=1), tracker.run(2, delay=1)]
+    results = await SlidingWindowExecutor(2).run(awaitables[:2], return_exceptions=True)
+    assert isinstance(results[0], ValueError)
+    assert results[1] == 1
+
+    with pytest.raises(ValueError):
+        await SlidingWindowExecutor(2).run([_raise(), awaitables[2]])
+    assert tracker.running == 0
+
+
+@pytest.mark.asyncio
+async def test_gather_limit_duplicates():
+    tracker = ConcurrencyTracker()
+    awaitable = asyncio.ensure_future(tracker.run("duplicate"))
+    results = await gather_limit(
+        awaitable, tracker.run(1), awaitable, tracker.run(2), limit=2
+    )
+    assert results == ["duplicate", 1, "duplicate", 2]
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import inspect
+import pickle
+import time
+from test.core.test_models import (
+    AWS_TEMPLATE_IDS,
+    AWS_TEMPLATES,
+    ROLE_TEMPLATE_YAML,
+    legacy_commented_map,
+    load_aws_template,
+)
+from test.core.test_template_generation import (
+    TEMPLATIZE_POLICY_DOCUMENT,
+    generate_account_dict_resources,
+    generate_account_resources,
+    generate_tags,
+    legacy_base_group_dict_attribute,
+    legacy_base_group_str_attribute,
+    legacy_merge_access_model_list,
+    legacy_templatize_resource,
+)
+from test.core.test_utils import (
+    INDEXED_ROLE_TEMPLATE_YAML,
+    generate_access_rule_sets,
+    generate_matching_values,
+    generate_provider_identifiers,
+    legacy_get_provider_value,
+    legacy_is_included,
+    strip_comments,
+)
+
+import pytest
+
+from iambic.core.models import IambicPydanticBaseModel
+from iambic.core.template_generation import (
+    _get_account_templatizer,
+    base_group_dict_attribute,
+    base_group_str_attribute,
+    merge_access_model_list,
+    templatize_resource,
+)
+from iambic.core.utils import (
+    ProviderValueResolver,
+    _get_access_rule_matcher,
+    create_sorted_commented_map,
+    get_access_rule_matcher,
+    safe_yaml,
+    transform_comments,
+    yaml,
+)
+from iambic.plugins.v0_1_0.aws.iam.role.models import AwsIamRoleTemplate
+from iambic.plugins.v0_1_0.aws.models import AWSAccount
+
+# Wall-clock comparisons against the previous implementations.
+# Excluded by default, run with `pytest -m benchmark`.
+pytestmark = pytest.mark.benchmark
+
+
+def _sorted_commented_map(template):
+    return create_sorted_commented_map(
+        template._get_template_dict(
+            exclude={"file_path"},
+            exclude_none=True,
+            exclude_unset=True,
+            exclude_defaults=True,
+        ),
+        template.__json_encoder__,
+    )
+
+
+def _time(fnc, template, iterations: int, repeat: int = 5) -> float:
+    # The fastest run is the least affected by noise from other processes
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fnc(template)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def test_safe_yaml_benchmark():
+    corpus = [INDEXED_ROLE_TEMPLATE_YAML.format(index=elem) for elem in range(100)]
+
+    start = time.perf_counter()
+    round_trip_docs = [transform_comments(yaml.load(doc)) for doc in corpus]
+    round_trip_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    safe_docs = [safe_yaml.load(doc) for doc in corpus]
+    safe_duration = time.perf_counter() - start
+
+    summary = (
+        f"Loaded {len(corpus)} templates. "
+        f"round trip: {round_trip_duration:.3f}s, safe: {safe_duration:.3f}s"
+    )
+    assert [strip_comments(doc) for doc in round_trip_docs] == safe_docs
+    assert safe_duration < round_trip_duration, summary
+
+
+@pytest.mark.parametrize(
+    "template_cls, template_yaml", AWS_TEMPLATES, ids=AWS_TEMPLATE_IDS
+)
+def test_sorted_commented_map_benchmark(template_cls, template_yaml):
+    template = load_aws_template(template_cls, template_yaml)
+    iterations = 100
+    # Warm up both paths so neither pays for the first-call imports
+    legacy_commented_map(template)
+    _sorted_commented_map(template)
+
+    legacy_duration = _time(legacy_commented_map, template, iterations)
+    duration = _time(_sorted_commented_map, template, iterations)
+    summary = (
+        f"{template.template_type}: legacy: {legacy_duration:.3f}s, "
+        f"single pass: {duration:.3f}s, "
+        f"speedup: {legacy_duration / duration:.1f}x"
+    )
+    assert duration < legacy_duration, summary
+
+
+def _legacy_set_iambic_fields(self):
+    # The per instance mro walk __init__ did before get_iambic_fields
+    for ancestor in inspect.getmro(type(self)):
+        if getattr(ancestor, "iambic_specific_knowledge", None):
+            self.metadata_iambic_fields = self.metadata_iambic_fields.union(
+                ancestor.iambic_specific_knowledge()
+            )
+
+
+def _iter_models(value):
+    if isinstance(value, IambicPydanticBaseModel):
+        yield value
+        value = list(value.__dict__.values())
+    if isinstance(value, list):
+        for elem in value:
+            yield from _iter_models(elem)
+
+
+def _benchmark_construction(template_cls, template_dict: dict, iterations: int):
+    template_cls.precompute_iambic_fields()
+
+    def _construct(_):
+        return template_cls(file_path="/dev/null", **template_dict)
+
+    _construct(None)
+    duration = _time(_construct, None, iterations)
+    template = _construct(None)
+    with pytest.MonkeyPatch.context() as m:
+        m.setattr(
+            IambicPydanticBaseModel, "_set_iambic_fields", _legacy_set_iambic_fields
+        )
+        legacy_duration = _time(_construct, None, iterations)
+        legacy_template = _construct(None)
+    assert template == legacy_template
+
+    # Isolate the cost of resolving the iambic fields of every model in the template
+    models = list(_iter_models(template))
+    fields_duration = _time(
+        lambda _: [model._set_iambic_fields() for model in models], None, iterations
+    )
+    legacy_fields_duration = _time(
+        lambda _: [_legacy_set_iambic_fields(model) for model in models],
+        None,
+        iterations,
+    )
+
+    # Templates from the template cache are unpickled without being validated again
+    pickled_template = pickle.dumps(template, protocol=pickle.HIGHEST_PROTOCOL)
+    trusted_duration = _time(pickle.loads, pickled_template, iterations)
+
+    summary = (
+        f"{template.template_type} ({len(models)} models): "
+        f"construction legacy: {legacy_duration:.3f}s, "
+        f"construction: {duration:.3f}s, "
+        f"trusted: {trusted_duration:.3f}s, "
+        f"iambic fields legacy: {legacy_fields_duration:.3f}s, "
+        f"iambic fields: {fields_duration:.3f}s"
+    )
+    assert fields_duration < legacy_fields_duration, summary
+    assert trusted_duration < duration, summary
+
+
+@pytest.mark.parametrize(
+    "template_cls, template_yaml", AWS_TEMPLATES, ids=AWS_TEMPLATE_IDS
+)
+def test_template_construction_benchmark(template_cls, template_yaml):
+    template_dict = transform_comments(yaml.load(template_yaml))
+    _benchmark_construction(template_cls, template_dict, 100)
+
+
+def test_template_construction_benchmark_with_many_nested_models():
+    template_dict = transform_comments(yaml.load(ROLE_TEMPLATE_YAML))
+    template_dict["properties"]["tags"] = [
+        {"key": f"key_{elem}", "value": f"value_{elem}"} for elem in range(200)
+    ]
+    template_dict["properties"]["inline_policies"][0]["statement"] *= 100
+    _benchmark_construction(AwsIamRoleTemplate, template_dict, 10)
+
+
+def _benchmark_grouping(
+    group_fnc,
+    legacy_group_fnc,
+    generate_account_resources_fnc,
+    account_count: int,
+):
+    aws_account_map = {
+        str(elem).zfill(12): AWSAccount(
+            account_id=str(elem).zfill(12), account_name=f"account_{elem}"
+        )
+        for elem in range(account_count)
+    }
+    account_resources = generate_account_resources_fnc(
+        list(aws_account_map.values()), 50
+    )
+
+    def _time_grouping(fnc) -> float:
+        _get_account_templatizer.cache_clear()
+        resources = copy.deepcopy(account_resources)
+        start = time.perf_counter()
+        asyncio.run(fnc(aws_account_map, resources))
+        return time.perf_counter() - start
+
+    legacy_time = min(_time_grouping(legacy_group_fnc) for _ in range(3))
+    indexed_time = min(_time_grouping(group_fnc) for _ in range(3))
+    summary = (
+        f"{group_fnc.__name__} {account_count} accounts: "
+        f"legacy={legacy_time:.4f}s indexed={indexed_time:.4f}s"
+    )
+    assert indexed_time < legacy_time, summary
+
+
+@pytest.mark.parametrize("account_count", [50, 100, 200])
+def test_base_group_str_attribute_benchmark(account_count: int):
+    _benchmark_grouping(
+        base_group_str_attribute,
+        legacy_base_group_str_attribute,
+        generate_account_resources,
+        account_count,
+    )
+
+
+@pytest.mark.parametrize("account_count", [50, 100, 200])
+def test_base_group_dict_attribute_benchmark(account_count: int):
+    _benchmark_grouping(
+        base_group_dict_attribute,
+        legacy_base_group_dict_attribute,
+        generate_account_dict_resources,
+        account_count,
+    )
+
+
+def test_templatize_resource_benchmark():
+    aws_accounts = [
+        AWSAccount(
+            account_id=str(elem).zfill(12),
+            account_name=f"account_{elem}",
+            variables=[{"key": "team", "value": "engineering-team"}],
+        )
+        for elem in range(50)
+    ]
+    resources = [
+        TEMPLATIZE_POLICY_DOCUMENT,
+        "arn:aws:iam::123456789010:role/dev1_engineering",
+        {"key": "owner", "value": "engineering-team"},
+    ] * 20
+
+    def _templatize(fnc):
+        for aws_account in aws_accounts:
+            for resource in resources:
+                fnc(aws_account, resource)
+
+    def _time_templatize(fnc) -> float:
+        _get_account_templatizer.cache_clear()
+        start = time.perf_counter()
+        _templatize(fnc)
+        return time.perf_counter() - start
+
+    legacy_time = min(_time_templatize(legacy_templatize_resource) for _ in range(3))
+    compiled_time = min(_time_templatize(templatize_resource) for _ in range(3))
+    summary = (
+        f"templatize_resource: legacy={legacy_time:.4f}s compiled={compiled_time:.4f}s"
+    )
+    assert compiled_time < legacy_time, summary
+
+
+def test_access_rule_matcher_benchmark():
+    # Every template is evaluated against every account on apply
+    access_rule_sets = generate_access_rule_sets(100)
+    provider_identifiers = generate_provider_identifiers(300)
+
+    start = time.perf_counter()
+    for included_rules, excluded_rules in access_rule_sets:
+        for identifiers in provider_identifiers:
+            legacy_is_included(included_rules, excluded_rules, identifiers)
+    legacy_time = time.perf_counter() - start
+
+    _get_access_rule_matcher.cache_clear()
+    start = time.perf_counter()
+    for included_rules, excluded_rules in access_rule_sets:
+        matcher = get_access_rule_matcher(included_rules, excluded_rules)
+        for identifiers in provider_identifiers:
+            matcher.is_included(identifiers)
+    compiled_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for included_rules, excluded_rules in access_rule_sets:
+        matcher = get_access_rule_matcher(included_rules, excluded_rules)
+        for identifiers in provider_identifiers:
+            matcher.is_included(identifiers)
+    cached_time = time.perf_counter() - start
+
+    summary = (
+        f"access rules: legacy={legacy_time:.4f}s compiled={compiled_time:.4f}s "
+        f"cached={cached_time:.4f}s"
+    )
+    assert compiled_time < legacy_time, summary
+    assert cached_time < compiled_time, summary
+
+
+def test_provider_value_resolver_benchmark():
+    # merge_access_model_list resolves each child of every access model against the existing models
+    matching_values = generate_matching_values(20)
+    provider_identifiers = generate_provider_identifiers(600)
+
+    start = time.perf_counter()
+    for identifiers in provider_identifiers:
+        legacy_get_provider_value(matching_values, identifiers)
+    legacy_time = time.perf_counter() - start
+
+    _get_access_rule_matcher.cache_clear()
+    start = time.perf_counter()
+    resolver = ProviderValueResolver(matching_values)
+    for identifiers in provider_identifiers:
+        resolver.resolve(identifiers)
+    resolver_time = time.perf_counter() - start
+
+    summary = (
+        f"get_provider_value: legacy={legacy_time:.4f}s resolver={resolver_time:.4f}s"
+    )
+    assert resolver_time < legacy_time, summary
+
+
+def test_merge_access_model_list_benchmark():
+    aws_accounts = [
+        AWSAccount(account_id=str(elem).zfill(12), account_name=f"dev{elem}")
+        for elem in range(100)
+    ]
+    existing_tags = generate_tags(aws_accounts, 300)
+    new_tags = generate_tags(aws_accounts, 300, 1)
+
+    def _time_merge(fnc) -> float:
+        new_list = copy.deepcopy(new_tags)
+        existing_list = copy.deepcopy(existing_tags)
+        start = time.perf_counter()
+        fnc(new_list, existing_list, aws_accounts)
+        return time.perf_counter() - start
+
+    legacy_time = _time_merge(legacy_merge_access_model_list)
+    indexed_time = _time_merge(merge_access_model_list)
+    summary = (
+        f"merge_access_model_list: legacy={legacy_time:.4f}s "
+        f"indexed={indexed_time:.4f}s"
+    )
+    assert indexed_time < legacy_time, summary
@@ -161,3 +161,21 @@ def git_diff():
 def test_create_templates_for_modified_files_without_multi_account_support(git_diff):
     templates: list[BaseTemplate] = create_templates_for_modified_files(None, git_diff)
     assert templates[0].properties.name == "after"
+
+
+def test_create_templates_for_modified_files_keeps_comments_on_apply(git_diff):
+    template_path = git_diff[0].path
+    with open(template_path) as f:
+        template_yaml = f.read()
+    with open(template_path, "w") as f:
+        f.write(
+            template_yaml.replace(
+                "name: test_template", "name: test_template  # keep me"
+            )
+        )
+
+    templates = create_templates_for_modified_files(None, git_diff)
+    # Applying a template writes it back to disk
+    templates[0].write()
+    with open(template_path) as f:
+        assert "# keep me" in f.read()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import os
+
+import pytest
+
+import iambic.core.utils
+from iambic.core.iambic_enum import Command
+from iambic.core.intermediate_store import (
+    FileIntermediateStore,
+    IntermediateStore,
+    MemoryIntermediateStore,
+    SQLiteIntermediateStore,
+    new_intermediate_store,
+)
+from iambic.core.models import ExecutionMessage
+
+EXECUTION_ID = "fake_execution_id"
+
+
+@pytest.fixture
+def writable_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(iambic.core.utils, "__WRITABLE_DIRECTORY__", tmp_path)
+    return str(tmp_path)
+
+
+@pytest.fixture(params=["memory", "file", "sqlite"])
+def intermediate_store(request, writable_directory):
+    return new_intermediate_store(EXECUTION_ID, request.param)
+
+
+def _get_file_path(writable_directory: str, *path_dirs: str) -> str:
+    return os.path.join(writable_directory, ".iambic", EXECUTION_ID, *path_dirs)
+
+
+def test_new_intermediate_store(monkeypatch):
+    monkeypatch.delenv("IAMBIC_INTERMEDIATE_STORE", raising=False)
+    assert isinstance(new_intermediate_store(EXECUTION_ID), MemoryIntermediateStore)
+
+    monkeypatch.setenv("IAMBIC_INTERMEDIATE_STORE", "file")
+    assert isinstance(new_intermediate_store(EXECUTION_ID), FileIntermediateStore)
+
+    monkeypatch.setenv("IAMBIC_INTERMEDIATE_STORE", "SQLite")
+    assert isinstance(new_intermediate_store(EXECUTION_ID), SQLiteIntermediateStore)
+
+    monkeypatch.setenv("IAMBIC_INTERMEDIATE_STORE", "redis")
+    with pytest.raises(ValueError):
+        new_intermediate_store(EXECUTION_ID)
+
+    with pytest.raises(TypeError):
+        IntermediateStore()
+
+
+@pytest.mark.asyncio
+async def test_intermediate_store_upsert(intermediate_store, writable_directory):
+    file_path = _get_file_path(writable_directory, "123456789012", "role", "a.json")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with pytest.raises(FileNotFoundError):
+        await intermediate_store.read(file_path)
+
+    await intermediate_store.upsert(file_path, {"RoleName": "a", "Tags": []})
+    await intermediate_store.upsert(file_path, {"Tags": [{"Key": "k", "Value": "v"}]})
+    assert await intermediate_store.read(file_path) == {
+        "RoleName": "a",
+        "Tags": [{"Key": "k", "Value": "v"}],
+    }
+
+    await intermediate_store.upsert(file_path, [{"RoleName": "b"}], replace_file=True)
+    assert await intermediate_store.read(file_path) == [{"RoleName": "b"}]
+
+
+@pytest.mark.asyncio
+async def test_intermediate_store_glob(intermediate_store, writable_directory):
+    file_paths = [
+        _get_file_path(writable_directory, "output.json"),
+        _get_file_path(writable_directory, "123456789012", "role", "a.json"),
+        _get_file_path(writable_directory, "123456789012", "role", "output.json"),
+        _get_file_path(writable_directory, "210987654321", "role", "output.json"),
+        _get_file_path(writable_directory, "210987654321", "user", "output.json"),
+    ]
+    for file_path in file_paths:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        await intermediate_store.upsert(file_path, {})
+        # Written to disk so the matches can be compared against glob
+        if not isinstance(intermediate_store, FileIntermediateStore):
+            with open(file_path, "w") as f:
+                f.write("{}")
+
+    for path_dirs in [
+        ["**", "role", "output.json"],
+        ["**", "output.json"],
+        ["*", "*", "*.json"],
+        ["**", "role", "**"],
+        ["210987654321", "**"],
+        ["**", "?.json"],
+    ]:
+        pattern = _get_file_path(writable_directory, *path_dirs)
+        assert sorted(intermediate_store.glob(pattern)) == sorted(
+            file_path
+            for file_path in glob.glob(pattern, recursive=True)
+            if os.path.isfile(file_path)
+        ), pattern
+
+
+def test_execution_message_intermediate_store(writable_directory, monkeypatch):
+    monkeypatch.delenv("IAMBIC_INTERMEDIATE_STORE", raising=False)
+    exe_message = ExecutionMessage(execution_id=EXECUTION_ID, command=Command.IMPORT)
+    message_copy = exe_message.copy(update={"provider_id": "123456789012"})
+    assert message_copy.intermediate_store is exe_message.intermediate_store
+    deep_copy = exe_message.copy(deep=True)
+    assert deep_copy.intermediate_store is exe_message.intermediate_store
+    assert deep_copy.template_repository is exe_message.template_repository
+    assert "intermediate_store" not in exe_message.json()
+
+    async def _get_sub_exe_files():
+        await message_copy.intermediate_store.upsert(
+            message_copy.get_file_path("role", file_name_and_extension="output.json"),
+            [{"RoleName": "a"}],
+            replace_file=True,
+        )
+        # Providers that write their responses to the execution directory directly
+        with open(
+            exe_message.copy(update={"provider_id": "210987654321"}).get_file_path(
+                "role", file_name_and_extension="output.json"
+            ),
+            "w",
+        ) as f:
+            f.write('[{"RoleName": "b"}]')
+
+        return await exe_message.get_sub_exe_files(
+            "role", file_name_and_extension="output.json", flatten_results=True
+        )
+
+    sub_exe_files = asyncio.run(_get_sub_exe_files())
+    assert sorted(role["RoleName"] for role in sub_exe_files) == ["a", "b"]
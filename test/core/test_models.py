@@ -1,12 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import os
 from datetime import date, datetime, timezone
 
+import pytest
 import pytz
+from ruamel.yaml.scalarstring import DoubleQuotedScalarString
 
 from iambic.core.iambic_enum import IambicManaged
-from iambic.core.models import BaseTemplate, ExpiryModel
+from iambic.core.models import (
+    IAMBIC_FIELDS_BY_CLASS,
+    BaseTemplate,
+    ExpiryModel,
+    write_templates,
+)
 from iambic.core.template_generation import merge_model
+from iambic.core.utils import create_commented_map, sort_dict, transform_comments, yaml
+from iambic.plugins.v0_1_0.aws.iam.group.models import AwsIamGroupTemplate
+from iambic.plugins.v0_1_0.aws.iam.policy.models import (
+    AwsIamManagedPolicyTemplate,
+    PolicyStatement,
+)
+from iambic.plugins.v0_1_0.aws.iam.role.models import AwsIamRoleTemplate
+from iambic.plugins.v0_1_0.aws.iam.user.models import AwsIamUserTemplate
+from iambic.plugins.v0_1_0.aws.identity_center.permission_set.models import (
+    AwsIdentityCenterPermissionSetTemplate,
+)
 
 
 def test_merge_model():
@@ -101,3 +122,296 @@ def test_expiry_model_from_json_with_null():
     expected_model = ExpiryModel(expires_at=None, deleted=False)
     actual_model = ExpiryModel.parse_raw(json_str)
     assert actual_model == expected_model
+
+
+def test_write_skips_unchanged_file(tmp_path):
+    template = BaseTemplate(
+        template_type="NOQ::Test", file_path=str(tmp_path / "nested" / "test.yaml")
+    )
+    assert template.write() is True
+    with open(template.file_path) as f:
+        assert f.read() == template.get_body()
+    mtime_ns = os.stat(template.file_path).st_mtime_ns
+
+    assert template.write() is False
+    assert os.stat(template.file_path).st_mtime_ns == mtime_ns
+
+    template.owner = "someone"
+    assert template.write() is True
+    with open(template.file_path) as f:
+        assert "owner: someone" in f.read()
+
+
+def test_write_templates(tmp_path):
+    templates = [
+        BaseTemplate(
+            template_type="NOQ::Test", file_path=str(tmp_path / f"{elem}.yaml")
+        )
+        for elem in range(10)
+    ]
+    assert asyncio.run(write_templates(templates, max_concurrent_writes=3)) == 10
+
+    templates[0].owner = "someone"
+    assert asyncio.run(write_templates(templates, max_concurrent_writes=3)) == 1
+
+
+def test_get_body_with_quoted_template_type():
+    template = BaseTemplate(
+        template_type=DoubleQuotedScalarString("NOQ::Test"), file_path="test.yaml"
+    )
+    assert template.get_body() == "template_type: NOQ::Test\n"
+
+
+def test_iambic_fields_computed_once_per_class():
+    template = BaseTemplate(template_type="NOQ::Test", file_path="test.yaml")
+    assert template.metadata_iambic_fields == {
+        "metadata_commented_dict",
+        "iambic_managed",
+        "file_path",
+        "owner",
+    }
+    assert (
+        BaseTemplate(
+            template_type="NOQ::Test", file_path="test.yaml"
+        ).metadata_iambic_fields
+        is template.metadata_iambic_fields
+    )
+    assert "metadata_iambic_fields" in template.__fields_set__
+
+    constructed_template = BaseTemplate.construct(
+        template_type="NOQ::Test", file_path="test.yaml"
+    )
+    assert constructed_template.metadata_iambic_fields == (
+        template.metadata_iambic_fields
+    )
+
+
+def test_precompute_iambic_fields():
+    IAMBIC_FIELDS_BY_CLASS.pop(AwsIamRoleTemplate, None)
+    IAMBIC_FIELDS_BY_CLASS.pop(PolicyStatement, None)
+
+    AwsIamRoleTemplate.precompute_iambic_fields()
+    assert "access_rules" in IAMBIC_FIELDS_BY_CLASS[AwsIamRoleTemplate]
+    # Nested models are computed as well
+    assert PolicyStatement in IAMBIC_FIELDS_BY_CLASS
+
+
+ROLE_TEMPLATE_YAML = """template_type: NOQ::AWS::IAM::Role
+identifier: '{{account_name}}_engineering'
+included_accounts:
+  - '*'
+excluded_accounts:
+  - prod  # Managed by another team
+owner: engineering@example.com
+properties:
+  description:
+    - description: Engineering role for the dev accounts
+      included_accounts:
+        - dev*
+    - description: Engineering role
+  max_session_duration: 3600
+  path: /iambic/
+  role_name: '{{account_name}}_engineering'
+  assume_role_policy_document:
+    statement:
+      - action: sts:AssumeRole
+        effect: Allow
+        principal:
+          aws: arn:aws:iam::123456789012:role/admin
+      - action:
+          - sts:TagSession
+          - sts:AssumeRole
+        effect: Allow
+        principal:
+          service: ec2.amazonaws.com
+    version: '2012-10-17'
+  managed_policies:
+    - policy_arn: arn:aws:iam::aws:policy/ReadOnlyAccess
+    - policy_arn: arn:aws:iam::aws:policy/AdministratorAccess
+      included_accounts:
+        - dev
+  inline_policies:
+    - policy_name: s3_access  # Grants access to the team bucket
+      statement:
+        - action:
+            - s3:ListBucket
+            - s3:GetObject
+          effect: Allow
+          resource:
+            - arn:aws:s3:::engineering/*
+            - arn:aws:s3:::engineering
+          condition:
+            string_equals:
+              aws:PrincipalOrgID: o-123456
+      version: '2012-10-17'
+  tags:
+    - key: owner
+      value: engineering@example.com
+    - key: cost_center
+      value: '1234'
+"""
+
+USER_TEMPLATE_YAML = """template_type: NOQ::AWS::IAM::User
+identifier: alice
+included_accounts:
+  - dev
+  - staging
+properties:
+  user_name: alice
+  path: /engineering/
+  groups:
+    - group_name: engineering
+    - group_name: admins
+      expires_at: 2030-01-01
+  managed_policies:
+    - policy_arn: arn:aws:iam::aws:policy/ReadOnlyAccess
+  inline_policies:
+    - policy_name: deny_billing
+      statement:
+        - action:
+            - aws-portal:*
+          effect: Deny
+          resource: '*'
+      version: '2012-10-17'
+  tags:
+    - key: email
+      value: alice@example.com  # Used for notifications
+"""
+
+GROUP_TEMPLATE_YAML = """template_type: NOQ::AWS::IAM::Group
+identifier: engineering
+included_accounts:
+  - '*'
+properties:
+  group_name: engineering
+  path: /
+  managed_policies:
+    - policy_arn: arn:aws:iam::aws:policy/ReadOnlyAccess
+    - policy_arn: arn:aws:iam::aws:policy/job-function/ViewOnlyAccess
+  inline_policies:
+    - policy_name: ec2_access
+      statement:
+        - action:
+            - ec2:StopInstances
+            - ec2:StartInstances
+            - ec2:DescribeInstances
+          effect: Allow
+          resource: '*'
+          condition:
+            string_equals:
+              aws:ResourceTag/team: engineering
+      version: '2012-10-17'
+"""
+
+MANAGED_POLICY_TEMPLATE_YAML = """template_type: NOQ::AWS::IAM::ManagedPolicy
+identifier: engineering_s3
+included_accounts:
+  - '*'
+excluded_accounts:
+  - prod
+properties:
+  description: Access to the engineering buckets
+  path: /iambic/
+  policy_name: engineering_s3
+  policy_document:
+    statement:
+      - action:
+          - s3:PutObject
+          - s3:GetObject
+          - s3:DeleteObject
+        effect: Allow
+        resource:
+          - arn:aws:s3:::engineering-{{account_name}}/*
+        expires_at: 2030-01-01
+      - action: s3:ListBucket
+        effect: Allow
+        resource: arn:aws:s3:::engineering-{{account_name}}
+    version: '2012-10-17'
+  tags:
+    - key: owner
+      value: engineering@example.com
+"""
+
+PERMISSION_SET_TEMPLATE_YAML = """template_type: NOQ::AWS::IdentityCenter::PermissionSet
+identifier: engineering
+included_orgs:
+  - '*'
+access_rules:
+  - groups:
+      - engineering
+      - admins
+    included_accounts:
+      - dev*
+  - users:
+      - alice@example.com
+    included_accounts:
+      - prod  # Read only
+properties:
+  name: engineering
+  description: Engineering access
+  session_duration: PT4H
+  managed_policies:
+    - arn: arn:aws:iam::aws:policy/ReadOnlyAccess
+  inline_policy:
+    statement:
+      - action:
+          - s3:GetObject
+          - s3:ListBucket
+        effect: Allow
+        resource: '*'
+    version: '2012-10-17'
+  tags:
+    - key: owner
+      value: engineering@example.com
+"""
+
+AWS_TEMPLATES = [
+    (AwsIamRoleTemplate, ROLE_TEMPLATE_YAML),
+    (AwsIamUserTemplate, USER_TEMPLATE_YAML),
+    (AwsIamGroupTemplate, GROUP_TEMPLATE_YAML),
+    (AwsIamManagedPolicyTemplate, MANAGED_POLICY_TEMPLATE_YAML),
+    (AwsIdentityCenterPermissionSetTemplate, PERMISSION_SET_TEMPLATE_YAML),
+]
+AWS_TEMPLATE_IDS = ["role", "user", "group", "managed_policy", "permission_set"]
+
+
+def load_aws_template(template_cls, template_yaml: str):
+    return template_cls(
+        file_path="/dev/null", **transform_comments(yaml.load(template_yaml))
+    )
+
+
+def legacy_commented_map(template):
+    # The json round trip get_body used before create_sorted_commented_map
+    template_dict = json.loads(
+        template.json(
+            exclude={"file_path"},
+            exclude_none=True,
+            exclude_unset=True,
+            exclude_defaults=True,
+        )
+    )
+    template_dict["template_type"] = template.template_type
+    return create_commented_map(sort_dict(template_dict))
+
+
+def legacy_get_body(template) -> str:
+    as_yaml = yaml.dump(legacy_commented_map(template))
+    template_type_str = f"template_type: {template.template_type}"
+    as_yaml = as_yaml.replace(f"{template_type_str}\n", "")
+    as_yaml = as_yaml.replace(f"\n{template_type_str}", "")
+    return f"{template_type_str}\n{as_yaml}"
+
+
+@pytest.mark.parametrize(
+    "template_cls, template_yaml", AWS_TEMPLATES, ids=AWS_TEMPLATE_IDS
+)
+def test_get_body_matches_legacy_serializer(template_cls, template_yaml):
+    template = load_aws_template(template_cls, template_yaml)
+    assert template.get_body() == legacy_get_body(template)
+    assert template.dict() == {
+        **json.loads(
+            template.json(exclude={"file_path"}, exclude_unset=True, exclude_none=True)
+        ),
+        "template_type": template.template_type,
+    }
@@ -2,16 +2,32 @@ from __future__ import annotations
 
 import asyncio
 import os
+import pickle
 import shutil
 import sys
 import tempfile
+import time
 import traceback
 
 import pytest
 
 import iambic.plugins.v0_1_0.example
 from iambic.config.dynamic_config import load_config
-from iambic.core.parser import load_templates
+from iambic.core import parser
+from iambic.core import template_cache as template_cache_module
+from iambic.core.context import ctx
+from iambic.core.iambic_enum import Command
+from iambic.core.models import (
+    ExecutionMessage,
+    ProposedChange,
+    ProposedChangeType,
+    TemplateChangeDetails,
+)
+from iambic.core.parser import aiter_templates, load_templates
+from iambic.core.template_cache import TemplateCache
+from iambic.plugins.v0_1_0.example.local_database.models import (
+    ExampleLocalDatabaseTemplate,
+)
 
 MISSING_REQUIRED_FIELDS_TEMPLATE_YAML = """template_type: NOQ::Example::LocalDatabase
 expires_at: tomorrow
@@ -52,6 +68,14 @@ example:
 EXAMPLE_PLUGIN_PATH = iambic.plugins.v0_1_0.example.__path__[0]
 
 
+@pytest.fixture
+def template_cache(tmp_path, monkeypatch):
+    template_cache = TemplateCache(cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr(parser, "TEMPLATE_CACHE", template_cache)
+    monkeypatch.setenv("IAMBIC_TEMPLATE_CACHE_ENABLED", "true")
+    return template_cache
+
+
 @pytest.fixture
 def example_test_filesystem():
     temp_templates_directory = tempfile.mkdtemp(
@@ -149,3 +173,361 @@ def test_malformed_yaml(example_test_filesystem):
     assert (
         "ScannerError" in captured_traceback
     )  # checking the underlying raumel info is captured
+
+
+def test_load_templates_uses_cache(example_test_filesystem, template_cache):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_paths = [f"{repo_dir}/{TEST_TEMPLATE_PATH}"]
+
+    first_load = load_templates(template_paths)
+    assert template_cache.stats == {"hits": 0, "misses": 1}
+
+    second_load = load_templates(template_paths)
+    assert template_cache.stats == {"hits": 1, "misses": 1}
+    assert second_load[0] is not first_load[0]
+    assert second_load[0].file_path == first_load[0].file_path
+    assert second_load[0].get_body() == first_load[0].get_body()
+
+
+def test_template_cache_invalidated_on_change(example_test_filesystem, template_cache):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_path = f"{repo_dir}/{TEST_TEMPLATE_PATH}"
+
+    assert load_templates([template_path])[0].properties.name == "before"
+
+    with open(template_path, "w") as f:
+        f.write(TEST_TEMPLATE_YAML.format(name="after"))
+
+    assert load_templates([template_path])[0].properties.name == "after"
+    assert template_cache.stats == {"hits": 0, "misses": 2}
+
+
+def test_template_cache_disabled(example_test_filesystem, template_cache, monkeypatch):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_paths = [f"{repo_dir}/{TEST_TEMPLATE_PATH}"]
+    monkeypatch.setenv("IAMBIC_TEMPLATE_CACHE_ENABLED", "false")
+
+    load_templates(template_paths)
+    load_templates(template_paths)
+    assert template_cache.stats == {"hits": 0, "misses": 0}
+
+
+def test_template_cache_ignores_corrupt_entry(example_test_filesystem, template_cache):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_path = f"{repo_dir}/{TEST_TEMPLATE_PATH}"
+    load_templates([template_path])
+
+    with open(template_cache._get_entry_path(template_path), "wb") as f:
+        f.write(b"not a pickle")
+
+    assert len(load_templates([template_path])) == 1
+    assert template_cache.stats == {"hits": 0, "misses": 2}
+
+
+def test_template_cache_disabled_by_default(
+    example_test_filesystem, template_cache, monkeypatch
+):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    monkeypatch.delenv("IAMBIC_TEMPLATE_CACHE_ENABLED")
+
+    load_templates([f"{repo_dir}/{TEST_TEMPLATE_PATH}"])
+    assert template_cache.stats == {"hits": 0, "misses": 0}
+    assert not os.path.exists(template_cache.cache_dir)
+
+
+class _WritesFileOnUnpickle:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def __reduce__(self):
+        return open, (self.file_path, "w")
+
+
+def test_template_cache_rejects_unsigned_entry(
+    example_test_filesystem, template_cache, tmp_path
+):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_path = f"{repo_dir}/{TEST_TEMPLATE_PATH}"
+    load_templates([template_path])
+
+    unpickled_path = str(tmp_path / "unpickled")
+    with open(template_cache._get_entry_path(template_path), "wb") as f:
+        f.write(b"0" * 32 + pickle.dumps(_WritesFileOnUnpickle(unpickled_path)))
+
+    assert len(load_templates([template_path])) == 1
+    assert template_cache.stats == {"hits": 0, "misses": 2}
+    assert not os.path.exists(unpickled_path)
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Requires posix permissions")
+def test_template_cache_ignores_shared_directory(
+    example_test_filesystem, template_cache
+):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    os.makedirs(template_cache.cache_dir)
+    os.chmod(template_cache.cache_dir, 0o777)
+
+    load_templates([f"{repo_dir}/{TEST_TEMPLATE_PATH}"])
+    load_templates([f"{repo_dir}/{TEST_TEMPLATE_PATH}"])
+    assert template_cache.stats == {"hits": 0, "misses": 0}
+    assert os.listdir(template_cache.cache_dir) == []
+
+
+def test_template_cache_prune(example_test_filesystem, template_cache, monkeypatch):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_paths = _write_test_templates(repo_dir, 3)
+    load_templates(template_paths)
+
+    def _get_entry_paths() -> set[str]:
+        return {
+            os.path.join(template_cache.cache_dir, file_name)
+            for file_name in os.listdir(template_cache.cache_dir)
+            if file_name.endswith(".pickle")
+        }
+
+    entry_paths = [template_cache._get_entry_path(path) for path in template_paths]
+    assert _get_entry_paths() == set(entry_paths)
+
+    # An entry that hasn't been read in a while is pruned
+    expired_at = time.time() - template_cache_module.TEMPLATE_CACHE_MAX_AGE_SECONDS
+    os.utime(entry_paths[0], (expired_at - 60, expired_at - 60))
+    template_cache.prune(force=True)
+    assert _get_entry_paths() == set(entry_paths[1:])
+
+    # The least recently read entries are pruned past the max number of entries
+    os.utime(entry_paths[1], (expired_at + 60, expired_at + 60))
+    monkeypatch.setattr(template_cache_module, "TEMPLATE_CACHE_MAX_ENTRIES", 1)
+    template_cache.prune(force=True)
+    assert _get_entry_paths() == {entry_paths[2]}
+
+
+def test_load_templates_in_parallel(example_test_filesystem, monkeypatch):
+    config_path, repo_dir = example_test_filesystem
+    monkeypatch.setattr(parser, "MIN_TEMPLATES_PER_WORKER", 1)
+    asyncio.run(load_config(config_path))
+    template_paths = _write_test_templates(repo_dir, 10)
+
+    def _load_in_process(*args, **kwargs):
+        raise AssertionError("Templates should be loaded by the spawned workers")
+
+    # Spawned workers import the module fresh, only the parent sees the patch
+    monkeypatch.setattr(parser, "_load_template_shard", _load_in_process)
+    templates = load_templates(template_paths, max_workers=2)
+    assert [template.properties.name for template in templates] == [
+        f"name_{elem}" for elem in range(10)
+    ]
+    assert [template.file_path for template in templates] == template_paths
+
+
+def test_load_templates_in_parallel_raises_first_error(
+    example_test_filesystem, monkeypatch
+):
+    config_path, repo_dir = example_test_filesystem
+    monkeypatch.setattr(parser, "MIN_TEMPLATES_PER_WORKER", 1)
+    asyncio.run(load_config(config_path))
+    template_paths = [f"{repo_dir}/{TEST_TEMPLATE_PATH}"] * 4 + [
+        f"{repo_dir}/{MISSING_REQUIRED_FIELDS_TEMPLATE_PATH}",
+        f"{repo_dir}/{MALFORMED_YAML_PATH}",
+    ]
+
+    with pytest.raises(ValueError) as exc_info:
+        load_templates(template_paths, raise_validation_err=True, max_workers=2)
+    assert MISSING_REQUIRED_FIELDS_TEMPLATE_PATH in str(exc_info.value)
+    assert "Missing Field" in str(exc_info.value)
+
+    templates = load_templates(
+        template_paths, raise_validation_err=False, max_workers=2
+    )
+    assert len(templates) == 4
+
+
+def _write_test_templates(repo_dir: str, count: int) -> list[str]:
+    template_paths = []
+    for elem in range(count):
+        template_path = f"{repo_dir}/{TEST_TEMPLATE_DIR}/template_{elem}.yaml"
+        with open(template_path, "w") as f:
+            f.write(TEST_TEMPLATE_YAML.format(name=f"name_{elem}"))
+        template_paths.append(template_path)
+    return template_paths
+
+
+def test_aiter_templates(example_test_filesystem):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_paths = _write_test_templates(repo_dir, 5)
+
+    async def _consume(paths: list[str]) -> list[str]:
+        return [
+            template.properties.name
+            async for template in aiter_templates(paths, chunk_size=2)
+        ]
+
+    assert asyncio.run(_consume(template_paths)) == [
+        f"name_{elem}" for elem in range(5)
+    ]
+
+    with pytest.raises(ValueError):
+        asyncio.run(
+            _consume(
+                template_paths[:2]
+                + [f"{repo_dir}/{MISSING_REQUIRED_FIELDS_TEMPLATE_PATH}"]
+            )
+        )
+
+
+def test_aiter_templates_in_parallel(example_test_filesystem, monkeypatch):
+    config_path, repo_dir = example_test_filesystem
+    monkeypatch.setattr(parser, "MIN_TEMPLATES_PER_WORKER", 1)
+    asyncio.run(load_config(config_path))
+    template_paths = _write_test_templates(repo_dir, 6)
+
+    def _load_in_process(*args, **kwargs):
+        raise AssertionError("Templates should be loaded by the spawned workers")
+
+    # Spawned workers import the module fresh, only the parent sees the patch
+    monkeypatch.setattr(parser, "_load_template_shard", _load_in_process)
+
+    async def _consume() -> list[str]:
+        return [
+            template.file_path
+            async for template in aiter_templates(
+                template_paths, chunk_size=3, max_workers=2
+            )
+        ]
+
+    assert asyncio.run(_consume()) == template_paths
+
+
+@pytest.mark.parametrize(
+    "eval_only, applied_batch_sizes",
+    [
+        # A plan applies the stream in batches as it is parsed
+        (True, [2, 2, 1]),
+        # Executed changes are applied at once so the plugin can order every template
+        (False, [5]),
+    ],
+)
+def test_run_apply_with_template_stream(
+    example_test_filesystem, monkeypatch, eval_only, applied_batch_sizes
+):
+    config_path, repo_dir = example_test_filesystem
+    config = asyncio.run(load_config(config_path))
+    template_paths = _write_test_templates(repo_dir, 5)
+    batch_sizes = []
+    apply_templates = type(config)._apply_templates
+
+    async def _apply_templates(self, exe_message, templates):
+        batch_sizes.append(len(templates))
+        return await apply_templates(self, exe_message, templates)
+
+    monkeypatch.setattr(type(config), "_apply_templates", _apply_templates)
+    monkeypatch.setattr(ctx, "eval_only", eval_only)
+
+    async def apply(self, config):
+        return TemplateChangeDetails(
+            resource_id=self.resource_id,
+            resource_type=self.template_type,
+            template_path=self.file_path,
+            proposed_changes=[ProposedChange(change_type=ProposedChangeType.UPDATE)],
+        )
+
+    monkeypatch.setattr(ExampleLocalDatabaseTemplate, "apply", apply)
+    exe_message = ExecutionMessage(execution_id="test", command=Command.APPLY)
+    template_changes = asyncio.run(
+        config.run_apply(
+            exe_message,
+            aiter_templates(template_paths),
+            batch_size=2,
+            max_pending_batches=1,
+        )
+    )
+    assert [
+        template_change.template_path for template_change in template_changes
+    ] == template_paths
+    assert batch_sizes == applied_batch_sizes
+
+
+def test_run_apply_completes_once_after_every_batch(
+    example_test_filesystem, monkeypatch
+):
+    config_path, repo_dir = example_test_filesystem
+    config = asyncio.run(load_config(config_path))
+    monkeypatch.setattr(ctx, "eval_only", True)
+    template_paths = _write_test_templates(repo_dir, 5)
+    applied_paths = []
+    completed_runs = []
+
+    async def apply(self, config):
+        await asyncio.sleep(0)
+        applied_paths.append(self.file_path)
+        return TemplateChangeDetails(
+            resource_id=self.resource_id,
+            resource_type=self.template_type,
+            template_path=self.file_path,
+        )
+
+    async def apply_complete(exe_message, plugin_config):
+        completed_runs.append((exe_message.execution_id, len(applied_paths)))
+
+    monkeypatch.setattr(ExampleLocalDatabaseTemplate, "apply", apply)
+    for plugin in config.configured_plugins:
+        monkeypatch.setattr(plugin, "async_apply_complete_callable", apply_complete)
+    exe_message = ExecutionMessage(execution_id="test", command=Command.APPLY)
+    asyncio.run(
+        config.run_apply(
+            exe_message,
+            aiter_templates(template_paths),
+            batch_size=2,
+            max_pending_batches=2,
+        )
+    )
+    assert completed_runs == [("test", len(template_paths))] * len(
+        config.configured_plugins
+    )
+
+
+def test_load_templates_without_comments(example_test_filesystem, template_cache):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    template_path = f"{repo_dir}/{TEST_TEMPLATE_PATH}"
+    with open(template_path, "w") as f:
+        f.write(
+            TEST_TEMPLATE_YAML.format(name="commented").replace(
+                "name: test_template", "name: test_template  # a comment"
+            )
+        )
+
+    fast_template = load_templates([template_path], preserve_comments=False)[0]
+    assert fast_template.metadata_commented_dict == {}
+    assert template_cache.stats == {"hits": 0, "misses": 1}
+
+    # An entry without comments can't be used by a caller that may write the template
+    template = load_templates([template_path])[0]
+    assert template.metadata_commented_dict == {"name": "# a comment\n"}
+    assert template_cache.stats == {"hits": 0, "misses": 2}
+    assert template.dict(exclude={"metadata_commented_dict"}) == fast_template.dict(
+        exclude={"metadata_commented_dict"}
+    )
+
+    # An entry with comments can be used by any caller
+    load_templates([template_path], preserve_comments=False)
+    assert template_cache.stats == {"hits": 1, "misses": 2}
+
+
+def test_missing_required_fields_without_comments(example_test_filesystem):
+    config_path, repo_dir = example_test_filesystem
+    asyncio.run(load_config(config_path))
+    templates = [f"{repo_dir}/{MISSING_REQUIRED_FIELDS_TEMPLATE_PATH}"]
+
+    with pytest.raises(ValueError) as exc_info:
+        load_templates(templates, preserve_comments=False)
+    # Line numbers are still resolved for the hints
+    assert "around line" in str(exc_info.value)
@@ -1,17 +1,34 @@
 from __future__ import annotations
 
+import copy
 import itertools
+import random
+from collections import defaultdict
 from typing import Union
 
 import pytest
+import xxhash
 from pydantic import Extra
 
-from iambic.core.models import AccessModelMixin, BaseModel
+from iambic.core import noq_json as json
+from iambic.core.models import AccessModelMixin, BaseModel, ProviderChild, Variable
 from iambic.core.template_generation import (
+    base_group_dict_attribute,
     base_group_str_attribute,
+    get_account_templatizer,
     group_dict_attribute,
+    merge_access_model_list,
     merge_model,
+    sort_access_models_by_included_children,
+    templatize_resource,
 )
+from iambic.core.utils import (
+    ProviderValueResolver,
+    get_access_rule_matcher,
+    is_regex_match,
+    sanitize_string,
+)
+from iambic.plugins.v0_1_0.aws.models import AWSAccount, Tag
 
 
 class SampleNote(BaseModel, AccessModelMixin):
@@ -205,3 +222,650 @@ async def test_base_group_str_attribute_incoming_permutations(aws_accounts: list
         assert account_0_resources[0] in grouped_role_map["prefix-{{account_id}}"]
         assert account_2_resources[0] in grouped_role_map["prefix-{{account_id}}"]
         assert account_1_resources[0] in grouped_role_map[repeated_literal]
+
+
+async def legacy_base_group_str_attribute(
+    aws_account_map: dict[str, AWSAccount], account_resources: list[dict]
+) -> dict[str, list]:
+    """The nested loop implementation base_group_str_attribute replaced, kept to check it is identical."""
+    # TODO: Move away from AWSAccount to a provider agnostic implementation
+    for account_resource_elem, account_resource in enumerate(account_resources):
+        account_resources[account_resource_elem]["resource_val_map"] = dict()
+        account_resources[account_resource_elem]["elem_resource_val_map"] = dict()
+        aws_account = aws_account_map[account_resource["account_id"]]
+        for resource_elem, resource in enumerate(account_resource["resources"]):
+            account_resource["resources"][resource_elem][
+                "account_id"
+            ] = account_resource["account_id"]
+            resource_val = resource["resource_val"]
+            templatized_resource_val = legacy_templatize_resource(
+                aws_account, resource_val
+            )
+
+            # note about the decision we only kept the post-templatized version
+            # we aggressively templatized the incoming information.
+            # a note for future reader: if you attempt to conditional decide
+            # to templatize or not, you have to be careful regarding greedy
+            # algorithm that does not arrive at the same termination state.
+            # Concretely, if a literal can both be repeated across accounts
+            # or templatized across accounts, greedy algorithm may reach
+            # different states.
+
+            account_resources[account_resource_elem]["resource_val_map"][
+                templatized_resource_val
+            ] = resource_elem
+            account_resources[account_resource_elem]["elem_resource_val_map"][
+                resource_elem
+            ] = [templatized_resource_val]
+
+    grouped_resource_map = defaultdict(
+        list
+    )  # val:str = list(dict(name: str, path: str, account_id: str))
+    # Iterate everything looking for shared names across aws_accounts
+    for outer_elem in range(len(account_resources)):
+        for resource_val, outer_resource_elem in account_resources[outer_elem][
+            "resource_val_map"
+        ].items():
+            if outer_resource_elem is None:  # It hit on something already
+                continue
+            for inner_elem in range(outer_elem + 1, len(account_resources)):
+                if (
+                    inner_resource_elem := account_resources[inner_elem][
+                        "resource_val_map"
+                    ].get(resource_val)
+                ) is not None:
+                    if not grouped_resource_map.get(resource_val):
+                        # Null out the outer_resource_elem in all the places
+                        for rn in account_resources[outer_elem][
+                            "elem_resource_val_map"
+                        ][outer_resource_elem]:
+                            account_resources[outer_elem]["resource_val_map"][rn] = None
+                        account_resources[outer_elem]["elem_resource_val_map"][
+                            outer_resource_elem
+                        ] = []
+
+                        grouped_resource_map[resource_val] = [
+                            account_resources[inner_elem]["resources"][
+                                inner_resource_elem
+                            ],
+                            account_resources[outer_elem]["resources"][
+                                outer_resource_elem
+                            ],
+                        ]
+                    else:
+                        grouped_resource_map[resource_val].append(
+                            account_resources[inner_elem]["resources"][
+                                inner_resource_elem
+                            ]
+                        )
+
+                    for rn in account_resources[inner_elem]["elem_resource_val_map"][
+                        inner_resource_elem
+                    ]:
+                        account_resources[inner_elem]["resource_val_map"][rn] = None
+                    account_resources[inner_elem]["elem_resource_val_map"][
+                        inner_resource_elem
+                    ] = []
+
+    # Set the remaining attributes unique attributes
+    for account_resource in account_resources:
+        for elem, resource_vals in account_resource["elem_resource_val_map"].items():
+            if not resource_vals:
+                continue
+            elif len(resource_vals) == 1:
+                resource_val = resource_vals[0]
+            else:
+                # Take priority over raw output
+                resource_val = [rv for rv in resource_vals if "{{" not in rv][0]
+
+            account_resource["resources"][elem]["account_id"] = account_resource[
+                "account_id"
+            ]
+            grouped_resource_map[resource_val] = [account_resource["resources"][elem]]
+
+    return grouped_resource_map
+
+
+def generate_account_resources(
+    aws_accounts: list[AWSAccount], resources_per_account: int, seed: int = 0
+) -> list[dict]:
+    """Synthetic roles mixing shared, templatizable, unique and duplicate names"""
+    rand = random.Random(seed)
+    account_resources = []
+    for aws_account in aws_accounts:
+        resources = []
+        for elem in range(resources_per_account):
+            name_elem = rand.randrange(resources_per_account)
+            resource_val = rand.choice(
+                [
+                    f"shared_role_{name_elem}",
+                    f"{aws_account.account_name}_role_{name_elem}",
+                    f"role_{aws_account.account_id}_{name_elem}",
+                    f"unique_role_{aws_account.account_id}_{elem}_{rand.random()}",
+                ]
+            )
+            resources.append({"resource_val": resource_val, "path": f"/{elem}/"})
+        account_resources.append(
+            {"account_id": aws_account.account_id, "resources": resources}
+        )
+    return account_resources
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(10))
+async def test_base_group_str_attribute_matches_legacy(aws_accounts: list, seed: int):
+    aws_account_map = {account.account_id: account for account in aws_accounts}
+    account_resources = generate_account_resources(aws_accounts, 25, seed)
+
+    grouped_resource_map = await base_group_str_attribute(
+        aws_account_map, copy.deepcopy(account_resources)
+    )
+    legacy_grouped_resource_map = await legacy_base_group_str_attribute(
+        aws_account_map, copy.deepcopy(account_resources)
+    )
+    # Same keys in the same order, with the same resources in the same order
+    assert list(grouped_resource_map.items()) == list(
+        legacy_grouped_resource_map.items()
+    )
+
+
+async def legacy_base_group_dict_attribute(
+    aws_account_map: dict[str, AWSAccount],
+    account_resources: list[dict],
+    prefer_templatized=False,  # clarification that this keyword parameter has no impact at the moment
+) -> list[dict]:
+    """The pairwise implementation base_group_dict_attribute replaced, kept to check it is identical."""
+    # TODO: Move away from AWSAccount to a provider agnostic implementation
+    hash_map = dict()
+
+    for account_resource_elem, account_resource in enumerate(account_resources):
+        account_resources[account_resource_elem]["resource_hash_map"] = dict()
+        account_resources[account_resource_elem]["elem_resource_hash_map"] = dict()
+        aws_account = aws_account_map[account_resource["account_id"]]
+        for resource_elem, resource in enumerate(account_resource["resources"]):
+            account_resource["resources"][resource_elem][
+                "account_id"
+            ] = account_resource["account_id"]
+            # Set raw dict
+            resource_hash = xxhash.xxh32(
+                json.dumps(resource["resource_val"])
+            ).hexdigest()
+            hash_map[resource_hash] = resource["resource_val"]
+            # Set dict with attempted interpolation
+            templatized_dict = templatize_resource(
+                aws_account, resource["resource_val"]
+            )
+            templatized_resource_hash = xxhash.xxh32(
+                json.dumps(templatized_dict)
+            ).hexdigest()
+            hash_map[templatized_resource_hash] = templatized_dict
+            # Define resource hash mappings
+            account_resources[account_resource_elem]["resource_hash_map"][
+                resource_hash
+            ] = resource_elem
+            account_resources[account_resource_elem]["elem_resource_hash_map"][
+                resource_elem
+            ] = [resource_hash]
+            if templatized_resource_hash != resource_hash:
+                account_resources[account_resource_elem]["resource_hash_map"][
+                    templatized_resource_hash
+                ] = resource_elem
+                account_resources[account_resource_elem]["elem_resource_hash_map"][
+                    resource_elem
+                ].append(templatized_resource_hash)
+
+    grouped_resource_map = (
+        dict()
+    )  # val:str = list(dict(name: str, path: str, account_id: str))
+    # Iterate everything looking for shared names across aws_accounts
+    for outer_elem in range(len(account_resources)):
+        for resource_hash, outer_resource_elem in account_resources[outer_elem][
+            "resource_hash_map"
+        ].items():
+            if outer_resource_elem is None:  # It hit on something already
+                continue
+            for inner_elem in range(outer_elem + 1, len(account_resources)):
+                if (
+                    inner_resource_elem := account_resources[inner_elem][
+                        "resource_hash_map"
+                    ].get(resource_hash)
+                ) is not None:
+                    if not grouped_resource_map.get(resource_hash):
+                        grouped_resource_map[resource_hash] = {
+                            "resource_val": hash_map[resource_hash],
+                            "included_accounts": [
+                                account_resources[inner_elem]["account_id"],
+                                account_resources[outer_elem]["account_id"],
+                            ],
+                        }
+
+                        # Null out the outer_resource_elem in all the places
+                        for rn in account_resources[outer_elem][
+                            "elem_resource_hash_map"
+                        ][outer_resource_elem]:
+                            account_resources[outer_elem]["resource_hash_map"][
+                                rn
+                            ] = None
+                        account_resources[outer_elem]["elem_resource_hash_map"][
+                            outer_resource_elem
+                        ] = []
+                    else:
+                        grouped_resource_map[resource_hash]["included_accounts"].append(
+                            account_resources[inner_elem]["account_id"]
+                        )
+
+                    # Null out the inner_resource_elem in all the places
+                    for rn in account_resources[inner_elem]["elem_resource_hash_map"][
+                        inner_resource_elem
+                    ]:
+                        account_resources[inner_elem]["resource_hash_map"][rn] = None
+                    account_resources[inner_elem]["elem_resource_hash_map"][
+                        inner_resource_elem
+                    ] = []
+
+    # Set the remaining attributes unique attributes
+    for account_resource in account_resources:
+        for elem, resource_hashes in account_resource["elem_resource_hash_map"].items():
+            if not resource_hashes:
+                continue
+            elif len(resource_hashes) == 1:
+                resource_hash = resource_hashes[0]
+            else:
+                # note about the decision we prefer post-templatized version
+                # we aggressively templatized the incoming information.
+                # a note for future reader: if you attempt to conditional decide
+                # to templatize or not, you have to be careful regarding greedy
+                # algorithm that does not arrive at the same termination state.
+                # Concretely, if a literal can both be repeated across accounts
+                # or templatized across accounts, greedy algorithm may reach
+                # different states.
+                resource_hash = resource_hashes[
+                    -1
+                ]  # take the last one because it's the templatized version
+
+            grouped_resource_map[resource_hash] = {
+                "resource_val": hash_map[resource_hash],
+                "included_accounts": [account_resource["account_id"]],
+            }
+
+    return list(grouped_resource_map.values())
+
+
+def generate_account_dict_resources(
+    aws_accounts: list[AWSAccount], resources_per_account: int, seed: int = 0
+) -> list[dict]:
+    """Synthetic tags mixing shared, templatizable and unique values"""
+    rand = random.Random(seed)
+    account_resources = []
+    for aws_account in aws_accounts:
+        resources = []
+        for elem in range(resources_per_account):
+            name_elem = rand.randrange(resources_per_account)
+            tag_value = rand.choice(
+                [
+                    f"shared_{name_elem}",
+                    f"{aws_account.account_name}_{name_elem}",
+                    f"arn:aws:iam::{aws_account.account_id}:role/{name_elem}",
+                    f"{aws_account.account_name}_team",
+                    f"unique_{aws_account.account_id}_{elem}_{rand.random()}",
+                ]
+            )
+            resource_val = {"key": f"tag_{name_elem % 5}", "value": tag_value}
+            if rand.random() < 0.2:
+                resource_val = [resource_val, {"key": "owner", "value": "iambic"}]
+            resources.append({"resource_val": resource_val})
+        account_resources.append(
+            {"account_id": aws_account.account_id, "resources": resources}
+        )
+    return account_resources
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(10))
+async def test_base_group_dict_attribute_matches_legacy(aws_accounts: list, seed: int):
+    aws_accounts = copy.deepcopy(aws_accounts)
+    for aws_account in aws_accounts:
+        aws_account.variables = [
+            Variable(key="team", value=f"{aws_account.account_name}_team")
+        ]
+    aws_account_map = {account.account_id: account for account in aws_accounts}
+    account_resources = generate_account_dict_resources(aws_accounts, 25, seed)
+
+    grouped_attributes = await base_group_dict_attribute(
+        aws_account_map, copy.deepcopy(account_resources)
+    )
+    legacy_grouped_attributes = await legacy_base_group_dict_attribute(
+        aws_account_map, copy.deepcopy(account_resources)
+    )
+    assert grouped_attributes == legacy_grouped_attributes
+
+
+def legacy_templatize_resource(aws_account: AWSAccount, resource):
+    """The json round trip templatize_resource replaced, kept to compare against"""
+    resource_type = type(resource)
+
+    if isinstance(resource, dict) or isinstance(resource, list):
+        resource = json.dumps(resource)
+    elif resource_type != str:
+        resource = str(resource)
+    valid_characters_re = r"[\w_+=,.@-]"
+    resource = resource.replace(aws_account.account_id, "{{account_id}}")
+    resource = resource.replace(
+        sanitize_string(aws_account.account_name, valid_characters_re),
+        "{{account_name}}",
+    )
+    for var in aws_account.variables:
+        resource = resource.replace(var.value, "{{{}}}".format(var.key))
+
+    return (
+        json.loads(resource)
+        if resource_type == dict or resource_type == list
+        else resource_type(resource)
+    )
+
+
+TEMPLATIZE_POLICY_DOCUMENT = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Action": ["s3:GetObject", "s3:ListBucket"],
+            "Resource": [
+                "arn:aws:s3:::dev1-engineering-bucket/*",
+                "arn:aws:iam::123456789010:role/dev1_engineering",
+            ],
+            "Condition": {
+                "StringEquals": {"aws:PrincipalTag/team": "engineering-team"}
+            },
+        }
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "resource",
+    [
+        TEMPLATIZE_POLICY_DOCUMENT,
+        [TEMPLATIZE_POLICY_DOCUMENT, {"key": "owner", "value": "engineering-team"}],
+        "dev1_engineering",
+        "arn:aws:iam::123456789010:role/dev1_engineering",
+        "no_match",
+        1234,
+    ],
+)
+def test_templatize_resource_matches_legacy(aws_accounts: list, resource):
+    aws_account = aws_accounts[0].copy(
+        update={"variables": [Variable(key="team", value="engineering-team")]}
+    )
+    templatized_resource = templatize_resource(aws_account, resource)
+    assert templatized_resource == legacy_templatize_resource(aws_account, resource)
+    assert type(templatized_resource) is type(resource)
+
+
+def test_templatize_resource_returns_a_copy(aws_accounts: list):
+    resource = {"tags": [{"key": "owner", "value": "no_match"}]}
+    templatized_resource = templatize_resource(aws_accounts[0], resource)
+    assert templatized_resource == resource
+    assert templatized_resource is not resource
+    assert templatized_resource["tags"][0] is not resource["tags"][0]
+
+
+def test_account_templatizer_does_not_replace_placeholders():
+    aws_account = AWSAccount(
+        account_id="123456789010",
+        account_name="account",
+        variables=[Variable(key="name", value="name")],
+    )
+    templatizer = get_account_templatizer(aws_account)
+    assert templatizer.templatize("123456789010_account_name") == (
+        "{{account_id}}_{{account_name}}_{name}"
+    )
+    # The compiled templatizer is shared by accounts with the same config
+    assert templatizer is get_account_templatizer(aws_account.copy())
+
+
+@pytest.mark.parametrize(
+    "variables, resource",
+    [
+        # The account id is replaced before a variable that contains it
+        (
+            [Variable(key="env_arn", value="arn:aws:iam::123456789012:role/x")],
+            "arn:aws:iam::123456789012:role/x",
+        ),
+        # A variable that contains the account name
+        ([Variable(key="team", value="prod-team")], "prod-team/prod"),
+        # Earlier variables win over later ones that overlap them
+        (
+            [
+                Variable(key="first", value="role/x"),
+                Variable(key="second", value="x/y"),
+            ],
+            "role/x/y",
+        ),
+        (
+            [
+                Variable(key="first", value="x/y"),
+                Variable(key="second", value="role/x"),
+            ],
+            "role/x/y",
+        ),
+    ],
+)
+def test_account_templatizer_keeps_sequential_precedence(variables, resource):
+    aws_account = AWSAccount(
+        account_id="123456789012", account_name="prod", variables=variables
+    )
+    assert templatize_resource(aws_account, resource) == legacy_templatize_resource(
+        aws_account, resource
+    )
+
+
+def legacy_resolve_model_orphaned_children(
+    new_model: AccessModelMixin,
+    merged_model_list: list[AccessModelMixin],
+    resolved_children: set[str],
+    provider_child_map: dict[str, ProviderChild],
+) -> tuple[list[AccessModelMixin], set]:
+    """resolve_model_orphaned_children before the merge was indexed"""
+    all_provider_children = list(provider_child_map.values())
+
+    for included_child in new_model.included_children:
+        provider_child = provider_child_map.get(included_child)
+        if not provider_child:
+            continue
+
+        if any(is_regex_match(included_child, child) for child in resolved_children):
+            continue
+
+        for elem, matching_model in enumerate(merged_model_list):
+            if any(
+                is_regex_match(child, provider_child.preferred_identifier)
+                for child in matching_model.excluded_children
+            ):
+                # Don't merge the child if the model excludes it explicitly
+                continue
+
+            """
+            If the model does not have iambic_specific_knowledge
+                or the model has iambic_specific_knowledge
+                    and the new model has the same values for the attributes
+                attempt to merge, if successful update the merged_model
+            """
+            if not getattr(matching_model, "iambic_specific_knowledge", None) or all(
+                getattr(new_model, attr, None) == getattr(matching_model, attr, None)
+                for attr in matching_model.iambic_specific_knowledge()
+            ):
+                resolved_children.add(included_child)
+                merged_model = merge_model(
+                    new_model, matching_model, all_provider_children
+                )
+                if merged_model:
+                    merged_model_list[elem] = merged_model
+                    break
+
+    return merged_model_list, resolved_children
+
+
+def legacy_merge_access_model_list(
+    new_list: list[AccessModelMixin],
+    existing_list: list[AccessModelMixin],
+    all_provider_children: list[ProviderChild],
+) -> list[AccessModelMixin]:
+    """merge_access_model_list before the existing models were indexed by resource_id"""
+    merged_list = []
+    provider_child_map = {
+        child.preferred_identifier: child for child in all_provider_children
+    }
+    for new_model_index, new_model in enumerate(new_list):
+        matching_existing_models = [
+            existing_model
+            for existing_model in existing_list
+            if (existing_model.resource_id == new_model.resource_id)
+            and new_model.resource_id  # we cannot match on empty string like value
+        ]
+        if not matching_existing_models:
+            # #attempt to carry over previous list's iambic specific information for the merged_value
+            if new_model_index < len(existing_list):
+                existing_model = existing_list[new_model_index]
+                merged_list.append(
+                    # it's important NOT to have merge_model handle update_access_attribute
+                    # because it knows synching between existing and incoming. In this portion
+                    # of merge_access_model_list, merge_access_model_list is driving everything
+                    # about access model
+                    merge_model(
+                        new_model,
+                        existing_model,
+                        all_provider_children,
+                        should_update_access_attributes=False,
+                    ),
+                )
+            else:
+                merged_list.append(new_model)
+        elif new_model.included_children == ["*"]:
+            # Find the least specific
+            matching_existing_models = sort_access_models_by_included_children(
+                matching_existing_models, False
+            )
+            merged_model = merge_model(
+                new_model, matching_existing_models[0], all_provider_children
+            )
+            if merged_model:
+                merged_list.append(merged_model)
+        else:
+            # Find the most specific
+            matching_existing_models = sort_access_models_by_included_children(
+                matching_existing_models
+            )
+            """
+            Attempt to find in sub_merged_model_list
+            if found, skip, add to resolved_children
+            if not found, attempt to find in matching_existing_models
+            if found, merge, add to sub_merged_model_list, add to resolved_children
+            if not found, continue
+            Remove all resolved_children from new_model.included_children
+            if new model included_children is not empty, add to merged_list
+            """
+            sub_merged_model_list = []
+            resolved_children = set()
+            existing_model_resolver = ProviderValueResolver(matching_existing_models)
+
+            for included_child in new_model.included_children:
+                provider_child = provider_child_map.get(included_child)
+                if not provider_child:
+                    continue
+
+                provider_identifiers = provider_child.all_identifiers
+                if any(
+                    get_access_rule_matcher(
+                        merged_model.included_children,
+                        merged_model.excluded_children,
+                    ).is_included(provider_identifiers)
+                    for merged_model in sub_merged_model_list
+                ):
+                    # Already covered by a model merged for a previous child
+                    resolved_children.add(included_child)
+                    continue
+
+                existing_model = existing_model_resolver.resolve(provider_identifiers)
+                if existing_model:
+                    resolved_children.add(included_child)
+                    merged_model = merge_model(
+                        new_model, existing_model, all_provider_children
+                    )
+                    if merged_model:
+                        sub_merged_model_list.append(merged_model)
+
+            # Cannot short circuit simply by resolved_children and
+            # included_children length because included_children
+            # may not have been expanded (regex like prod*)
+            if sub_merged_model_list:
+                (
+                    sub_merged_model_list,
+                    resolved_children,
+                ) = legacy_resolve_model_orphaned_children(
+                    new_model,
+                    sub_merged_model_list,
+                    resolved_children,
+                    provider_child_map,
+                )
+
+            merged_list.extend(sub_merged_model_list)
+            new_model.set_included_children(
+                [
+                    child
+                    for child in new_model.included_children
+                    if "*" not in child and child not in resolved_children
+                ]
+            )
+            if new_model.included_children:
+                # Add new_model containing children that were not resolved and couldn't be attached to a model
+                merged_list.append(new_model)
+
+    return merged_list
+
+
+def generate_tags(
+    aws_accounts: list[AWSAccount], tag_count: int, seed: int = 0
+) -> list[Tag]:
+    """Synthetic per account tags like the ones generated on import"""
+    rand = random.Random(seed)
+    account_names = [aws_account.account_name for aws_account in aws_accounts]
+    tags = []
+    for elem in range(tag_count):
+        included_accounts = rand.choice(
+            [
+                ["*"],
+                ["dev*"],
+                ["prod*"],
+                rand.sample(account_names, rand.randint(1, 3)),
+            ]
+        )
+        excluded_accounts = (
+            rand.sample(account_names, 1) if included_accounts[0].endswith("*") else []
+        )
+        tags.append(
+            Tag(
+                key=f"key_{elem % (tag_count // 2 or 1)}",
+                value=f"value_{rand.randrange(3)}",
+                included_accounts=included_accounts,
+                excluded_accounts=excluded_accounts,
+                expires_at=rand.choice([None, "2100-01-01"]),
+            )
+        )
+    return tags
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_merge_access_model_list_matches_legacy(aws_accounts: list, seed: int):
+    existing_tags = generate_tags(aws_accounts, 40, seed)
+    new_tags = generate_tags(aws_accounts, 40, seed + 100)
+
+    merged_tags = merge_access_model_list(
+        copy.deepcopy(new_tags), copy.deepcopy(existing_tags), aws_accounts
+    )
+    legacy_merged_tags = legacy_merge_access_model_list(
+        copy.deepcopy(new_tags), copy.deepcopy(existing_tags), aws_accounts
+    )
+    assert [tag.dict() for tag in merged_tags] == [
+        tag.dict() for tag in legacy_merged_tags
+    ]
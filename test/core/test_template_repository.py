@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+from test.core.test_parser import EXAMPLE_PLUGIN_PATH, TEST_CONFIG_YAML
+
+import pytest
+
+from iambic.config.dynamic_config import load_config
+from iambic.core import template_repository
+from iambic.core.iambic_enum import Command
+from iambic.core.models import ExecutionMessage
+from iambic.plugins.v0_1_0.example.local_database.models import (
+    EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE,
+)
+
+TEMPLATE_YAML = """template_type: NOQ::Example::LocalDatabase
+name: {name}
+properties:
+  name: {name}
+"""
+
+
+@pytest.fixture
+def example_repo(tmp_path):
+    repo_dir = str(tmp_path)
+    os.makedirs(f"{repo_dir}/config")
+    os.makedirs(f"{repo_dir}/resources/example")
+    config_path = f"{repo_dir}/config/test_config.yaml"
+    with open(config_path, "w") as f:
+        f.write(TEST_CONFIG_YAML.format(example_plugin_location=EXAMPLE_PLUGIN_PATH))
+
+    for name in ["db_1", "db_2", "db_3"]:
+        with open(f"{repo_dir}/resources/example/{name}.yaml", "w") as f:
+            f.write(TEMPLATE_YAML.format(name=name))
+
+    asyncio.run(load_config(config_path))
+    return repo_dir
+
+
+def test_template_repository_loads_each_type_once(example_repo, monkeypatch):
+    load_calls = []
+    load_templates = template_repository.load_templates
+
+    def _load_templates(*args, **kwargs):
+        load_calls.append(args)
+        return load_templates(*args, **kwargs)
+
+    monkeypatch.setattr(template_repository, "load_templates", _load_templates)
+    exe_message = ExecutionMessage(execution_id="test", command=Command.IMPORT)
+    # Collectors receive copies of the message
+    message_copies = [exe_message.copy() for _ in range(5)]
+
+    async def _get_template_maps():
+        return await asyncio.gather(
+            *[
+                message.template_repository.get_template_map(
+                    example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE
+                )
+                for message in [exe_message, *message_copies]
+            ]
+        )
+
+    template_maps = asyncio.run(_get_template_maps())
+    assert len(load_calls) == 1
+    assert sorted(template_maps[0].keys()) == ["db_1", "db_2", "db_3"]
+    # Each read is a copy so a caller mutating its template can't change another's
+    template = template_maps[0]["db_1"]
+    template.properties.name = "changed"
+    assert all(
+        template_map["db_1"].properties.name == "db_1" for template_map in template_maps
+    )
+    # Deep copies of the message share the repository as well
+    assert copy.deepcopy(exe_message.template_repository) is (
+        exe_message.template_repository
+    )
+
+
+def test_template_repository_delete_orphaned_templates(example_repo):
+    exe_message = ExecutionMessage(execution_id="test", command=Command.IMPORT)
+    repository = exe_message.copy().template_repository
+
+    # Nothing is deleted if the templates were never loaded
+    repository.delete_orphaned_templates(
+        example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE
+    )
+    assert len(os.listdir(f"{example_repo}/resources/example")) == 3
+
+    asyncio.run(
+        repository.get_template_map(example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE)
+    )
+    exe_message.template_repository.touch(
+        example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE, "db_1"
+    )
+    exe_message.template_repository.touch(
+        example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE, "db_3"
+    )
+    assert repository.get_touched_resource_ids(
+        example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE
+    ) == {"db_1", "db_3"}
+
+    repository.delete_orphaned_templates(
+        example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE
+    )
+    assert sorted(os.listdir(f"{example_repo}/resources/example")) == [
+        "db_1.yaml",
+        "db_3.yaml",
+    ]
+
+
+def test_template_repository_loads_on_a_new_loop(example_repo):
+    repository = ExecutionMessage(
+        execution_id="test", command=Command.IMPORT
+    ).template_repository
+
+    # Each asyncio.run call creates a new loop that must not reuse the locks of the last one
+    for _ in range(2):
+        template_map = asyncio.run(
+            repository.get_template_map(
+                example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE
+            )
+        )
+        assert sorted(template_map.keys()) == ["db_1", "db_2", "db_3"]
+
+    async def _get_load_lock():
+        return repository._get_load_lock(
+            (example_repo, EXAMPLE_LOCAL_DATABASE_TEMPLATE_TYPE)
+        )
+
+    assert asyncio.run(_get_load_lock()) is not asyncio.run(_get_load_lock())
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import asyncio
+import random
+import re
 import unittest
 from datetime import date, datetime, timezone
 from typing import List
@@ -9,10 +11,15 @@ from unittest.mock import patch
 import pytest
 from mock import AsyncMock
 
-from iambic.core.models import BaseModel
+from iambic.core.models import BaseModel, BaseTemplate
 from iambic.core.utils import (
     GlobalRetryController,
+    NoqSemaphore,
+    ProviderValueResolver,
     create_commented_map,
+    get_access_rule_matcher,
+    get_provider_value,
+    safe_yaml,
     simplify_dt,
     sort_dict,
     transform_comments,
@@ -81,6 +88,67 @@ def test_commented_yaml():
     assert "COMMENT" in as_yaml
 
 
+INDEXED_ROLE_TEMPLATE_YAML = """template_type: NOQ::AWS::IAM::Role
+identifier: '{{{{account_name}}}}_role_{index}'
+included_accounts:
+  - '*'
+excluded_accounts:
+  - prod  # Managed by another team
+expires_at: 2030-01-01
+properties:
+  description:
+    - description: Role {index} for the dev accounts
+      included_accounts:
+        - dev*
+    - description: Role {index}
+  max_session_duration: 3600
+  path: /iambic/
+  role_name: '{{{{account_name}}}}_role_{index}'
+  assume_role_policy_document:
+    statement:
+      - action: sts:AssumeRole
+        effect: Allow
+        principal:
+          aws: arn:aws:iam::123456789012:role/admin_{index}
+    version: '2012-10-17'
+  managed_policies:
+    - policy_arn: arn:aws:iam::aws:policy/ReadOnlyAccess
+  inline_policies:
+    - policy_name: policy_{index}  # Grants access to the team bucket
+      statement:
+        - action:
+            - s3:GetObject
+            - s3:ListBucket
+          effect: Allow
+          resource:
+            - arn:aws:s3:::bucket-{index}
+            - arn:aws:s3:::bucket-{index}/*
+      version: '2012-10-17'
+  tags:
+    - key: owner
+      value: team_{index}@example.com
+"""
+
+
+def strip_comments(value):
+    if isinstance(value, dict):
+        return {
+            k: strip_comments(v)
+            for k, v in value.items()
+            if k != "metadata_commented_dict"
+        }
+    elif isinstance(value, list):
+        return [strip_comments(v) for v in value]
+    return value
+
+
+def test_safe_yaml_matches_round_trip():
+    corpus = [INDEXED_ROLE_TEMPLATE_YAML.format(index=elem) for elem in range(10)]
+    assert [strip_comments(transform_comments(yaml.load(doc))) for doc in corpus] == [
+        safe_yaml.load(doc) for doc in corpus
+    ]
+
+
 class TestGlobalRetryController(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
         self.wait_time = 1
@@ -222,3 +290,241 @@ async def test_gather_templates(tmpdir):
         str(file2),
         str(file3),
     }
+
+
+@pytest.mark.asyncio
+async def test_gather_templates_refreshes_index(tmpdir):
+    from iambic.core.template_index import TemplateIndex
+    from iambic.core.utils import gather_templates
+
+    templates_dir = tmpdir.mkdir("templates")
+    file1 = templates_dir.join("file1.yaml")
+    file1.write("template_type: NOQ::type1\nidentifier: '{{account_name}}_role'\n")
+    hidden_dir = templates_dir.mkdir(".hidden")
+    hidden_dir.join("file2.yaml").write("template_type: NOQ::type1\n")
+
+    assert await gather_templates(str(templates_dir), "type1") == [str(file1)]
+
+    # Changes made outside of iambic are picked up by the refresh at the start of the next run
+    file1.write("template_type: NOQ::type2\n")
+    assert await gather_templates(str(templates_dir), "type1") == [str(file1)]
+    assert await gather_templates(str(templates_dir), "type1", refresh=True) == []
+    assert await gather_templates(str(templates_dir), "NOQ::type2") == [str(file1)]
+
+    # New files are picked up and removed files are dropped
+    file3 = templates_dir.mkdir("sub_dir").join("file3.yml")
+    file3.write("template_type: NOQ::type2\n")
+    file1.remove()
+    assert await gather_templates(str(templates_dir), "type2", refresh=True) == [
+        str(file3)
+    ]
+
+    # The index is persisted and reused by a new instance
+    template_index = TemplateIndex(str(templates_dir), str(tmpdir.join("index.json")))
+    template_index.refresh()
+    file3.write("template_type: NOQ::type1\nidentifier: my_role  # comment\n")
+    reloaded_index = TemplateIndex(str(templates_dir), template_index.index_path)
+    reloaded_index.refresh()
+    assert reloaded_index.get_template_paths("type.*") == [str(file3)]
+    assert reloaded_index.get_template_type(str(file3)) == "NOQ::type1"
+    assert reloaded_index.get_identifier(str(file3)) == "my_role"
+
+
+@pytest.mark.asyncio
+async def test_gather_templates_answers_from_the_index(tmpdir, monkeypatch):
+    from iambic.core.template_index import TemplateIndex
+    from iambic.core.utils import gather_templates
+
+    templates_dir = tmpdir.mkdir("templates")
+    file1 = templates_dir.join("file1.yaml")
+    file1.write("template_type: NOQ::type1\n")
+    assert await gather_templates(str(templates_dir), refresh=True) == [str(file1)]
+
+    def _refresh(self):
+        raise AssertionError("The index was refreshed")
+
+    monkeypatch.setattr(TemplateIndex, "refresh", _refresh)
+
+    # Templates written and deleted by iambic update the index without a refresh
+    template = BaseTemplate(
+        template_type="NOQ::type2", file_path=str(templates_dir.join("file2.yaml"))
+    )
+    template.write()
+    assert await gather_templates(str(templates_dir), "type2") == [template.file_path]
+    assert await gather_templates(str(templates_dir)) == sorted(
+        [str(file1), template.file_path]
+    )
+
+    template.delete()
+    assert await gather_templates(str(templates_dir), "type2") == []
+
+
+def legacy_is_regex_match(regex, test_string):
+    regex = regex.lower()
+    test_string = test_string.lower()
+
+    if "*" in regex:
+        try:
+            sanitized_regex = regex.replace(".*", "*").replace("*", ".*")
+            return bool(re.match(sanitized_regex, test_string))
+        except re.error:
+            return regex == test_string
+    else:
+        return regex == test_string
+
+
+def legacy_is_included(
+    included_rules: list[str], excluded_rules: list[str], identifiers: set[str]
+) -> bool:
+    """The per call rule evaluation evaluate_on_provider used before AccessRuleMatcher"""
+    provider_ids = sorted(identifiers, key=len, reverse=True)
+    included_children = sorted(
+        [rule.lower() for rule in included_rules], key=len, reverse=True
+    )
+    excluded_children = sorted(
+        [rule.lower() for rule in excluded_rules], key=len, reverse=True
+    )
+    exclude_weight = 0
+
+    for exclude_rule in excluded_children:
+        if exclude_rule == "*" or any(
+            legacy_is_regex_match(exclude_rule, provider_id)
+            for provider_id in provider_ids
+        ):
+            exclude_weight = len(exclude_rule)
+            break
+
+    for include_rule in included_children:
+        if include_rule == "*" or any(
+            legacy_is_regex_match(include_rule, provider_id)
+            for provider_id in provider_ids
+        ):
+            return bool(len(include_rule) > exclude_weight)
+
+    return False
+
+
+ACCESS_RULES = [
+    "*",
+    "dev*",
+    "Dev1",
+    "dev10",
+    "prod*",
+    "prod-us-*",
+    "prod-us-east",
+    "staging.*",
+    "123456789012",
+    "1234567890*",
+    "[invalid*",
+]
+
+
+def generate_access_rule_sets(count: int, seed: int = 0) -> list[tuple[list, list]]:
+    rand = random.Random(seed)
+    return [
+        (
+            rand.sample(ACCESS_RULES, rand.randint(1, 4)),
+            rand.sample(ACCESS_RULES, rand.randint(0, 3)),
+        )
+        for _ in range(count)
+    ]
+
+
+def generate_provider_identifiers(count: int) -> list[set[str]]:
+    account_names = ["dev", "dev1", "dev10", "prod-us-east", "prod-eu", "staging-1"]
+    return [
+        {str(123456789000 + elem), f"{account_names[elem % len(account_names)]}{elem}"}
+        for elem in range(count)
+    ] + [{"123456789012", account_name} for account_name in account_names]
+
+
+def test_access_rule_matcher_matches_legacy():
+    provider_identifiers = generate_provider_identifiers(50)
+    for included_rules, excluded_rules in generate_access_rule_sets(500):
+        matcher = get_access_rule_matcher(included_rules, excluded_rules)
+        for identifiers in provider_identifiers:
+            assert matcher.is_included(identifiers) == legacy_is_included(
+                included_rules, excluded_rules, identifiers
+            ), (included_rules, excluded_rules, identifiers)
+
+
+def test_access_rule_matcher_is_shared():
+    matcher = get_access_rule_matcher(["dev*"], ["dev1"])
+    assert matcher is get_access_rule_matcher(["dev*"], ["dev1"])
+    assert matcher is not get_access_rule_matcher(["dev*"], [])
+    assert matcher.is_included({"123456789012", "dev2"})
+    assert not matcher.is_included({"123456789012", "Dev1"})
+
+
+class _MatchingValue(BaseModel):
+    included_children: list[str]
+    excluded_children: list[str] = []
+
+
+def legacy_get_provider_value(matching_values: list, identifiers: set[str]):
+    """get_provider_value before ProviderValueResolver"""
+    included_account_map = dict()
+    included_account_lists = list()
+
+    for matching_val in matching_values:
+        for included_account in matching_val.included_children:
+            included_account_map[included_account] = matching_val
+            included_account_lists.append(included_account)
+
+    for included_account in sorted(included_account_lists, key=len, reverse=True):
+        cur_val = included_account_map[included_account]
+        if legacy_is_included(
+            cur_val.included_children, cur_val.excluded_children, identifiers
+        ):
+            return cur_val
+
+
+def generate_matching_values(count: int, seed: int = 0) -> list[_MatchingValue]:
+    return [
+        _MatchingValue(included_children=included_rules, excluded_children=excluded)
+        for included_rules, excluded in generate_access_rule_sets(count, seed)
+    ]
+
+
+def test_get_provider_value():
+    matching_values = [
+        _MatchingValue(included_children=["*"]),
+        _MatchingValue(included_children=["dev*"], excluded_children=["dev1"]),
+        _MatchingValue(included_children=["dev1"]),
+    ]
+    assert get_provider_value(matching_values, {"dev1"}) is matching_values[2]
+    assert get_provider_value(matching_values, {"dev2"}) is matching_values[1]
+    assert get_provider_value(matching_values, {"prod"}) is matching_values[0]
+    assert get_provider_value(matching_values[1:], {"prod"}) is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_provider_value_resolver_matches_legacy(seed: int):
+    provider_identifiers = generate_provider_identifiers(50)
+    for value_count in range(1, 8):
+        matching_values = generate_matching_values(value_count, seed + value_count)
+        resolver = ProviderValueResolver(matching_values)
+        for identifiers in provider_identifiers * 2:
+            assert resolver.resolve(identifiers) is legacy_get_provider_value(
+                matching_values, identifiers
+            )
+
+
+@pytest.mark.asyncio
+async def test_noq_semaphore_process():
+    running = 0
+    max_running = 0
+
+    async def _process(value: int):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(running, max_running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return value
+
+    results = await NoqSemaphore(_process, 3).process(
+        [{"value": elem} for elem in range(10)]
+    )
+    assert results == list(range(10))
+    assert max_running == 3
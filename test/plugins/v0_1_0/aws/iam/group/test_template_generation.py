@@ -1,4 +1,3 @@
-import json
 import os
 import shutil
 import tempfile
@@ -129,9 +128,8 @@ async def test_collect_aws_groups(
     output_path = (
         f"{templates_base_dir}/.iambic/fake_execution_id/iam/group/output.json"
     )
-    with open(output_path, "r") as f:
-        output_users = json.load(f)
-        assert len(output_users) == 1
+    output_users = await mock_execution_message.intermediate_store.read(output_path)
+    assert len(output_users) == 1
 
 
 @pytest.mark.asyncio
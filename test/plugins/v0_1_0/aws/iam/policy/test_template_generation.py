@@ -1,4 +1,3 @@
-import json
 import os
 import shutil
 import tempfile
@@ -136,9 +135,8 @@ async def test_collect_aws_users(
     output_path = (
         f"{templates_base_dir}/.iambic/fake_execution_id/iam/managed_policy/output.json"
     )
-    with open(output_path, "r") as f:
-        output_users = json.load(f)
-        assert len(output_users) == 1
+    output_users = await mock_execution_message.intermediate_store.read(output_path)
+    assert len(output_users) == 1
 
 
 @pytest.mark.asyncio
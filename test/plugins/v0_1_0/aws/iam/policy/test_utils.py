@@ -15,9 +15,11 @@ from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
     get_managed_policy_attachments,
     get_managed_policy_version_doc,
     get_oldest_policy_version_id,
+    get_referenced_managed_policy_arns,
     list_managed_policies,
     list_managed_policy_tags,
     list_managed_policy_versions,
+    wait_for_managed_policy,
 )
 
 EXAMPLE_MANAGED_POLICY_NAME = "example_managed_policy_name"
@@ -91,6 +93,27 @@ async def test_get_managed_policy(mock_iam_client):
     assert policy["PolicyName"] == EXAMPLE_MANAGED_POLICY_NAME
 
 
+@pytest.mark.asyncio
+async def test_wait_for_managed_policy(mock_iam_client):
+    assert await wait_for_managed_policy(mock_iam_client, EXAMPLE_POLICY_ARN)
+    assert not await wait_for_managed_policy(
+        mock_iam_client, f"{EXAMPLE_POLICY_ARN}_missing", timeout=0
+    )
+
+
+def test_get_referenced_managed_policy_arns():
+    assert get_referenced_managed_policy_arns(
+        {
+            "ManagedPolicies": [{"PolicyArn": EXAMPLE_POLICY_ARN}],
+            "PermissionsBoundary": {
+                "PermissionsBoundaryType": "Policy",
+                "PermissionsBoundaryArn": f"{EXAMPLE_POLICY_ARN}_boundary",
+            },
+        }
+    ) == {EXAMPLE_POLICY_ARN, f"{EXAMPLE_POLICY_ARN}_boundary"}
+    assert get_referenced_managed_policy_arns({"RoleName": "example"}) == set()
+
+
 @pytest.mark.asyncio
 async def test_get_oldest_policy_version_id(mock_iam_client):
     policy = await get_managed_policy(mock_iam_client, EXAMPLE_POLICY_ARN)
@@ -17,6 +17,7 @@ from moto import mock_sts
 
 import iambic
 from iambic.core.iambic_enum import Command
+from iambic.core.intermediate_store import FileIntermediateStore
 from iambic.core.models import ExecutionMessage
 from iambic.core.template_generation import merge_access_model_list
 from iambic.plugins.v0_1_0.aws.iam.policy.models import AssumeRolePolicyDocument
@@ -209,7 +210,7 @@ async def test_set_role_resource_tags(
         f"{templates_base_dir}/.iambic/iam/role/example_role_name_tags.json"
     )
     await set_role_resource_tags(
-        EXAMPLE_ROLE_NAME, role_resource_path, mock_aws_account
+        EXAMPLE_ROLE_NAME, role_resource_path, mock_aws_account, FileIntermediateStore()
     )
 
     with open(role_resource_path, "r") as f:
@@ -231,9 +232,8 @@ async def test_collect_aws_roles(
     config = AWSConfig(accounts=[mock_aws_account])
     await collect_aws_roles(mock_execution_message, config, templates_base_dir)
     output_path = f"{templates_base_dir}/.iambic/fake_execution_id/iam/role/output.json"
-    with open(output_path, "r") as f:
-        output_roles = json.load(f)
-        assert len(output_roles) == 1
+    output_roles = await mock_execution_message.intermediate_store.read(output_path)
+    assert len(output_roles) == 1
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import boto3
+import pytest
+from moto import mock_iam
+
+from iambic.core.context import ctx
+from iambic.core.iambic_enum import Command
+from iambic.core.models import ExecutionMessage
+from iambic.plugins.v0_1_0.aws import handlers
+from iambic.plugins.v0_1_0.aws.handlers import (
+    apply_complete,
+    capture_iam_plan_snapshots,
+    import_iam_resources,
+)
+from iambic.plugins.v0_1_0.aws.iam import utils as iam_utils
+from iambic.plugins.v0_1_0.aws.iam.group.utils import (
+    get_group,
+    get_group_inline_policies,
+    get_group_managed_policies,
+    list_groups,
+)
+from iambic.plugins.v0_1_0.aws.iam.policy.utils import (
+    get_managed_policy,
+    list_managed_policies,
+)
+from iambic.plugins.v0_1_0.aws.iam.role.models import AwsIamRoleTemplate
+from iambic.plugins.v0_1_0.aws.iam.role.utils import (
+    get_role,
+    get_role_inline_policies,
+    get_role_managed_policies,
+    list_role_tags,
+)
+from iambic.plugins.v0_1_0.aws.iam.user.utils import (
+    get_user,
+    get_user_groups,
+    get_user_inline_policies,
+    get_user_managed_policies,
+    list_user_tags,
+)
+from iambic.plugins.v0_1_0.aws.iam.utils import (
+    get_account_authorization_details,
+    get_account_plan_snapshot,
+)
+from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
+from iambic.plugins.v0_1_0.aws.models import AWSAccount
+
+EXAMPLE_ROLE_NAME = "example_role_name"
+EXAMPLE_USERNAME = "example_username"
+EXAMPLE_GROUP_NAME = "example_group_name"
+EXAMPLE_MANAGED_POLICY_NAME = "example_managed_policy_name"
+EXAMPLE_INLINE_POLICY_NAMES = ["example_inline_policy_a", "example_inline_policy_b"]
+EXAMPLE_TAGS = [{"Key": "test_key", "Value": "test_value"}]
+EXAMPLE_ASSUME_ROLE_DOCUMENT = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "ec2.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+)
+
+
+def _get_policy_document(action: str) -> str:
+    return json.dumps(
+        {
+            "Version": "2012-10-17",
+            "Statement": [{"Effect": "Allow", "Action": action, "Resource": "*"}],
+        }
+    )
+
+
+@pytest.fixture
+def mock_iam_client():
+    with mock_iam():
+        iam_client = boto3.client("iam")
+        managed_policy_arn = iam_client.create_policy(
+            PolicyName=EXAMPLE_MANAGED_POLICY_NAME,
+            PolicyDocument=_get_policy_document("s3:ListBucket"),
+        )["Policy"]["Arn"]
+        iam_client.create_policy_version(
+            PolicyArn=managed_policy_arn,
+            PolicyDocument=_get_policy_document("s3:GetObject"),
+            SetAsDefault=True,
+        )
+
+        iam_client.create_role(
+            RoleName=EXAMPLE_ROLE_NAME,
+            AssumeRolePolicyDocument=EXAMPLE_ASSUME_ROLE_DOCUMENT,
+            Tags=EXAMPLE_TAGS,
+        )
+        iam_client.attach_role_policy(
+            RoleName=EXAMPLE_ROLE_NAME, PolicyArn=managed_policy_arn
+        )
+        iam_client.create_user(UserName=EXAMPLE_USERNAME, Tags=EXAMPLE_TAGS)
+        iam_client.attach_user_policy(
+            UserName=EXAMPLE_USERNAME, PolicyArn=managed_policy_arn
+        )
+        iam_client.create_group(GroupName=EXAMPLE_GROUP_NAME)
+        iam_client.attach_group_policy(
+            GroupName=EXAMPLE_GROUP_NAME, PolicyArn=managed_policy_arn
+        )
+        iam_client.add_user_to_group(
+            GroupName=EXAMPLE_GROUP_NAME, UserName=EXAMPLE_USERNAME
+        )
+
+        for policy_name in EXAMPLE_INLINE_POLICY_NAMES:
+            policy_document = _get_policy_document(f"iam:{policy_name}")
+            iam_client.put_role_policy(
+                RoleName=EXAMPLE_ROLE_NAME,
+                PolicyName=policy_name,
+                PolicyDocument=policy_document,
+            )
+            iam_client.put_user_policy(
+                UserName=EXAMPLE_USERNAME,
+                PolicyName=policy_name,
+                PolicyDocument=policy_document,
+            )
+            iam_client.put_group_policy(
+                GroupName=EXAMPLE_GROUP_NAME,
+                PolicyName=policy_name,
+                PolicyDocument=policy_document,
+            )
+
+        yield iam_client
+
+
+@pytest.mark.asyncio
+async def test_authorization_details_match_resource_calls(mock_iam_client):
+    authorization_details = await get_account_authorization_details(mock_iam_client)
+
+    for as_dict in [True, False]:
+        assert authorization_details.get_role_inline_policies(
+            EXAMPLE_ROLE_NAME, as_dict
+        ) == await get_role_inline_policies(EXAMPLE_ROLE_NAME, mock_iam_client, as_dict)
+        assert authorization_details.get_user_inline_policies(
+            EXAMPLE_USERNAME, as_dict
+        ) == await get_user_inline_policies(EXAMPLE_USERNAME, mock_iam_client, as_dict)
+        assert authorization_details.get_group_inline_policies(
+            EXAMPLE_GROUP_NAME, as_dict
+        ) == await get_group_inline_policies(
+            EXAMPLE_GROUP_NAME, mock_iam_client, as_dict
+        )
+        assert authorization_details.get_user_groups(
+            EXAMPLE_USERNAME, as_dict
+        ) == await get_user_groups(EXAMPLE_USERNAME, mock_iam_client, as_dict)
+
+    assert authorization_details.get_role_managed_policies(
+        EXAMPLE_ROLE_NAME
+    ) == await get_role_managed_policies(EXAMPLE_ROLE_NAME, mock_iam_client)
+    assert authorization_details.get_user_managed_policies(
+        EXAMPLE_USERNAME
+    ) == await get_user_managed_policies(EXAMPLE_USERNAME, mock_iam_client)
+    assert authorization_details.get_group_managed_policies(
+        EXAMPLE_GROUP_NAME
+    ) == await get_group_managed_policies(EXAMPLE_GROUP_NAME, mock_iam_client)
+    assert authorization_details.list_role_tags(
+        EXAMPLE_ROLE_NAME
+    ) == await list_role_tags(EXAMPLE_ROLE_NAME, mock_iam_client)
+    assert authorization_details.list_user_tags(
+        EXAMPLE_USERNAME
+    ) == await list_user_tags(EXAMPLE_USERNAME, mock_iam_client)
+    assert authorization_details.list_groups() == await list_groups(mock_iam_client)
+
+    managed_policies = await list_managed_policies(mock_iam_client)
+    snapshot_managed_policies = authorization_details.list_managed_policies()
+    assert [
+        (policy["Arn"], policy["PolicyDocument"]) for policy in managed_policies
+    ] == [
+        (policy["Arn"], policy["PolicyDocument"])
+        for policy in snapshot_managed_policies
+    ]
+    # The default version, not the original one
+    assert (
+        snapshot_managed_policies[0]["PolicyDocument"]["Statement"][0]["Action"]
+        == "s3:GetObject"
+    )
+
+
+@pytest.mark.asyncio
+async def test_authorization_details_getters_return_copies(mock_iam_client):
+    authorization_details = await get_account_authorization_details(mock_iam_client)
+
+    # The role collector sets the policy name on the returned documents
+    role_inline_policies = authorization_details.get_role_inline_policies(
+        EXAMPLE_ROLE_NAME
+    )
+    for policy_name, policy_document in role_inline_policies.items():
+        policy_document["policy_name"] = policy_name
+
+    assert all(
+        "policy_name" not in policy_document
+        for policy_document in authorization_details.get_role_inline_policies(
+            EXAMPLE_ROLE_NAME
+        ).values()
+    )
+
+
+def test_get_authorization_details_fetches_once_per_execution(monkeypatch):
+    fetch_count = 0
+
+    async def _get_account_authorization_details(iam_client):
+        nonlocal fetch_count
+        fetch_count += 1
+        await asyncio.sleep(0)
+        return iam_utils.AccountAuthorizationDetails([], [], [], [])
+
+    async def _get_boto3_client(self, service, region_name=None):
+        return None
+
+    monkeypatch.setattr(
+        iam_utils,
+        "get_account_authorization_details",
+        _get_account_authorization_details,
+    )
+    monkeypatch.setattr(AWSAccount, "get_boto3_client", _get_boto3_client)
+    aws_account = AWSAccount(account_id="123456789012", account_name="example")
+
+    async def _get_authorization_details(execution_id: str):
+        return await asyncio.gather(
+            *[aws_account.get_authorization_details(execution_id) for _ in range(5)]
+        )
+
+    snapshots = asyncio.run(_get_authorization_details("execution_1"))
+    assert fetch_count == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+
+    asyncio.run(_get_authorization_details("execution_2"))
+    assert fetch_count == 2
+
+    # Releasing another execution keeps the snapshot
+    aws_account.release_authorization_details("execution_1")
+    assert aws_account._authorization_details is not None
+    aws_account.release_authorization_details("execution_2")
+    assert aws_account._authorization_details is None
+
+
+def test_import_iam_resources_releases_authorization_details(monkeypatch):
+    async def _get_account_authorization_details(iam_client):
+        return iam_utils.AccountAuthorizationDetails([], [], [], [])
+
+    async def _get_boto3_client(self, service, region_name=None):
+        return None
+
+    async def _import_service_resources(exe_message, config, *args, **kwargs):
+        for account in config.accounts:
+            await account.get_authorization_details(exe_message.execution_id)
+        raise RuntimeError("Collector failed")
+
+    monkeypatch.setattr(
+        iam_utils,
+        "get_account_authorization_details",
+        _get_account_authorization_details,
+    )
+    monkeypatch.setattr(AWSAccount, "get_boto3_client", _get_boto3_client)
+    monkeypatch.setattr(handlers, "import_service_resources", _import_service_resources)
+    config = AWSConfig(
+        accounts=[AWSAccount(account_id="123456789012", account_name="example")]
+    )
+    exe_message = ExecutionMessage(execution_id="test", command=Command.IMPORT)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(import_iam_resources(exe_message, config, "/tmp"))
+    assert config.accounts[0]._authorization_details is None
+
+
+@pytest.mark.asyncio
+async def test_plan_snapshot_matches_resource_calls(mock_iam_client):
+    mock_iam_client.update_role(
+        RoleName=EXAMPLE_ROLE_NAME, Description="example", MaxSessionDuration=7200
+    )
+    plan_snapshot = await get_account_plan_snapshot(mock_iam_client)
+
+    role = await get_role(EXAMPLE_ROLE_NAME, mock_iam_client)
+    snapshot_role = await get_role(
+        EXAMPLE_ROLE_NAME, mock_iam_client, authorization_details=plan_snapshot
+    )
+    for key in [
+        "Arn",
+        "Path",
+        "Description",
+        "MaxSessionDuration",
+        "AssumeRolePolicyDocument",
+        "Tags",
+        "ManagedPolicies",
+        "InlinePolicies",
+    ]:
+        assert snapshot_role[key] == role[key], key
+
+    user = await get_user(EXAMPLE_USERNAME, mock_iam_client)
+    snapshot_user = await get_user(
+        EXAMPLE_USERNAME, mock_iam_client, authorization_details=plan_snapshot
+    )
+    for key in ["Arn", "Path", "Tags", "ManagedPolicies", "InlinePolicies", "Groups"]:
+        assert snapshot_user[key] == user[key], key
+
+    group = await get_group(EXAMPLE_GROUP_NAME, mock_iam_client)
+    snapshot_group = await get_group(
+        EXAMPLE_GROUP_NAME, mock_iam_client, authorization_details=plan_snapshot
+    )
+    for key in ["Arn", "Path", "ManagedPolicies", "InlinePolicies"]:
+        assert snapshot_group[key] == group[key], key
+
+    policy_arn = role["ManagedPolicies"][0]["PolicyArn"]
+    mock_iam_client.tag_policy(PolicyArn=policy_arn, Tags=EXAMPLE_TAGS)
+    managed_policy = await get_managed_policy(mock_iam_client, policy_arn)
+    snapshot_managed_policy = await get_managed_policy(
+        mock_iam_client, policy_arn, authorization_details=plan_snapshot
+    )
+    for key in ["Arn", "Path", "PolicyDocument", "Tags"]:
+        assert snapshot_managed_policy[key] == managed_policy[key], key
+
+
+@pytest.mark.asyncio
+async def test_plan_snapshot_falls_back_to_resource_calls(mock_iam_client):
+    plan_snapshot = await get_account_plan_snapshot(mock_iam_client)
+    # Created after the snapshot
+    mock_iam_client.create_role(
+        RoleName="new_role", AssumeRolePolicyDocument=EXAMPLE_ASSUME_ROLE_DOCUMENT
+    )
+
+    assert plan_snapshot.get_role("new_role") is None
+    role = await get_role(
+        "new_role", mock_iam_client, authorization_details=plan_snapshot
+    )
+    assert role["RoleName"] == "new_role"
+    assert (
+        await get_user(
+            "missing_user", mock_iam_client, authorization_details=plan_snapshot
+        )
+        == {}
+    )
+
+
+def test_iam_plan_snapshot_is_captured_once_per_execution(monkeypatch):
+    capture_count = 0
+
+    async def _get_account_plan_snapshot(iam_client):
+        nonlocal capture_count
+        capture_count += 1
+        await asyncio.sleep(0)
+        return iam_utils.AccountAuthorizationDetails([], [], [], [])
+
+    async def _get_boto3_client(self, service, region_name=None):
+        return None
+
+    monkeypatch.setattr(
+        iam_utils, "get_account_plan_snapshot", _get_account_plan_snapshot
+    )
+    monkeypatch.setattr(AWSAccount, "get_boto3_client", _get_boto3_client)
+    monkeypatch.setattr(ctx, "eval_only", True)
+    config = AWSConfig(
+        accounts=[AWSAccount(account_id="123456789012", account_name="example")]
+    )
+    aws_account = config.accounts[0]
+
+    async def _apply_batches(execution_id: str):
+        # Concurrent batches of the same run share the capture
+        await asyncio.gather(
+            *[
+                capture_iam_plan_snapshots(
+                    ExecutionMessage(execution_id=execution_id, command=Command.APPLY),
+                    config,
+                    [
+                        AwsIamRoleTemplate(
+                            file_path="role.yaml",
+                            identifier="role",
+                            properties={"role_name": "role"},
+                        )
+                    ],
+                )
+                for _ in range(3)
+            ]
+        )
+        return aws_account.iam_plan_snapshot
+
+    plan_snapshot = asyncio.run(_apply_batches("execution_1"))
+    assert capture_count == 1
+    assert plan_snapshot is not None
+
+    # A later batch of the same run reads the snapshot the first batch captured
+    assert asyncio.run(_apply_batches("execution_1")) is plan_snapshot
+    assert capture_count == 1
+
+    # The snapshot is only released once the whole run is done
+    asyncio.run(
+        apply_complete(
+            ExecutionMessage(execution_id="execution_2", command=Command.APPLY),
+            config,
+        )
+    )
+    assert aws_account.iam_plan_snapshot is plan_snapshot
+    asyncio.run(
+        apply_complete(
+            ExecutionMessage(execution_id="execution_1", command=Command.APPLY),
+            config,
+        )
+    )
+    assert aws_account.iam_plan_snapshot is None
+
+    asyncio.run(_apply_batches("execution_2"))
+    assert capture_count == 2
+
+
+def test_iam_plan_snapshot_is_only_read_during_plan(monkeypatch):
+    aws_account = AWSAccount(account_id="123456789012", account_name="example")
+    plan_snapshot = iam_utils.AccountAuthorizationDetails([], [], [], [])
+
+    async def _set_iam_plan_snapshot():
+        plan_snapshot_task = asyncio.get_running_loop().create_future()
+        plan_snapshot_task.set_result(plan_snapshot)
+        aws_account._iam_plan_snapshot = ("execution_1", plan_snapshot_task)
+
+    asyncio.run(_set_iam_plan_snapshot())
+
+    monkeypatch.setattr(ctx, "eval_only", True)
+    assert aws_account.iam_plan_snapshot is plan_snapshot
+
+    monkeypatch.setattr(ctx, "eval_only", False)
+    assert aws_account.iam_plan_snapshot is None
+
+    monkeypatch.setattr(ctx, "eval_only", True)
+    aws_account.release_iam_plan_snapshot("execution_1")
+    assert aws_account.iam_plan_snapshot is None
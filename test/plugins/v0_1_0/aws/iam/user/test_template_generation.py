@@ -17,6 +17,7 @@ from moto import mock_sts
 
 import iambic
 from iambic.core.iambic_enum import Command
+from iambic.core.intermediate_store import FileIntermediateStore
 from iambic.core.models import ExecutionMessage
 from iambic.plugins.v0_1_0.aws.iam.user.template_generation import (
     collect_aws_users,
@@ -134,7 +135,9 @@ async def test_set_user_resource_tags(
     user_resource_path = (
         f"{templates_base_dir}/.iambic/iam/user/example_username_tags.json"
     )
-    await set_user_resource_tags(EXAMPLE_USERNAME, user_resource_path, mock_aws_account)
+    await set_user_resource_tags(
+        EXAMPLE_USERNAME, user_resource_path, mock_aws_account, FileIntermediateStore()
+    )
 
     with open(user_resource_path, "r") as f:
         contents = json.load(f)
@@ -155,9 +158,8 @@ async def test_collect_aws_users(
     config = AWSConfig(accounts=[mock_aws_account])
     await collect_aws_users(mock_execution_message, config, templates_base_dir)
     output_path = f"{templates_base_dir}/.iambic/fake_execution_id/iam/user/output.json"
-    with open(output_path, "r") as f:
-        output_users = json.load(f)
-        assert len(output_users) == 1
+    output_users = await mock_execution_message.intermediate_store.read(output_path)
+    assert len(output_users) == 1
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from iambic.core.context import ctx
+from iambic.core.models import AccountChangeDetails, TemplateChangeDetails
+from iambic.plugins.v0_1_0.aws.apply_scheduler import (
+    ApplyScheduler,
+    estimate_apply_cost,
+)
+from iambic.plugins.v0_1_0.aws.iam.policy.models import AwsIamManagedPolicyTemplate
+from iambic.plugins.v0_1_0.aws.iam.role.models import AwsIamRoleTemplate
+from iambic.plugins.v0_1_0.aws.iambic_plugin import AWSConfig
+from iambic.plugins.v0_1_0.aws.models import AWSAccount
+
+
+class StubTemplate:
+    def __init__(
+        self,
+        resource_id: str,
+        tracker: ApplyTracker,
+        account_ids: list[str] = None,
+        cost: int = 0,
+        delay: float = 0.01,
+        provides: set[str] = None,
+        requires: set[str] = None,
+    ):
+        self.resource_id = resource_id
+        self.tracker = tracker
+        self.account_ids = account_ids
+        self.delay = delay
+        self.provides = provides or set()
+        self.requires = requires or set()
+        self.properties = StubProperties(cost)
+
+    def get_apply_accounts(self, config: AWSConfig) -> list[AWSAccount]:
+        return [
+            account
+            for account in config.accounts
+            if self.account_ids is None or account.account_id in self.account_ids
+        ]
+
+    def get_provided_resources(self, aws_account: AWSAccount) -> set[str]:
+        return {
+            resource.format(account_id=aws_account.account_id)
+            for resource in self.provides
+        }
+
+    def get_required_resources(self, aws_account: AWSAccount) -> set[str]:
+        return {
+            resource.format(account_id=aws_account.account_id)
+            for resource in self.requires
+        }
+
+    async def wait_until_applied(
+        self, aws_account: AWSAccount, account_change_details: AccountChangeDetails
+    ):
+        await asyncio.sleep(self.delay)
+        self.tracker.available.append((self.resource_id, aws_account.account_id))
+
+    async def apply_to_account(self, aws_account: AWSAccount) -> AccountChangeDetails:
+        self.tracker.start(self.resource_id, aws_account.account_id)
+        self.tracker.started_before.append(
+            (self.resource_id, aws_account.account_id, list(self.tracker.available))
+        )
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.tracker.cancelled += 1
+            raise
+        self.tracker.stop(aws_account.account_id)
+        return AccountChangeDetails(
+            account=aws_account.account_id,
+            resource_id=self.resource_id,
+            current_value={},
+            new_value={},
+        )
+
+    def get_template_changes(
+        self, account_changes: list[AccountChangeDetails]
+    ) -> TemplateChangeDetails:
+        self.tracker.completed.append(self.resource_id)
+        return TemplateChangeDetails(
+            resource_id=self.resource_id,
+            resource_type="stub",
+            template_path=self.resource_id,
+            proposed_changes=account_changes,
+        )
+
+
+class StubProperties:
+    __fields__ = ["statements"]
+
+    def __init__(self, cost: int):
+        self.statements = list(range(cost))
+
+
+class ApplyTracker:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.account_running = defaultdict(int)
+        self.max_account_running = defaultdict(int)
+        self.started: list[str] = []
+        self.completed: list[str] = []
+        self.cancelled = 0
+        self.available: list[tuple[str, str]] = []
+        # The resources that were available when each unit started
+        self.started_before: list[tuple[str, str, list]] = []
+
+    def start(self, resource_id: str, account_id: str):
+        self.started.append(resource_id)
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        self.account_running[account_id] += 1
+        self.max_account_running[account_id] = max(
+            self.account_running[account_id], self.max_account_running[account_id]
+        )
+
+    def stop(self, account_id: str):
+        self.running -= 1
+        self.account_running[account_id] -= 1
+
+
+def _get_config(account_count: int) -> AWSConfig:
+    return AWSConfig(
+        accounts=[
+            AWSAccount(account_id=str(elem).zfill(12), account_name=f"account_{elem}")
+            for elem in range(account_count)
+        ]
+    )
+
+
+async def _apply(
+    apply_scheduler: ApplyScheduler, config: AWSConfig, templates: list
+) -> list[TemplateChangeDetails]:
+    return [
+        template_changes
+        async for template_changes in apply_scheduler.apply(config, templates)
+    ]
+
+
+def test_estimate_apply_cost():
+    template = AwsIamRoleTemplate(
+        identifier="example",
+        file_path="example.yaml",
+        properties={
+            "role_name": "example",
+            "managed_policies": [{"policy_arn": "arn:aws:iam::aws:policy/A"}],
+            "tags": [{"key": "a", "value": "b"}, {"key": "c", "value": "d"}],
+        },
+    )
+    assert estimate_apply_cost(template) == 4
+
+
+def test_template_dependencies():
+    aws_account = _get_config(1).accounts[0]
+    policy_template = AwsIamManagedPolicyTemplate(
+        identifier="example",
+        file_path="policy.yaml",
+        properties={
+            "policy_name": "example_{{account_name}}",
+            "path": "/engineering/",
+            "policy_document": {"statement": []},
+        },
+    )
+    role_template = AwsIamRoleTemplate(
+        identifier="example",
+        file_path="role.yaml",
+        properties={
+            "role_name": "example",
+            "managed_policies": [
+                {
+                    "policy_arn": "arn:aws:iam::{{account_id}}:policy/engineering/example_{{account_name}}"
+                },
+                {"policy_arn": "arn:aws:iam::aws:policy/ReadOnlyAccess"},
+            ],
+        },
+    )
+    policy_arn = "arn:aws:iam::000000000000:policy/engineering/example_account_0"
+
+    assert policy_template.get_provided_resources(aws_account) == {
+        policy_arn,
+        "/engineering/example_account_0",
+    }
+    assert role_template.get_required_resources(aws_account) == {
+        policy_arn,
+        "arn:aws:iam::aws:policy/ReadOnlyAccess",
+    }
+
+    policy_template.deleted = True
+    assert policy_template.get_provided_resources(aws_account) == set()
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_enforces_budgets():
+    tracker = ApplyTracker()
+    config = _get_config(4)
+    templates = [StubTemplate(f"template_{elem}", tracker) for elem in range(10)]
+
+    template_changes = await _apply(
+        ApplyScheduler(global_concurrency=6, account_concurrency=2), config, templates
+    )
+
+    assert len(tracker.started) == 40
+    assert tracker.max_running == 6
+    assert all(
+        max_account_running <= 2
+        for max_account_running in tracker.max_account_running.values()
+    )
+    assert sorted(
+        template_change.resource_id for template_change in template_changes
+    ) == sorted(template.resource_id for template in templates)
+    assert all(
+        len(template_change.proposed_changes) == 4
+        for template_change in template_changes
+    )
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_starts_expensive_units_first():
+    tracker = ApplyTracker()
+    config = _get_config(1)
+    templates = [
+        StubTemplate("cheap", tracker, cost=0),
+        StubTemplate("expensive", tracker, cost=10),
+        StubTemplate("medium", tracker, cost=5),
+    ]
+
+    await _apply(
+        ApplyScheduler(global_concurrency=1, account_concurrency=1), config, templates
+    )
+    assert tracker.started == ["expensive", "medium", "cheap"]
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_streams_template_changes():
+    tracker = ApplyTracker()
+    config = _get_config(3)
+    templates = [
+        StubTemplate("slow", tracker, delay=0.5),
+        StubTemplate("fast", tracker, account_ids=["000000000000"]),
+        StubTemplate("no_accounts", tracker, account_ids=[]),
+    ]
+
+    template_changes = []
+    async for template_change in ApplyScheduler().apply(config, templates):
+        template_changes.append(template_change.resource_id)
+        if template_change.resource_id == "fast":
+            # Returned while the slow template is still being applied
+            assert tracker.running == 3
+
+    assert template_changes == ["no_accounts", "fast", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_raises_unit_errors():
+    tracker = ApplyTracker()
+    config = _get_config(2)
+
+    class FailingTemplate(StubTemplate):
+        async def apply_to_account(self, aws_account: AWSAccount):
+            raise ValueError("Unable to apply")
+
+    with pytest.raises(ValueError):
+        await _apply(
+            ApplyScheduler(),
+            config,
+            [
+                StubTemplate("slow", tracker, delay=5),
+                FailingTemplate("failing", tracker),
+            ],
+        )
+    # The remaining units are cancelled
+    await asyncio.sleep(0)
+    assert tracker.cancelled == 2
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_waits_on_required_resources():
+    tracker = ApplyTracker()
+    config = _get_config(2)
+    policy_arn = "arn:aws:iam::{account_id}:policy/example"
+    templates = [
+        StubTemplate("role", tracker, cost=10, requires={policy_arn}),
+        StubTemplate("unrelated", tracker),
+        StubTemplate("policy", tracker, provides={policy_arn}, delay=0.1),
+        StubTemplate(
+            "other_account_role",
+            tracker,
+            account_ids=["000000000001"],
+            requires={"arn:aws:iam::000000000001:policy/missing"},
+        ),
+    ]
+
+    template_changes = await _apply(ApplyScheduler(), config, templates)
+    assert len(template_changes) == 4
+
+    for resource_id, account_id, available in tracker.started_before:
+        if resource_id == "role":
+            # Waits on the policy of its own account
+            assert ("policy", account_id) in available
+        elif resource_id != "policy":
+            # Started right away, nothing they require is being applied
+            assert not available
+
+
+@pytest.mark.asyncio
+async def test_apply_scheduler_does_not_wait_during_plan(monkeypatch):
+    tracker = ApplyTracker()
+    config = _get_config(1)
+    policy_arn = "arn:aws:iam::{account_id}:policy/example"
+    templates = [
+        StubTemplate("role", tracker, requires={policy_arn}),
+        StubTemplate("policy", tracker, provides={policy_arn}),
+    ]
+
+    monkeypatch.setattr(ctx, "eval_only", True)
+    await _apply(ApplyScheduler(), config, templates)
+    # The role is still evaluated after the policy but the policy creation isn't waited on
+    assert tracker.started == ["policy", "role"]
+    assert tracker.available == []
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+
+import iambic.core.utils
+from iambic.plugins.v0_1_0.aws.credential_cache import CredentialCache
+
+ASSUME_ROLE_ARN = "arn:aws:iam::123456789012:role/IambicSpokeRole"
+
+
+class StubSTSClient:
+    def __init__(self, expiration: timedelta):
+        self.expiration = expiration
+        self.assume_role_count = 0
+        self.get_caller_identity_count = 0
+
+    def assume_role(self, **kwargs):
+        self.assume_role_count += 1
+        return {
+            "Credentials": {
+                "AccessKeyId": f"ASIASTUB{self.assume_role_count}",
+                "SecretAccessKey": "secret",
+                "SessionToken": "token",
+                "Expiration": datetime.now(timezone.utc) + self.expiration,
+            }
+        }
+
+    def get_caller_identity(self):
+        self.get_caller_identity_count += 1
+        return {"Arn": "arn:aws:iam::123456789012:user/hub", "Account": "123456789012"}
+
+
+class StubSession:
+    def __init__(self, expiration: timedelta = timedelta(hours=1)):
+        self.sts_client = StubSTSClient(expiration)
+        self._session = boto3.Session(
+            aws_access_key_id="AKIASOURCE",
+            aws_secret_access_key="secret",
+            region_name="us-east-1",
+        )
+
+    def get_credentials(self):
+        return self._session.get_credentials()
+
+    def client(self, service_name, **kwargs):
+        return self.sts_client
+
+
+@pytest.fixture
+def writable_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(iambic.core.utils, "__WRITABLE_DIRECTORY__", tmp_path)
+    return str(tmp_path)
+
+
+def _get_access_key(session: boto3.Session) -> str:
+    return session.get_credentials().get_frozen_credentials().access_key
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_deduplicates_assume_role(writable_directory):
+    credential_cache = CredentialCache()
+    source_session = StubSession()
+
+    sessions = await asyncio.gather(
+        *[
+            credential_cache.create_assume_role_session(
+                source_session, ASSUME_ROLE_ARN, region_name
+            )
+            for region_name in ["us-east-1", "us-west-2", "eu-west-1"] * 5
+        ]
+    )
+    assert source_session.sts_client.assume_role_count == 1
+    assert {_get_access_key(session) for session in sessions} == {"ASIASTUB1"}
+    assert {session.region_name for session in sessions} == {
+        "us-east-1",
+        "us-west-2",
+        "eu-west-1",
+    }
+
+    # A different session name is a different role session
+    await credential_cache.create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1", session_name="other"
+    )
+    assert source_session.sts_client.assume_role_count == 2
+    # Nothing is written without a key
+    assert not os.path.exists(os.path.join(writable_directory, ".iambic"))
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_refreshes_before_expiry(writable_directory):
+    credential_cache = CredentialCache()
+    # Inside of the refresh window from the start
+    source_session = StubSession(expiration=timedelta(minutes=5))
+
+    session = await credential_cache.create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert _get_access_key(session) == "ASIASTUB2"
+    assert _get_access_key(session) == "ASIASTUB3"
+
+    source_session.sts_client.expiration = timedelta(hours=1)
+    assert _get_access_key(session) == "ASIASTUB4"
+    assert _get_access_key(session) == "ASIASTUB4"
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_file_cache(writable_directory, monkeypatch):
+    monkeypatch.setenv("IAMBIC_CREDENTIAL_CACHE_KEY", "a secret")
+    source_session = StubSession()
+
+    session = await CredentialCache().create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert _get_access_key(session) == "ASIASTUB1"
+    (file_name,) = os.listdir(
+        os.path.join(writable_directory, ".iambic", "credentials")
+    )
+    with open(
+        os.path.join(writable_directory, ".iambic", "credentials", file_name), "rb"
+    ) as f:
+        assert b"ASIASTUB1" not in f.read()
+
+    # A new process, e.g. the next invocation of a warm Lambda container
+    session = await CredentialCache().create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert _get_access_key(session) == "ASIASTUB1"
+    assert source_session.sts_client.assume_role_count == 1
+
+    # Entries encrypted with another key are ignored
+    monkeypatch.setenv("IAMBIC_CREDENTIAL_CACHE_KEY", "another secret")
+    session = await CredentialCache().create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert _get_access_key(session) == "ASIASTUB2"
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_caller_identity():
+    credential_cache = CredentialCache()
+    source_session = StubSession()
+
+    await asyncio.gather(
+        *[credential_cache.get_caller_identity(source_session) for _ in range(5)]
+    )
+    assert source_session.sts_client.get_caller_identity_count == 1
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_source_key_rotation(writable_directory):
+    credential_cache = CredentialCache()
+    source_session = StubSession()
+    session = await credential_cache.create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+
+    # The same identity with a new access key
+    rotated_source_session = StubSession(expiration=timedelta(minutes=5))
+    rotated_session = await credential_cache.create_assume_role_session(
+        rotated_source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert _get_access_key(rotated_session) == _get_access_key(session)
+    assert rotated_source_session.sts_client.assume_role_count == 0
+    assert len(credential_cache._credentials) == 1
+    assert len(credential_cache._key_locks) == 1
+
+    # Refreshes use the latest source session
+    session.get_credentials()._expiry_time = datetime.now(timezone.utc)
+    assert _get_access_key(session) == "ASIASTUB1"
+    assert source_session.sts_client.assume_role_count == 1
+    assert rotated_source_session.sts_client.assume_role_count == 1
+
+
+@pytest.mark.asyncio
+async def test_credential_cache_evicts_expired_credentials(writable_directory):
+    credential_cache = CredentialCache()
+    source_session = StubSession(expiration=timedelta(minutes=-1))
+    await credential_cache.create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1"
+    )
+    assert len(credential_cache._credentials) == 1
+
+    # Nothing refreshed the expired credentials so they are dropped with their lock
+    source_session.sts_client.expiration = timedelta(hours=1)
+    await credential_cache.create_assume_role_session(
+        source_session, ASSUME_ROLE_ARN, "us-east-1", session_name="other"
+    )
+    assert [key.split("|")[-1] for key in credential_cache._credentials] == ["other"]
+    assert [key.split("|")[-1] for key in credential_cache._key_locks] == ["other"]
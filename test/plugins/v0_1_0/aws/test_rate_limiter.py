@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from iambic.plugins.v0_1_0.aws import rate_limiter as rate_limiter_module
+from iambic.plugins.v0_1_0.aws.rate_limiter import (
+    AdaptiveRateLimiter,
+    get_rate_limiter,
+    get_rate_limiter_stats,
+    get_throttle_backoff,
+    register_client,
+)
+from iambic.plugins.v0_1_0.aws.utils import boto_crud_call
+
+
+@pytest.fixture
+def rate_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "_rate_limiters", {})
+    # Keep the retries fast
+    monkeypatch.setattr(rate_limiter_module, "THROTTLE_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(rate_limiter_module, "THROTTLE_BACKOFF_MAX", 0.05)
+    return rate_limiter_module._rate_limiters
+
+
+def _get_throttling_error() -> ClientError:
+    return ClientError(
+        {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, "ListRoles"
+    )
+
+
+def test_rate_limiter_aimd():
+    rate_limiter = AdaptiveRateLimiter(initial_rate=10, min_rate=1, max_rate=11)
+    for _ in range(100):
+        rate_limiter.on_success()
+    assert rate_limiter.rate == 11
+
+    rate_limiter.on_throttle()
+    assert rate_limiter.rate == 5.5
+    # Throttles of calls that were already in flight are ignored
+    rate_limiter.on_throttle()
+    assert rate_limiter.rate == 5.5
+    assert rate_limiter.get_stats() == dict(rate=5.5, request_count=0, throttle_count=2)
+
+    for _ in range(10):
+        rate_limiter._decreased_at = 0
+        rate_limiter.on_throttle()
+    assert rate_limiter.rate == 1
+
+
+def test_rate_limiter_paces_calls():
+    rate_limiter = AdaptiveRateLimiter(initial_rate=10)
+
+    async def _acquire():
+        await asyncio.gather(*[rate_limiter.acquire() for _ in range(15)])
+
+    start = time.monotonic()
+    asyncio.run(_acquire())
+    # The first 10 calls use the burst, the remaining 5 are released at 10 per second
+    assert 0.4 <= time.monotonic() - start < 1
+    assert rate_limiter.request_count == 15
+
+
+def test_get_rate_limiter(rate_limiters):
+    iam_client = boto3.client("iam", region_name="us-east-1")
+    other_iam_client = boto3.client("iam", region_name="us-east-1")
+    sqs_client = boto3.client("sqs", region_name="us-east-1")
+    register_client(iam_client, "123456789012")
+    register_client(sqs_client, "123456789012")
+
+    rate_limiter = get_rate_limiter(iam_client.list_roles)
+    # IAM throttles all operations of the account together
+    assert rate_limiter is get_rate_limiter(iam_client.list_users)
+    assert rate_limiter is not get_rate_limiter(other_iam_client.list_roles)
+    assert get_rate_limiter(sqs_client.list_queues) is not get_rate_limiter(
+        sqs_client.get_queue_url
+    )
+    assert sorted(
+        (stats["account_id"] or "", stats["service"], stats["operation"] or "")
+        for stats in get_rate_limiter_stats()
+    ) == [
+        ("", "iam", ""),
+        ("123456789012", "iam", ""),
+        ("123456789012", "sqs", "get_queue_url"),
+        ("123456789012", "sqs", "list_queues"),
+    ]
+
+
+def test_get_throttle_backoff():
+    backoffs = [get_throttle_backoff(retry_count) for retry_count in range(1, 11)]
+    assert 0.25 <= backoffs[0] <= 0.5
+    assert 4 <= backoffs[4] <= 8
+    assert all(5 <= backoff <= 10 for backoff in backoffs[5:])
+    # About as long as the linear backoff it replaced, 27.5 seconds
+    assert sum(backoffs) > 30
+
+
+@pytest.mark.asyncio
+async def test_boto_crud_call_backs_off_on_throttling(rate_limiters):
+    responses = [_get_throttling_error(), _get_throttling_error(), {"Roles": []}]
+
+    def list_roles():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert await boto_crud_call(list_roles) == {"Roles": []}
+    stats = get_rate_limiter_stats()[0]
+    assert stats["operation"] == "list_roles"
+    assert stats["request_count"] == 3
+    assert stats["throttle_count"] == 2
+    assert stats["rate"] < rate_limiter_module.INITIAL_RATE
+
+
+@pytest.mark.asyncio
+async def test_boto_crud_call_raises_after_retries(rate_limiters):
+    def list_roles():
+        raise _get_throttling_error()
+
+    get_rate_limiter(list_roles).min_rate = 100
+    start = time.monotonic()
+    with pytest.raises(ClientError):
+        await boto_crud_call(list_roles)
+    assert get_rate_limiter_stats()[0]["throttle_count"] == 11
+    # At least half of 0.01 + 0.02 + 0.04 + 7 * 0.05 seconds of backoff
+    assert time.monotonic() - start >= 0.2
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import functools
+import json
+import time
+
+import boto3
+import pytest
+from moto import mock_sqs
+
+from iambic.plugins.v0_1_0.aws.event_bridge.models import (
+    ManagedPolicyMessageDetails,
+    RoleMessageDetails,
+    UserMessageDetails,
+)
+from iambic.plugins.v0_1_0.aws.event_bridge.utils import parse_cloudtrail_message
+from iambic.plugins.v0_1_0.aws.sqs_consumer import SQSConsumer, SQSQueue
+
+IAMBIC_ROLE_ARN = "arn:aws:iam::123456789012:role/IambicHubRole"
+ACTOR_ROLE_ARN = "arn:aws:iam::123456789012:role/Admin"
+
+
+def _get_cloudtrail_event(
+    event_name: str, request_parameters: dict, actor_arn: str = ACTOR_ROLE_ARN
+) -> str:
+    return json.dumps(
+        {
+            "detail": {
+                "eventName": event_name,
+                "recipientAccountId": "123456789012",
+                "requestParameters": request_parameters,
+                "userIdentity": {
+                    "principalId": "AROAEXAMPLE:admin@example.com",
+                    "sessionContext": {"sessionIssuer": {"arn": actor_arn}},
+                },
+            }
+        }
+    )
+
+
+@pytest.fixture
+def sqs_client():
+    with mock_sqs():
+        yield boto3.client("sqs", region_name="us-east-1")
+
+
+def _create_queue(sqs_client, queue_name: str, message_bodies: list[str]) -> SQSQueue:
+    queue_url = sqs_client.create_queue(QueueName=queue_name)["QueueUrl"]
+    for elem in range(0, len(message_bodies), 10):
+        sqs_client.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(entry_elem), "MessageBody": message_body}
+                for entry_elem, message_body in enumerate(
+                    message_bodies[elem : elem + 10]
+                )
+            ],
+        )
+    return SQSQueue(
+        sqs_client,
+        queue_url,
+        functools.partial(parse_cloudtrail_message, identity_arn=IAMBIC_ROLE_ARN),
+    )
+
+
+def _get_message_count(queue: SQSQueue) -> int:
+    attributes = queue.sqs_client.get_queue_attributes(
+        QueueUrl=queue.queue_url,
+        AttributeNames=[
+            "ApproximateNumberOfMessages",
+            "ApproximateNumberOfMessagesNotVisible",
+        ],
+    )["Attributes"]
+    return sum(int(count) for count in attributes.values())
+
+
+def test_parse_cloudtrail_message():
+    message_details, change_summary = parse_cloudtrail_message(
+        {"Body": _get_cloudtrail_event("DeleteRole", {"roleName": "example"})},
+        IAMBIC_ROLE_ARN,
+    )
+    assert message_details == RoleMessageDetails(
+        account_id="123456789012", role_name="example", delete=True
+    )
+    assert change_summary == (
+        "User admin@example.com performed action DeleteRole "
+        "on Role(example) on account 123456789012.\n"
+    )
+
+    # Delivered through SNS
+    message_details, _ = parse_cloudtrail_message(
+        {
+            "Body": json.dumps(
+                {"Message": _get_cloudtrail_event("CreateUser", {"userName": "user"})}
+            )
+        },
+        IAMBIC_ROLE_ARN,
+    )
+    assert message_details == UserMessageDetails(
+        account_id="123456789012", user_name="user", delete=False
+    )
+
+    message_details, _ = parse_cloudtrail_message(
+        {
+            "Body": _get_cloudtrail_event(
+                "CreatePolicy",
+                {"policyArn": "arn:aws:iam::123456789012:policy/team/example"},
+            )
+        },
+        IAMBIC_ROLE_ARN,
+    )
+    assert message_details == ManagedPolicyMessageDetails(
+        account_id="123456789012",
+        policy_name="example",
+        policy_path="/team/",
+        delete=False,
+    )
+
+    # Changes made by iambic
+    assert (
+        parse_cloudtrail_message(
+            {
+                "Body": _get_cloudtrail_event(
+                    "DeleteRole", {"roleName": "example"}, actor_arn=IAMBIC_ROLE_ARN
+                )
+            },
+            IAMBIC_ROLE_ARN,
+        )
+        is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_sqs_consumer_drains_queues(sqs_client):
+    queues = [
+        _create_queue(
+            sqs_client,
+            f"queue_{queue_elem}",
+            [
+                _get_cloudtrail_event("CreateRole", {"roleName": f"role_{elem}"})
+                for elem in range(35)
+            ]
+            + ["not json", _get_cloudtrail_event("CreateBucket", {"bucket": "x"})],
+        )
+        for queue_elem in range(2)
+    ]
+
+    sqs_consumer = SQSConsumer(wait_time_seconds=0)
+    results = await sqs_consumer.consume(queues)
+
+    assert sqs_consumer.received_count == 74
+    assert sorted(
+        message_details.role_name for message_details, _ in results
+    ) == sorted([f"role_{elem}" for elem in range(35)] * 2)
+    # Every message is deleted, including the ones that couldn't be parsed
+    assert all(_get_message_count(queue) == 0 for queue in queues)
+
+
+@pytest.mark.asyncio
+async def test_sqs_consumer_skips_duplicate_messages(sqs_client):
+    queue = _create_queue(
+        sqs_client,
+        "queue",
+        [
+            _get_cloudtrail_event("CreateRole", {"roleName": f"role_{elem}"})
+            for elem in range(15)
+        ],
+    )
+    # SQS delivers at least once, return every batch a second time
+    receive_message = sqs_client.receive_message
+    received_messages = []
+
+    def _receive_message(**kwargs):
+        messages = received_messages + receive_message(**kwargs).get("Messages", [])
+        received_messages[:] = messages[len(received_messages) :]
+        return {"Messages": messages}
+
+    sqs_client.receive_message = _receive_message
+
+    sqs_consumer = SQSConsumer(
+        max_messages=12, receivers_per_queue=1, wait_time_seconds=0
+    )
+    results = await sqs_consumer.consume([queue])
+
+    assert sqs_consumer.received_count == 12
+    assert len(results) == 12
+    assert len({message_details.role_name for message_details, _ in results}) == 12
+    assert _get_message_count(queue) == 3
+
+
+@pytest.mark.asyncio
+async def test_sqs_consumer_message_budget(sqs_client):
+    queue = _create_queue(
+        sqs_client,
+        "queue",
+        [
+            _get_cloudtrail_event("CreateRole", {"roleName": f"role_{elem}"})
+            for elem in range(30)
+        ],
+    )
+
+    results = await SQSConsumer(max_messages=12, wait_time_seconds=0).consume([queue])
+    assert len(results) == 12
+    assert _get_message_count(queue) == 18
+
+
+@pytest.mark.asyncio
+async def test_sqs_consumer_time_budget(sqs_client):
+    queue = _create_queue(
+        sqs_client,
+        "queue",
+        [_get_cloudtrail_event("CreateRole", {"roleName": "role"})],
+    )
+
+    start = time.monotonic()
+    results = await SQSConsumer(max_seconds=0).consume([queue])
+    assert time.monotonic() - start < 1
+    assert results == []
+    assert _get_message_count(queue) == 1